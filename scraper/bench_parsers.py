@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+"""
+bench_parsers.py
+
+Checks that every HTML parser backend of `parsers` returns the same results,
+then reports how many pages per second each backend parses.
+
+Feed it saved pages:
+    python3 bench_parsers.py --gallery g.html --reader r.html --search s.html
+
+Without any, it runs on the pages saved in tests/fixtures/ (the kind of page is
+the start of the file name).
+
+    gallery: https://nhentai.net/g/{id}/
+    reader:  https://nhentai.net/g/{id}/1/
+    search:  https://nhentai.net/search/?q=...
+"""
+
+import argparse
+import time
+from pathlib import Path
+from typing import Any
+
+import parsers
+from parsers import ParserBackend
+
+FIXTURES_DIR: Path = Path(__file__).resolve().parent / "tests" / "fixtures"
+
+
+def bench(kind: str, content: bytes, min_seconds: float) -> bool:
+    """
+    Benchmarks all the available backends on `content`.
+    Returns True if all of them agree with the bs4 backend.
+    """
+    func = parsers.page_parser(kind)
+    reference: Any = parsers.comparable(func(content, ParserBackend.BS4))
+    agree: bool = True
+
+    for backend in ParserBackend.available():
+        result: Any = parsers.comparable(func(content, backend))
+        if result != reference:
+            agree = False
+            print(
+                f"[{kind}] {backend}: MISMATCH\n\tbs4:  {reference}\n\tgot:  {result}"
+            )
+
+        runs: int = 0
+        start: float = time.perf_counter()
+        while (elapsed := time.perf_counter() - start) < min_seconds:
+            func(content, backend)
+            runs += 1
+
+        print(
+            f"[{kind}] {str(backend):<5} {runs / elapsed:>10,.1f} pages/s "
+            f"({elapsed / runs * 1000:.3f} ms/page, {len(content) / 1024:.1f} KiB)"
+        )
+
+    return agree
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("--gallery", type=Path, action="append", default=[])
+    arg_parser.add_argument("--reader", type=Path, action="append", default=[])
+    arg_parser.add_argument("--search", type=Path, action="append", default=[])
+    arg_parser.add_argument(
+        "--seconds", type=float, default=2.0, help="Time spent on each backend"
+    )
+    args = arg_parser.parse_args()
+
+    files: list[tuple[str, Path]] = [
+        (kind, path) for kind in parsers.PAGE_KINDS for path in getattr(args, kind)
+    ]
+    if not files:
+        files = [
+            (parsers.page_kind(path), path)
+            for path in sorted(FIXTURES_DIR.glob("*.html"))
+        ]
+    if not files:
+        arg_parser.error("no HTML file given, and no fixture found")
+
+    print(f"Backends available: {', '.join(map(str, ParserBackend.available()))}")
+    all_agree: bool = True
+    for kind, path in files:
+        all_agree &= bench(kind, path.read_bytes(), args.seconds)
+
+    if not all_agree:
+        raise SystemExit("Backends disagree!")
+
+
+if __name__ == "__main__":
+    main()
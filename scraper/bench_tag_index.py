@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""
+bench_tag_index.py
+
+Checks that the tag index (see `tag_index`) answers queries like a linear scan of every
+meta.json does, then reports how long each takes per query.
+
+On a downloaded library:
+    python3 bench_tag_index.py --tree ../manga/ 'tag:"full color" language:english'
+
+On made-up doujinshis (written to a temporary directory first):
+    python3 bench_tag_index.py --generate 300000
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+from stub_server import make_gallery
+from tag_index import _FIELD_ALIASES, TagIndex, parse_query
+
+_DEFAULT_QUERIES: list[str] = [
+    'tag:"tag 7"',
+    'tag:"tag 7" AND language:"language 3"',
+    '(artist:"artist 1" OR artist:"artist 2") AND NOT tag:"tag 7"',
+    "pages:20..30",
+    'language:"language 3" pages:..10 uploaded:2014-05-14..2014-05-20',
+    'NOT (tag:"tag 1" OR tag:"tag 2" OR tag:"tag 3")',
+]
+
+
+def make_meta(id: int) -> dict[str, Any] | None:
+    """The meta.json the scraper would save for a made-up doujinshi of the stub server."""
+    gallery: dict[str, Any] | None = make_gallery(id, max_id=2**31)
+    if not gallery:
+        return None
+    meta: dict[str, Any] = {"pages": gallery["num_pages"]}
+    for tag in gallery["tags"]:
+        meta.setdefault(_FIELD_ALIASES[tag["type"]], []).append(
+            {"name": tag["name"], "count": str(tag["count"])}
+        )
+    uploaded = time.gmtime(gallery["upload_date"])
+    meta["datetime_iso8601"] = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", uploaded)
+    return meta
+
+
+def generate_tree(root: Path, n: int) -> None:
+    for id in range(1, n + 1):
+        if meta := make_meta(id):
+            (root / str(id)).mkdir()
+            (root / str(id) / "meta.json").write_text(json.dumps(meta))
+
+
+def iter_metas(tree: Path) -> Iterator[tuple[int, dict[str, Any]]]:
+    for entry in os.scandir(tree):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(os.path.join(entry.path, "meta.json"), "rb") as f:
+                yield int(entry.name), json.load(f)
+        except (OSError, ValueError):
+            continue
+
+
+def linear_scan(tree: Path, query_text: str) -> list[int]:
+    query = parse_query(query_text)
+    return sorted(id for id, meta in iter_metas(tree) if query.matches(meta))
+
+
+def timed(func, *args) -> tuple[Any, float]:
+    start: float = time.perf_counter()
+    result: Any = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench(tree: Path, queries: list[str]) -> None:
+    index = TagIndex()
+    start: float = time.perf_counter()
+    for id, meta in iter_metas(tree):
+        index.add(id, meta)
+    print(
+        f"Indexed {len(index)} doujinshis in {time.perf_counter() - start:.2f}s ({tree})"
+    )
+
+    all_agree: bool = True
+    for query in queries:
+        expected, scan_s = timed(linear_scan, tree, query)
+        # The first run builds the bitmaps of the posting lists, the next ones reuse them.
+        got, cold_s = timed(index.query, query)
+        _, warm_s = timed(index.query, query)
+        if got != expected:
+            all_agree = False
+            print(f"MISMATCH {query}: index {len(got)}, linear scan {len(expected)}")
+        print(
+            f"{len(got):>8} hits | index {cold_s * 1000:8.2f} ms cold, {warm_s * 1000:8.2f} ms warm "
+            f"| linear scan {scan_s * 1000:10.1f} ms ({scan_s / max(warm_s, 1e-9):,.0f}x) | {query}"
+        )
+
+    if not all_agree:
+        raise SystemExit("The index and the linear scan disagree!")
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    source = arg_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--tree", type=Path, help="A doujinshi directory")
+    source.add_argument(
+        "--generate", type=int, metavar="N", help="Make up N doujinshis"
+    )
+    arg_parser.add_argument("queries", nargs="*", help="Queries to run")
+    args = arg_parser.parse_args()
+
+    queries: list[str] = args.queries or _DEFAULT_QUERIES
+    if args.tree:
+        bench(args.tree, queries)
+        return
+    with tempfile.TemporaryDirectory(prefix="tag_index_bench_") as tmp_dir:
+        generate_tree(Path(tmp_dir), args.generate)
+        bench(Path(tmp_dir), queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,10 +2,14 @@
 
 """
 A standalone CLI cleaning up utility for the doujinshi directory. Compares JSON pages with pages. No JSON etc.
+With --verify, also checks that every page is a whole, valid image (see `image_check`).
+With --repair, re-downloads only the broken parts of the doujinshis instead of deleting them.
 
 Terrible code, by the way.
 """
 
+import argparse
+import asyncio
 import shutil
 from os.path import isdir, isfile
 from pathlib import Path
@@ -15,6 +19,11 @@ from typing import Any, Iterable
 import signal
 import sys
 import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+
+from image_check import CheckDepth, check_images
 
 
 def signal_handler(sig, frame):
@@ -24,18 +33,257 @@ def signal_handler(sig, frame):
 
 signal.signal(signal.SIGINT, signal_handler)
 
+# The scraper of the repair mode: it only completes the directories in place. No process pool
+# to start for a few pages, no state files written to the working directory or next to the library.
+_REPAIR_SCRAPER_SETTINGS: dict[str, Any] = {
+    "parse_in_pool": False,
+    "extension_stats_filepath": None,
+    "resume": True,
+    "journal_filepath": None,
+    "tombstones_filepath": None,
+    "content_store_dir": None,
+    "library_index_filepath": None,
+    "packed": False,
+}
+
+
+@dataclass
+class GalleryScan:
+    """
+    What one pass over a doujinshi directory found, enough to decide what to delete.
+    """
+
+    # The directory and meta file modification times it was scanned at (ns).
+    dir_mtime_ns: int
+    meta_mtime_ns: int
+    # None if meta.json is missing or unreadable, see `meta_error`.
+    page_count: int | None
+    meta_error: str | None
+    image_count: int
+    # Size of everything in the directory.
+    bytes: int
+    # The entries that are not files: (name, size).
+    non_files: list[tuple[str, int]] = field(default_factory=list)
+    # The files other than meta.json, i.e. the pages: (name, size, mtime_ns), sorted.
+    pages: list[tuple[str, int, int]] = field(default_factory=list)
+
+
+@dataclass
+class RepairItem:
+    """
+    What repairing one doujinshi takes: deleting the bad files, then downloading the pages missing.
+    """
+
+    doujin_dir: Path
+    # Stray files, broken, empty or duplicate pages, with the reason why.
+    to_delete: list[tuple[Path, str]]
+    # None if unknown until the meta file is rewritten.
+    missing_pages: list[int] | None
+    rewrite_meta: bool
+
+    @property
+    def needs_download(self) -> bool:
+        return self.rewrite_meta or bool(self.missing_pages)
+
+
+class ScanCache:
+    """
+    The scans of the previous runs, by doujinshi directory name, persisted as JSON.
+    A scan is reused as long as neither the directory nor its meta file changed: pages
+    are only ever added, removed or renamed (which changes the directory's mtime).
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self._filepath: Path = filepath
+        self._scans: dict[str, GalleryScan] = dict()
+        self.hits: int = 0
+        try:
+            with filepath.open("r", encoding="utf-8") as f:
+                for name, fields in json.load(f).items():
+                    if "pages" not in fields or any(
+                        len(page) < 3 for page in fields["pages"]
+                    ):
+                        # Scanned by an older version, without the listing: scanned again.
+                        continue
+                    scan = GalleryScan(**fields)
+                    scan.non_files = [tuple(item) for item in scan.non_files]
+                    scan.pages = [tuple(item) for item in scan.pages]
+                    self._scans[name] = scan
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Failed to load the scan cache, rescanning everything: {e}")
+            self._scans.clear()
+
+    def get(
+        self, name: str, dir_mtime_ns: int, meta_mtime_ns: int
+    ) -> GalleryScan | None:
+        scan: GalleryScan | None = self._scans.get(name)
+        if (
+            scan
+            and scan.dir_mtime_ns == dir_mtime_ns
+            and scan.meta_mtime_ns == meta_mtime_ns
+        ):
+            self.hits += 1
+            return scan
+        return None
+
+    def put(self, name: str, scan: GalleryScan) -> None:
+        self._scans[name] = scan
+
+    def save(self, names: Iterable[str]) -> None:
+        """Saves the scans of `names` only, forgetting the directories that are gone."""
+        scans = {
+            name: asdict(self._scans[name]) for name in names if name in self._scans
+        }
+        # Written aside then renamed: a crash never leaves a truncated file.
+        tmp_path: Path = self._filepath.with_name(f".{self._filepath.name}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(scans, f, separators=(",", ":"))
+            tmp_path.replace(self._filepath)
+        except Exception as e:
+            print(f"Failed to save the scan cache: {e}")
+
+
+class VerifyCache:
+    """
+    The image checks of the previous runs, by doujinshi directory name, persisted as JSON:
+    the depth checked and, by page, its size, modification time and why it is broken (None if not).
+    Only the pages that changed (added, or renamed into place) are checked again, all of them
+    at a greater depth.
+    """
+
+    def __init__(self, filepath: Path) -> None:
+        self._filepath: Path = filepath
+        self._results: dict[str, tuple[str, dict[str, tuple[int, int, str | None]]]] = (
+            dict()
+        )
+        try:
+            with filepath.open("r", encoding="utf-8") as f:
+                for name, result in json.load(f).items():
+                    if len(result) != 2:
+                        # Checked by an older version, by directory: checked again.
+                        continue
+                    depth, files = result
+                    self._results[name] = (
+                        depth,
+                        {file: tuple(item) for file, item in files.items()},
+                    )
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"Failed to load the verification cache, checking everything: {e}")
+            self._results.clear()
+
+    def get(
+        self, name: str, pages: list[tuple[str, int, int]], depth: CheckDepth
+    ) -> tuple[dict[str, str], list[str]]:
+        """
+        :param pages: The pages of the doujinshi now, (name, size, mtime_ns), see `GalleryScan`.
+        :returns: The broken pages {file name: why} among the ones unchanged since checked,
+            and the names of the pages to check.
+        """
+        result = self._results.get(name)
+        if not result or CheckDepth(result[0]).level < depth.level:
+            return dict(), [page for page, _, _ in pages]
+        files = result[1]
+        broken: dict[str, str] = dict()
+        to_check: list[str] = list()
+        for page, size, mtime_ns in pages:
+            known = files.get(page)
+            if not known or known[:2] != (size, mtime_ns):
+                to_check.append(page)
+            elif known[2] is not None:
+                broken[page] = known[2]
+        return broken, to_check
+
+    def put(
+        self,
+        name: str,
+        pages: list[tuple[str, int, int]],
+        depth: CheckDepth,
+        broken: dict[str, str],
+    ) -> None:
+        """Records the results of all `pages` of the doujinshi, `broken` being {file name: why}."""
+        self._results[name] = (
+            str(depth),
+            {
+                page: (size, mtime_ns, broken.get(page))
+                for page, size, mtime_ns in pages
+            },
+        )
+
+    def save(self, names: Iterable[str]) -> None:
+        """Saves the results of `names` only, forgetting the directories that are gone."""
+        results = {name: self._results[name] for name in names if name in self._results}
+        # Written aside then renamed: a crash never leaves a truncated file.
+        tmp_path: Path = self._filepath.with_name(f".{self._filepath.name}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(results, f, separators=(",", ":"))
+            tmp_path.replace(self._filepath)
+        except Exception as e:
+            print(f"Failed to save the verification cache: {e}")
+
+
+def _tree_size(path: str) -> int:
+    """The size of everything under `path`, symlinks not followed."""
+    size: int = 0
+    try:
+        for entry in os.scandir(path):
+            if entry.is_dir(follow_symlinks=False):
+                size += _tree_size(entry.path)
+            else:
+                size += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return size
+
 
 class Cleanup:
-    def __init__(self, doujin_dir: str, meta_filename: str = "meta.json") -> None:
+    def __init__(
+        self,
+        doujin_dir: str,
+        meta_filename: str = "meta.json",
+        cache_filepath: str | None = None,
+        workers: int = 32,
+        verify: CheckDepth | None = None,
+        verify_workers: int | None = None,
+        verify_budget_s: float | None = None,
+    ) -> None:
         """
         Cleans up the doujin directory of stale doujinshis, incomplete ones, other crap.
 
         :param doujin_dir: Where the doujinshis are stored.
         :param meta_filename: The JSON default name to store doujin information (tags, timestamps, ...).
+        :param cache_filepath: Where the scans persist between runs, so that unchanged doujinshis
+            are not scanned again. Defaults to `.cleanup_cache.json` in `doujin_dir`.
+        :param workers: The number of doujinshi directories scanned at once.
+        :param verify: Also check every page of the complete doujinshis at this depth, and delete
+            the broken pages (the scraper re-downloads missing pages when resuming).
+            The results persist in `.verify_cache.json` in `doujin_dir`.
+        :param verify_workers: The number of processes checking pages. Defaults to one per core.
+        :param verify_budget_s: Stop starting new checks after this many seconds: the doujinshis
+            left are checked by the next runs, the ones done are cached.
         """
         self._doujin_dir: Path = Path(doujin_dir).absolute()
         self._doujin_dir.mkdir(parents=True, exist_ok=True)
         self._meta_filename = meta_filename
+        self._cache: ScanCache = ScanCache(
+            Path(cache_filepath)
+            if cache_filepath
+            else self._doujin_dir / ".cleanup_cache.json"
+        )
+        self._workers: int = max(1, workers)
+        # The size of every path found, so that the summary does not walk the tree again.
+        self._sizes: dict[Path, int] = dict()
+        self._verify: CheckDepth | None = verify
+        self._verify_workers: int = max(1, verify_workers or os.cpu_count() or 1)
+        self._verify_budget_s: float | None = verify_budget_s
+        self._verify_cache: VerifyCache = VerifyCache(
+            self._doujin_dir / ".verify_cache.json"
+        )
 
     def _json_parse_page_count(self, file: Path) -> int | None:
         with file.open("rb") as f:
@@ -58,79 +306,292 @@ class Cleanup:
                 print("Failed to parse page count into integer.")
                 return None
 
-    def _clean_dir(self, doujin_dir: Path) -> list[tuple[Path, str]]:
+    def _scan_dir(self, doujin_dir: Path, dir_mtime_ns: int) -> GalleryScan:
         """
-        Returns a list of Paths to be deleted with the reason why it should be deleted.
+        Scans a doujinshi directory in one pass: counts the images, sums the sizes,
+        finds the non-files and reads the page count. Blocking, run in the thread pool.
         """
-        to_delete: list[tuple[Path, str]] = list()
-        meta_file: Path = Path(doujin_dir) / self._meta_filename
-        # Delete ourselves if no JSON metadata.
-        if not meta_file.exists():
-            return [(doujin_dir, f"{self._meta_filename} does not exist.")]
-
-        page_count: int | None = self._json_parse_page_count(meta_file)
-        if page_count is None:
-            return [(doujin_dir, f"Failed to parse the page count in JSON")]
-
-        # The number of files (so images) inside a doujinshi directory.
-        image_count: int = 0
-        for entry in doujin_dir.iterdir():
-            if entry.is_file() and str(entry.name) != self._meta_filename:
-                image_count += 1
+        scan = GalleryScan(dir_mtime_ns, 0, None, None, 0, 0)
+        meta_found: bool = False
+        for entry in os.scandir(doujin_dir):
+            if entry.is_dir(follow_symlinks=False):
+                size: int = _tree_size(entry.path)
+                scan.non_files.append((entry.name, size))
+                scan.bytes += size
                 continue
 
-            if str(entry.name) != self._meta_filename:
-                # Delete all NON-files
-                to_delete.append((entry, f"Not a doujin image file"))
+            st: os.stat_result = entry.stat(follow_symlinks=False)
+            scan.bytes += st.st_size
+            if entry.name == self._meta_filename:
+                meta_found = True
+                scan.meta_mtime_ns = st.st_mtime_ns
+            elif entry.is_file(follow_symlinks=False):
+                scan.image_count += 1
+                scan.pages.append((entry.name, st.st_size, st.st_mtime_ns))
+            else:
+                scan.non_files.append((entry.name, st.st_size))
+        scan.pages.sort()
+
+        if not meta_found:
+            scan.meta_error = f"{self._meta_filename} does not exist."
+        else:
+            scan.page_count = self._json_parse_page_count(
+                doujin_dir / self._meta_filename
+            )
+            if scan.page_count is None:
+                scan.meta_error = "Failed to parse the page count in JSON"
+        return scan
+
+    def _cached_scan(self, doujin_dir: Path) -> GalleryScan:
+        """Returns the scan of the previous run if the doujinshi did not change, else scans it."""
+        dir_mtime_ns: int = doujin_dir.stat().st_mtime_ns
+        try:
+            meta_mtime_ns: int = (doujin_dir / self._meta_filename).stat().st_mtime_ns
+        except FileNotFoundError:
+            meta_mtime_ns = 0
+        scan: GalleryScan | None = self._cache.get(
+            doujin_dir.name, dir_mtime_ns, meta_mtime_ns
+        )
+        if scan is None:
+            scan = self._scan_dir(doujin_dir, dir_mtime_ns)
+            self._cache.put(doujin_dir.name, scan)
+        return scan
+
+    def _clean_dir(
+        self, doujin_dir: Path, scan: GalleryScan | None = None
+    ) -> list[tuple[Path, str]]:
+        """
+        Returns a list of Paths to be deleted with the reason why it should be deleted.
+        """
+        if scan is None:
+            scan = self._cached_scan(doujin_dir)
+        self._sizes[doujin_dir] = scan.bytes
+
+        # Delete ourselves if no JSON metadata.
+        if scan.meta_error:
+            return [(doujin_dir, scan.meta_error)]
 
-        if image_count != page_count:
-            print(f"Page mismatch: {page_count = } expected and got {image_count = }")
+        if scan.image_count != scan.page_count:
+            print(
+                f"Page mismatch: {scan.page_count} expected and got {scan.image_count} ({doujin_dir.name})"
+            )
             return [
-                (doujin_dir, f"Page mismatch: expected {page_count}, got {image_count}")
+                (
+                    doujin_dir,
+                    f"Page mismatch: expected {scan.page_count}, got {scan.image_count}",
+                )
             ]
 
+        to_delete: list[tuple[Path, str]] = list()
+        for name, size in scan.non_files:
+            # Delete all NON-files
+            self._sizes[doujin_dir / name] = size
+            to_delete.append((doujin_dir / name, f"Not a doujin image file"))
         return to_delete
 
+    def _verify_pages(self, doujinshi_dirs: list[Path]) -> list[tuple[Path, str]]:
+        """
+        Checks the pages not already checked (see `VerifyCache`) in a process pool.
+        The pages are the ones listed by the scan (see `ScanCache`): usually cached, never listed twice.
+        Returns the broken pages to delete, with the reason why.
+        """
+        depth: CheckDepth = self._verify
+        to_delete: list[tuple[Path, str]] = list()
+        checked_files: int = 0
+        checked_bytes: int = 0
+        cached: int = 0
+        deferred: int = 0
+
+        def record(
+            doujin_dir: Path, pages: list[tuple[str, int, int]], broken: dict[str, str]
+        ) -> None:
+            self._verify_cache.put(doujin_dir.name, pages, depth, broken)
+            for name, reason in broken.items():
+                to_delete.append((doujin_dir / name, f"Broken image: {reason}"))
+
+        start: float = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self._workers) as threads:
+            # Cache hits of the scan that just ran: a stat or two per doujinshi.
+            scans = threads.map(self._cached_scan, doujinshi_dirs)
+            # Images are checked by whole doujinshi: one task per doujinshi.
+            with ProcessPoolExecutor(max_workers=self._verify_workers) as processes:
+                pending: deque[
+                    tuple[Path, list[tuple[str, int, int]], dict[str, str], Future]
+                ] = deque()
+
+                def collect() -> None:
+                    nonlocal checked_files, checked_bytes
+                    doujin_dir, pages, broken, future = pending.popleft()
+                    broken_paths, size = future.result()
+                    checked_bytes += size
+                    for path, reason in broken_paths.items():
+                        broken[Path(path).name] = reason
+                    record(doujin_dir, pages, broken)
+
+                for doujin_dir, scan in zip(doujinshi_dirs, scans):
+                    for name, size, _ in scan.pages:
+                        self._sizes[doujin_dir / name] = size
+                    broken, to_check = self._verify_cache.get(
+                        doujin_dir.name, scan.pages, depth
+                    )
+                    if not to_check:
+                        cached += 1
+                        record(doujin_dir, scan.pages, broken)
+                        continue
+
+                    if (
+                        self._verify_budget_s is not None
+                        and time.perf_counter() - start > self._verify_budget_s
+                    ):
+                        deferred += 1
+                        continue
+
+                    paths: list[str] = [str(doujin_dir / name) for name in to_check]
+                    checked_files += len(paths)
+                    pending.append(
+                        (
+                            doujin_dir,
+                            scan.pages,
+                            broken,
+                            processes.submit(check_images, paths, depth),
+                        )
+                    )
+                    # Bounded: the results are recorded as they come.
+                    if len(pending) >= self._verify_workers * 4:
+                        collect()
+                while pending:
+                    collect()
+        elapsed: float = time.perf_counter() - start
+
+        self._verify_cache.save(path.name for path in doujinshi_dirs)
+        print(
+            f"Verified {checked_files} pages ({checked_bytes / 1024**2:,.1f} MiB) at depth '{depth}' in {elapsed:.1f}s: "
+            f"{checked_files / max(elapsed, 1e-9):,.0f} files/s, {checked_bytes / 1024**2 / max(elapsed, 1e-9):,.1f} MiB/s. "
+            f"{cached} doujinshis unchanged since checked, {deferred} left for the next run (time budget), "
+            f"{len(to_delete)} broken pages"
+        )
+        return to_delete
+
+    def _plan_repair(self, doujin_dir: Path, broken: dict[str, str]) -> RepairItem:
+        """
+        Lists a damaged doujinshi directory to find what to delete and which pages to download.
+        Blocking, run in the thread pool.
+
+        :param broken: The pages found broken by the verification, {file name: why}.
+        """
+        scan: GalleryScan = self._cached_scan(doujin_dir)
+        page_count: int | None = scan.page_count
+        to_delete: list[tuple[Path, str]] = list()
+        pages: dict[int, list[Path]] = dict()
+        for entry in os.scandir(doujin_dir):
+            if entry.name == self._meta_filename:
+                continue
+            path: Path = doujin_dir / entry.name
+            if not entry.is_file(follow_symlinks=False):
+                to_delete.append((path, "Not a doujin image file"))
+                continue
+
+            name, _, ext = entry.name.partition(".")
+            if (
+                not name.isdigit()
+                or not ext
+                or int(name) < 1
+                or (page_count is not None and int(name) > page_count)
+            ):
+                to_delete.append((path, "Not a page of the doujinshi"))
+            elif entry.name in broken:
+                to_delete.append((path, broken[entry.name]))
+            elif entry.stat(follow_symlinks=False).st_size == 0:
+                to_delete.append((path, "Empty page"))
+            else:
+                pages.setdefault(int(name), []).append(path)
+
+        for page, paths in pages.items():
+            if len(paths) > 1:
+                # No telling which one is right: all are downloaded again.
+                to_delete.extend(
+                    (path, f"Page {page} saved {len(paths)} times") for path in paths
+                )
+
+        missing_pages: list[int] | None = None
+        if page_count is not None:
+            missing_pages = [
+                page
+                for page in range(1, page_count + 1)
+                if len(pages.get(page, ())) != 1
+            ]
+        return RepairItem(
+            doujin_dir, to_delete, missing_pages, rewrite_meta=page_count is None
+        )
+
+    async def _download_repairs(
+        self,
+        items: list[RepairItem],
+        scraper_kwargs: dict[str, Any] | None,
+        concurrency: int,
+    ) -> dict[Path, Any]:
+        """
+        Has the scraper download the missing pages and corrupt meta files of the doujinshis.
+
+        :returns: The `JobProgress` of every repair, by doujinshi directory.
+        """
+        # Imported here: only the repair mode needs the scraper and its dependencies.
+        from nhentai_scraper import Scraper
+
+        results: dict[Path, Any] = dict()
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        settings: dict[str, Any] = {
+            **_REPAIR_SCRAPER_SETTINGS,
+            **(scraper_kwargs or {}),
+        }
+        async with Scraper(str(self._doujin_dir), **settings) as scraper:
+
+            async def repair_one(item: RepairItem) -> None:
+                async with semaphore:
+                    results[item.doujin_dir] = await scraper.repair(
+                        int(item.doujin_dir.name),
+                        rewrite_meta=item.rewrite_meta,
+                        pages=item.missing_pages,
+                    )
+
+            await asyncio.gather(*(repair_one(item) for item in items))
+        return results
+
     def _do_delete(self, paths_in: Iterable[tuple[Path, str]]) -> None:
         """
         Prompts user to delete the input paths.
         """
         items = sorted(paths_in, key=lambda item: len(item[0].parts), reverse=True)
 
-        if not ask_delete_dirs(items):
+        if not ask_delete_dirs(items, self._sizes):
             print("Aborting deletion...")
             return
 
         count: int = 0
         print("Deleting...")
         for path, _ in items:
-            try:
-                # Never descend into symlinks
-                if path.is_symlink():
-                    path.unlink()
-                    count += 1
-                    print(f"-> {path.name} deleted!")
-                elif path.is_dir():
-                    shutil.rmtree(path)
-                    count += 1
-                    print(f"-> {path.name} deleted!")
-                else:
-                    path.unlink()
-                    count += 1
-                    print(f"-> {path.name} deleted!")
-            except FileNotFoundError:
-                print(f"Cannot delete: item not found for path: {path}")
+            if delete_path(path):
+                count += 1
+                print(f"-> {path.name} deleted!")
 
         print(f"\n\nDeleted {count} items!")
 
-    def _do_cleanup(self) -> None:
+    def _scan_all(self) -> tuple[list[tuple[Path, str]], list[Path]]:
         """
-        Deletes.
+        Scans every doujinshi directory.
+
+        :returns: The paths to delete with the reason why, and the directories of the doujinshis
+            not deleted whole (whose pages may be verified).
         """
-        doujinshi_dirs: int = 0
+        doujinshi_dirs: list[Path] = list()
         to_delete: list[tuple[Path, str]] = list()
 
-        for entry in self._doujin_dir.iterdir():
+        start: float = time.perf_counter()
+        for entry in os.scandir(self._doujin_dir):
+            # Hidden: the files of the tools (caches, content store, ...).
+            if entry.name.startswith("."):
+                continue
+
             # We don't want any non-directories
             if not entry.is_dir():
                 print(f"-> '{entry.name}' is not a directory; ignoring.")
@@ -144,14 +605,123 @@ class Cleanup:
                 )
                 continue
 
-            doujinshi_dirs += 1
-            to_delete.extend(self._clean_dir(entry))
+            doujinshi_dirs.append(Path(entry.path))
+
+        # Scanning is syscalls and disk waits: threads overlap them.
+        complete_dirs: list[Path] = list()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            scans = executor.map(self._cached_scan, doujinshi_dirs)
+            for doujin_dir, scan in zip(doujinshi_dirs, scans):
+                findings: list[tuple[Path, str]] = self._clean_dir(doujin_dir, scan)
+                to_delete.extend(findings)
+                if all(path != doujin_dir for path, _ in findings):
+                    complete_dirs.append(doujin_dir)
+        elapsed: float = time.perf_counter() - start
+
+        self._cache.save(path.name for path in doujinshi_dirs)
+        print(
+            f"Scanned {len(doujinshi_dirs)} doujinshis ({self._cache.hits} unchanged since the last run) "
+            f"in {elapsed:.1f}s ({len(doujinshi_dirs) / max(elapsed, 1e-9):,.0f} doujinshis/s)"
+        )
+        return to_delete, complete_dirs
+
+    def _do_cleanup(self) -> None:
+        """
+        Deletes.
+        """
+        to_delete, complete_dirs = self._scan_all()
+        if self._verify:
+            to_delete.extend(self._verify_pages(complete_dirs))
 
         self._do_delete(to_delete)
 
     def cleanup(self) -> None:
         self._do_cleanup()
 
+    def repair(
+        self, scraper_kwargs: dict[str, Any] | None = None, concurrency: int = 8
+    ) -> None:
+        """
+        Repairs the damaged doujinshis instead of deleting them, without asking: deletes only
+        the bad files (stray files, broken pages), then downloads only the missing pages,
+        and rewrites the meta files only if corrupt. The bandwidth used is proportional to
+        the damage, not to the size of the damaged doujinshis.
+
+        :param scraper_kwargs: The arguments of the `Scraper` downloading the pages, e.g. its rate limits.
+        :param concurrency: The number of doujinshis repaired at once.
+        """
+        findings, complete_dirs = self._scan_all()
+        broken_pages: dict[Path, dict[str, str]] = dict()
+        for path, _ in findings:
+            # A finding is either a doujinshi directory, or a file inside one.
+            doujin_dir: Path = path if path.parent == self._doujin_dir else path.parent
+            broken_pages.setdefault(doujin_dir, dict())
+        if self._verify:
+            # The pages left in the damaged doujinshis are kept, so they are checked too.
+            for path, reason in self._verify_pages(complete_dirs + list(broken_pages)):
+                broken_pages.setdefault(path.parent, dict())[path.name] = reason
+
+        damaged_dirs: list[Path] = sorted(broken_pages, key=lambda p: int(p.name))
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            items: list[RepairItem] = list(
+                executor.map(
+                    lambda d: self._plan_repair(d, broken_pages[d]), damaged_dirs
+                )
+            )
+
+        deleted: int = 0
+        for item in items:
+            for path, reason in item.to_delete:
+                if delete_path(path):
+                    deleted += 1
+                    print(f"-> {path} deleted (reason: {reason})")
+
+        to_download: list[RepairItem] = [item for item in items if item.needs_download]
+        known_pages: int = sum(len(item.missing_pages or ()) for item in to_download)
+        print(
+            f"{len(items)} damaged doujinshis: {deleted} bad files deleted, "
+            f"{known_pages} pages and {sum(item.rewrite_meta for item in to_download)} meta files "
+            f"to download for {len(to_download)} of them"
+        )
+        if not to_download:
+            return
+
+        start: float = time.perf_counter()
+        results = asyncio.run(
+            self._download_repairs(to_download, scraper_kwargs, concurrency)
+        )
+        elapsed: float = time.perf_counter() - start
+
+        failed: list[Path] = [
+            item.doujin_dir
+            for item in to_download
+            if not (job := results.get(item.doujin_dir)) or not job.complete
+        ]
+        downloaded: int = sum(job.bytes for job in results.values())
+        damaged_size: int = sum(self._sizes.get(d, 0) for d in damaged_dirs)
+        print(
+            f"Repaired {len(to_download) - len(failed)} of {len(to_download)} doujinshis in {elapsed:.1f}s: "
+            f"downloaded {downloaded / 1024**2:,.1f} MiB, the damaged doujinshis held "
+            f"{damaged_size / 1024**2:,.1f} MiB before the repair"
+        )
+        for doujin_dir in failed:
+            print(f"-> Failed to repair {doujin_dir}: run the repair again later")
+
+
+def delete_path(path: Path) -> bool:
+    """Deletes a file or directory tree, never descending into symlinks. Returns True if deleted."""
+    try:
+        if path.is_symlink():
+            path.unlink()
+        elif path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+        return True
+    except FileNotFoundError:
+        print(f"Cannot delete: item not found for path: {path}")
+        return False
+
 
 def get_user_input(prompt: str = "") -> str:
     return input(f"\n{prompt} -> ")
@@ -174,7 +744,7 @@ def total_size(paths: list[Path]) -> int:
     )
 
 
-def get_summary(paths: Iterable[Path]) -> str:
+def get_summary(paths: Iterable[Path], sizes: dict[Path, int] | None = None) -> str:
     count: int = 0
     dirs: int = 0
     files: int = 0
@@ -188,7 +758,11 @@ def get_summary(paths: Iterable[Path]) -> str:
         else:
             others += 1
 
-    size_mib: float = total_size(list(paths)) / (1024 * 1024)
+    if sizes is not None and all(p in sizes for p in paths):
+        # Collected while scanning: no second walk of the tree.
+        size_mib: float = sum(sizes[p] for p in paths) / (1024 * 1024)
+    else:
+        size_mib = total_size(list(paths)) / (1024 * 1024)
     show_size: str = f"{size_mib:,.3f} MiB".replace(",", " ")
     return (
         f"Summary of items to delete ({show_size}):\n"
@@ -199,7 +773,9 @@ def get_summary(paths: Iterable[Path]) -> str:
     )
 
 
-def ask_delete_dirs(paths: Iterable[tuple[Path, str]]) -> bool:
+def ask_delete_dirs(
+    paths: Iterable[tuple[Path, str]], sizes: dict[Path, int] | None = None
+) -> bool:
     """
     Asks the user if they want to proceed and delete the paths.
     True: delete
@@ -212,7 +788,7 @@ def ask_delete_dirs(paths: Iterable[tuple[Path, str]]) -> bool:
     for path, reason in paths:
         print(f"-> {str(path):<{align_num}} (reason: {reason})")
     # Print summary with number of items and their types.
-    print(get_summary([p for p, _ in paths]), end="\n\n")
+    print(get_summary([p for p, _ in paths], sizes), end="\n\n")
 
     p1 = "Do you want to delete all of the above? [y/N]"
     p2 = "ARE YOU SURE?! [y/N]"
@@ -241,7 +817,46 @@ def get_user_confirmation(doujin_dir: Path) -> bool:
 
 
 def main() -> None:
-    usr_in: str = get_user_input("Doujinshi directory path")
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    arg_parser.add_argument(
+        "doujin_dir", nargs="?", help="Where the doujinshis are (asked if not given)"
+    )
+    arg_parser.add_argument(
+        "--verify",
+        nargs="?",
+        const=CheckDepth.MARKERS,
+        type=CheckDepth,
+        choices=list(CheckDepth),
+        help="Also check that every page is a valid image, at this depth (default: markers)",
+    )
+    arg_parser.add_argument(
+        "--verify-workers",
+        type=int,
+        help="Processes checking pages (default: one per core)",
+    )
+    arg_parser.add_argument(
+        "--verify-budget",
+        type=float,
+        metavar="SECONDS",
+        help="Stop starting new checks after this long, the next runs continue",
+    )
+    arg_parser.add_argument(
+        "--repair",
+        action="store_true",
+        help="Re-download the missing and broken pages and the corrupt meta files instead of "
+        "deleting the doujinshis. Does not ask: doujin_dir is then required",
+    )
+    arg_parser.add_argument(
+        "--site-url",
+        help="With --repair, the root URL of the site to download from (default: nhentai.net)",
+    )
+    args = arg_parser.parse_args()
+    if args.verify and not args.verify.available():
+        arg_parser.error(f"--verify {args.verify} requires the 'Pillow' package")
+    if args.repair and not args.doujin_dir:
+        arg_parser.error("--repair requires doujin_dir")
+
+    usr_in: str = args.doujin_dir or get_user_input("Doujinshi directory path")
     if not usr_in:
         print("Path error: no path")
         return
@@ -255,13 +870,21 @@ def main() -> None:
         print("Path error: path does not exist or is not a directory.")
         return
 
-    if not get_user_confirmation(doujin_dir):
+    if not args.repair and not get_user_confirmation(doujin_dir):
         print("Aborting cleaning...")
         exit(0)
 
     print()
-    clean: Cleanup = Cleanup(str(doujin_dir))
-    clean.cleanup()
+    clean: Cleanup = Cleanup(
+        str(doujin_dir),
+        verify=args.verify,
+        verify_workers=args.verify_workers,
+        verify_budget_s=args.verify_budget,
+    )
+    if args.repair:
+        clean.repair({"site_url": args.site_url} if args.site_url else None)
+    else:
+        clean.cleanup()
 
 
 def print_notice() -> None:
@@ -271,6 +894,8 @@ def print_notice() -> None:
         f"\t* only one page of the doujin is missing\n"
         f"\t* there is a file that throws off the page count. e.g., some random .Thumbs or text file\n"
         f"\t* the JSON metadata file is corrupt or non-existant\n"
+        f"NOTICE: With --verify, it also deletes every page that is not a whole, valid image.\n"
+        f"NOTICE: With --repair, it re-downloads what is missing or broken instead of deleting doujinshis.\n"
     )
 
     print(notes)
@@ -0,0 +1,138 @@
+"""
+content_store.py
+
+Content-addressed store of image files: one blob per distinct content (by SHA-256),
+hardlinked from every doujinshi directory holding that content. The directories keep
+their `{page}.{ext}` layout, they just share inodes.
+
+The store must be on the same filesystem as the doujinshi directories (hardlinks).
+"""
+
+import hashlib
+import logging
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+log: logging.Logger = logging.getLogger("scraper")
+
+
+@dataclass
+class DedupStats:
+    """
+    Counters of what the content store did with the files given to it.
+    """
+
+    files: int = 0
+    bytes: int = 0
+    new_blobs: int = 0
+    duplicates: int = 0
+    already_linked: int = 0
+    bytes_reclaimed: int = 0
+
+    def __str__(self) -> str:
+        reclaimed_pct: float = (
+            self.bytes_reclaimed / self.bytes * 100 if self.bytes else 0.0
+        )
+        return (
+            f"{self.files} files ({self.bytes / 1024**2:,.1f} MiB): {self.new_blobs} new blobs, "
+            f"{self.duplicates} duplicates, {self.already_linked} already linked, {self.bytes_reclaimed / 1024**2:,.1f} MiB reclaimed ({reclaimed_pct:.1f}%)"
+        )
+
+
+class ContentStore:
+    def __init__(self, root: str | Path) -> None:
+        """
+        :param root: The directory of the blobs, created if needed.
+        """
+        self._root: Path = Path(root)
+        self._root.mkdir(parents=True, exist_ok=True)
+        self.stats: DedupStats = DedupStats()
+        # Only guards the stats: the files are handled with atomic links and renames.
+        self._lock: threading.Lock = threading.Lock()
+
+    @staticmethod
+    def hasher() -> Any:
+        """A new hash object, to feed as a file is written and then pass to `add()`."""
+        return hashlib.sha256()
+
+    @staticmethod
+    def hash_file(file_path: Path) -> str:
+        with file_path.open("rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+    def blob_path(self, digest: str) -> Path:
+        return self._root / digest[:2] / digest[2:]
+
+    def add(self, file_path: Path, digest: str) -> int:
+        """
+        Makes `file_path` a hardlink to the blob of its content `digest`: the file becomes
+        the blob if there is none yet, else it is atomically replaced by a link to it.
+        Blocking, run in a thread from async code. Safe to call from several threads.
+
+        :returns: The number of bytes freed on disk.
+        """
+        blob: Path = self.blob_path(digest)
+        st: os.stat_result = file_path.stat()
+        reclaimed: int = 0
+        new_blob: bool = False
+        already_linked: bool = False
+        try:
+            blob.parent.mkdir(exist_ok=True)
+            try:
+                os.link(file_path, blob)
+                new_blob = True
+            except FileExistsError:
+                blob_st: os.stat_result = blob.stat()
+                already_linked = (blob_st.st_ino, blob_st.st_dev) == (
+                    st.st_ino,
+                    st.st_dev,
+                )
+                if not already_linked:
+                    if blob_st.st_size != st.st_size:
+                        # Not a real duplicate: the blob got corrupted.
+                        raise ValueError(f"blob {blob} does not match its digest")
+                    # Linked aside then renamed: the file never goes missing.
+                    tmp_path: Path = file_path.with_name(f".{file_path.name}.link")
+                    tmp_path.unlink(missing_ok=True)
+                    os.link(blob, tmp_path)
+                    os.replace(tmp_path, file_path)
+                    # The old inode is only freed if nothing else linked to it.
+                    if st.st_nlink == 1:
+                        reclaimed = st.st_size
+        except Exception as e:
+            log.warning(f"Failed to deduplicate {file_path}: {e}")
+            return 0
+
+        with self._lock:
+            self.stats.files += 1
+            self.stats.bytes += st.st_size
+            if new_blob:
+                self.stats.new_blobs += 1
+            elif already_linked:
+                self.stats.already_linked += 1
+            else:
+                self.stats.duplicates += 1
+            self.stats.bytes_reclaimed += reclaimed
+        return reclaimed
+
+    def prune(self) -> tuple[int, int]:
+        """
+        Deletes the blobs no doujinshi links to anymore (link count of 1).
+
+        :returns: A tuple of (number of blobs deleted, bytes freed).
+        """
+        deleted: int = 0
+        freed: int = 0
+        for prefix in os.scandir(self._root):
+            if not prefix.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(prefix.path):
+                st: os.stat_result = entry.stat(follow_symlinks=False)
+                if st.st_nlink == 1:
+                    os.unlink(entry.path)
+                    deleted += 1
+                    freed += st.st_size
+        return deleted, freed
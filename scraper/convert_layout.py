@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+
+"""
+convert_layout.py
+
+Converts a doujinshi directory between the loose layout (`{id}/` directories of files)
+and the packed one (`{id}.cbz` stored archives), in parallel, in place.
+
+    python3 convert_layout.py ../manga/ --to packed
+    python3 convert_layout.py ../manga/ --to loose
+
+Incomplete doujinshis are left loose, so that the scraper can still resume them.
+Do not run it while the same directory is being scraped.
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator
+
+from packed_gallery import PACKED_SUFFIX, pack_dir, unpack
+
+
+def iter_loose(doujin_dir: Path) -> Iterator[Path]:
+    for entry in os.scandir(doujin_dir):
+        if entry.name.isdigit() and entry.is_dir(follow_symlinks=False):
+            yield Path(entry.path)
+
+
+def iter_packed(doujin_dir: Path) -> Iterator[Path]:
+    for entry in os.scandir(doujin_dir):
+        id, _, suffix = entry.name.partition(".")
+        if id.isdigit() and f".{suffix}" == PACKED_SUFFIX and entry.is_file():
+            yield Path(entry.path)
+
+
+def convert(func: Callable[[Path], Path], path: Path) -> int:
+    """Returns the size of what was converted, 0 if it failed or was skipped."""
+    try:
+        converted: Path = func(path)
+    except Exception as e:
+        print(f"-> '{path.name}' skipped: {e}")
+        return 0
+    if converted.is_file():
+        return converted.stat().st_size
+    return sum(entry.stat().st_size for entry in os.scandir(converted))
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("doujin_dir", type=Path, help="Where the doujinshis are")
+    arg_parser.add_argument("--to", choices=("packed", "loose"), required=True)
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+        help="Doujinshis converted at once",
+    )
+    args = arg_parser.parse_args()
+
+    if not args.doujin_dir.is_dir():
+        arg_parser.error(f"{args.doujin_dir} is not a directory")
+    if args.to == "packed":
+        func, paths = pack_dir, iter_loose(args.doujin_dir)
+    else:
+        func, paths = unpack, iter_packed(args.doujin_dir)
+
+    converted: int = 0
+    failed: int = 0
+    size: int = 0
+    start: float = time.perf_counter()
+
+    def collect(future: Future[int]) -> None:
+        nonlocal converted, failed, size
+        if written := future.result():
+            converted += 1
+            size += written
+        else:
+            failed += 1
+
+    # Conversions are mostly disk I/O: threads overlap them.
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        # Bounded read-ahead of the directory walk.
+        pending: deque[Future[int]] = deque()
+        for path in paths:
+            pending.append(executor.submit(convert, func, path))
+            if len(pending) >= args.workers * 4:
+                collect(pending.popleft())
+        for future in pending:
+            collect(future)
+    elapsed: float = time.perf_counter() - start
+
+    print(
+        f"Converted {converted} doujinshis to {args.to} ({size / 1024**2:,.1f} MiB), {failed} skipped, "
+        f"in {elapsed:.1f}s ({converted / elapsed:,.1f} doujinshis/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
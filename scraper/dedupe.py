@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+
+"""
+dedupe.py
+
+Deduplicates the images of an existing doujinshi directory in place: every image is
+hashed and hardlinked to one blob per content in the content store, then reports the
+bytes reclaimed. The `{id}/{page}.{ext}` layout does not change.
+
+    python3 dedupe.py ../manga/ --store ../manga/.blobs --workers 16
+
+Pass the same store to `Scraper(content_store_dir=...)` so new downloads link to it too.
+Do not run it while the same directory is being scraped without the content store.
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+from content_store import ContentStore
+
+
+def iter_images(doujin_dir: Path, meta_filename: str = "meta.json") -> Iterator[Path]:
+    """Yields the image files of every doujinshi directory (named after its ID)."""
+    for doujin in os.scandir(doujin_dir):
+        if not doujin.name.isdigit() or not doujin.is_dir(follow_symlinks=False):
+            continue
+        for entry in os.scandir(doujin.path):
+            # Skips the metadata and the hidden in-progress files.
+            if entry.name == meta_filename or entry.name.startswith("."):
+                continue
+            if entry.is_file(follow_symlinks=False):
+                yield Path(entry.path)
+
+
+def dedupe_file(store: ContentStore, file_path: Path) -> int:
+    try:
+        digest: str = store.hash_file(file_path)
+    except OSError as e:
+        print(f"Failed to hash {file_path}: {e}")
+        return 0
+    return store.add(file_path, digest)
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("doujin_dir", type=Path, help="Where the doujinshis are")
+    arg_parser.add_argument(
+        "--store",
+        type=Path,
+        help="The content store directory, on the same filesystem (default: DOUJIN_DIR/.blobs)",
+    )
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+        help="Files hashed at once",
+    )
+    arg_parser.add_argument(
+        "--prune",
+        action="store_true",
+        help="Also delete the blobs no doujinshi links to anymore",
+    )
+    args = arg_parser.parse_args()
+
+    if not args.doujin_dir.is_dir():
+        arg_parser.error(f"{args.doujin_dir} is not a directory")
+    store = ContentStore(args.store or args.doujin_dir / ".blobs")
+
+    start: float = time.perf_counter()
+    # Hashing releases the GIL: threads read and hash files in parallel.
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        # Bounded read-ahead of the directory walk: millions of files never sit in memory.
+        pending: deque[Future[int]] = deque()
+        for path in iter_images(args.doujin_dir):
+            pending.append(executor.submit(dedupe_file, store, path))
+            if len(pending) >= args.workers * 4:
+                pending.popleft().result()
+        for future in pending:
+            future.result()
+    elapsed: float = time.perf_counter() - start
+
+    stats = store.stats
+    print(f"Deduplicated {stats}")
+    print(
+        f"{stats.files / elapsed:,.0f} files/s, {stats.bytes / 1024**2 / elapsed:,.1f} MiB/s ({elapsed:.1f}s)"
+    )
+
+    if args.prune:
+        deleted, freed = store.prune()
+        print(f"Pruned {deleted} unused blobs, {freed / 1024**2:,.1f} MiB freed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+id_permutation.py
+
+A pseudo-random permutation of 0..size-1 computed on the fly, in constant memory:
+the i-th element is known without generating the ones before it, so an iteration
+can be resumed from any (seed, position).
+
+It is a keyed Feistel network over the smallest power-of-4 domain holding `size`
+values, with cycle-walking to stay within `size` (at most 4 tries on average).
+"""
+
+import random
+from typing import Iterator
+
+_MASK_64: int = (1 << 64) - 1
+
+
+class RandomPermutation:
+    def __init__(self, size: int, seed: int, rounds: int = 4) -> None:
+        """
+        :param size: The number of values to permute.
+        :param seed: Two permutations with the same size and seed are identical.
+        :param rounds: The number of Feistel rounds. 4 is enough to look random.
+        """
+        if size < 1:
+            raise ValueError("The size of a permutation must be at least 1")
+
+        self._size: int = size
+        self.seed: int = seed
+        self._half_bits: int = max(1, ((size - 1).bit_length() + 1) // 2)
+        self._half_mask: int = (1 << self._half_bits) - 1
+        rnd = random.Random(seed)
+        self._keys: list[int] = [rnd.getrandbits(64) for _ in range(rounds)]
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _round(self, half: int, key: int) -> int:
+        x: int = ((half ^ key) * 0x9E3779B97F4A7C15) & _MASK_64
+        x ^= x >> 29
+        return x & self._half_mask
+
+    def _feistel(self, x: int) -> int:
+        left, right = x >> self._half_bits, x & self._half_mask
+        for key in self._keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self._half_bits) | right
+
+    def __getitem__(self, position: int) -> int:
+        """Returns the value at `position`, from 0 to size-1."""
+        if not 0 <= position < self._size:
+            raise IndexError(f"Position {position} out of range")
+
+        x: int = self._feistel(position)
+        # Cycle-walking: the domain is larger than size, apply again until within.
+        while x >= self._size:
+            x = self._feistel(x)
+        return x
+
+    def iter_from(self, start: int = 0, stop: int | None = None) -> Iterator[int]:
+        """Yields the values from `start` up to `stop` (excluded, defaults to size)."""
+        for position in range(start, self._size if stop is None else stop):
+            yield self[position]
+
+    def __iter__(self) -> Iterator[int]:
+        return self.iter_from()
+
+
+class PermutationCursor:
+    """
+    Iterates over `offset` + the values of a permutation from position `start` to `stop`,
+    remembering the values handed out and not reported `done()` yet so that the iteration
+    can be resumed without skipping any.
+    """
+
+    def __init__(
+        self,
+        permutation: RandomPermutation,
+        start: int = 0,
+        stop: int | None = None,
+        offset: int = 0,
+    ) -> None:
+        self._permutation: RandomPermutation = permutation
+        self._start: int = start
+        self._stop: int = len(permutation) if stop is None else stop
+        self._offset: int = offset
+        self.position: int = start
+        # {value handed out: its position}, until done.
+        self._unfinished: dict[int, int] = dict()
+
+    def __len__(self) -> int:
+        return max(0, self._stop - self._start)
+
+    def __iter__(self) -> Iterator[int]:
+        for position in range(self._start, self._stop):
+            self.position = position + 1
+            value: int = self._offset + self._permutation[position]
+            self._unfinished[value] = position
+            yield value
+
+    def done(self, value: int) -> None:
+        """Records that `value`, handed out, is finished."""
+        self._unfinished.pop(value, None)
+
+    @property
+    def resume_position(self) -> int:
+        """The position to resume from: the first one handed out and not done."""
+        return min(self._unfinished.values(), default=self.position)
@@ -0,0 +1,129 @@
+"""
+image_check.py
+
+Checks that downloaded pages are whole, valid images: not empty, not an HTML error page
+saved as an image, not truncated. The checks are module-level functions, so that they
+can run in a process pool.
+"""
+
+import os
+from enum import Enum
+
+try:
+    from PIL import Image
+except ImportError:  # Optional: only needed to fully decode the images.
+    Image = None
+
+
+class CheckDepth(Enum):
+    """
+    How thoroughly an image is checked. Each depth includes the previous ones.
+    """
+
+    # The magic number of a known image format.
+    HEADER = "header"
+    # And the end marker (or size) of that format: catches truncation.
+    MARKERS = "markers"
+    # And the whole image decodes. Requires Pillow, and a lot more CPU.
+    DECODE = "decode"
+
+    def __str__(self) -> str:
+        return self.value
+
+    @property
+    def level(self) -> int:
+        return list(CheckDepth).index(self)
+
+    def available(self) -> bool:
+        return self != CheckDepth.DECODE or Image is not None
+
+
+_HEAD_SIZE: int = 16
+_TAIL_SIZE: int = 64
+
+
+def _format_of(head: bytes) -> str | None:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "gif"
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def _check_end(fmt: str, head: bytes, tail: bytes, size: int) -> str | None:
+    if fmt == "jpg":
+        if b"\xff\xd9" not in tail:
+            return "no JPEG end marker (truncated?)"
+    elif fmt == "png":
+        if b"IEND\xaeB`\x82" not in tail:
+            return "no PNG IEND chunk (truncated?)"
+    elif fmt == "gif":
+        if not tail.rstrip(b"\x00").endswith(b";"):
+            return "no GIF trailer (truncated?)"
+    elif fmt == "webp":
+        riff_size: int = int.from_bytes(head[4:8], "little")
+        if size < riff_size + 8:
+            return f"WEBP is {size} bytes, its header says {riff_size + 8} (truncated?)"
+    return None
+
+
+def check_image(path: str, depth: CheckDepth = CheckDepth.MARKERS) -> str | None:
+    """
+    Checks one image file.
+
+    :returns: Why the image is broken, None if it is fine.
+    """
+    try:
+        with open(path, "rb") as f:
+            size: int = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return "empty file"
+            head: bytes = f.read(_HEAD_SIZE)
+            fmt: str | None = _format_of(head)
+            if fmt is None:
+                if head.lstrip().startswith(b"<"):
+                    return "HTML or XML, not an image"
+                return f"unknown image format (starts with {head[:8].hex()})"
+            if depth == CheckDepth.HEADER:
+                return None
+
+            f.seek(max(0, size - _TAIL_SIZE))
+            tail: bytes = f.read(_TAIL_SIZE)
+            if error := _check_end(fmt, head, tail, size):
+                return error
+            if depth == CheckDepth.MARKERS:
+                return None
+
+        if Image is None:
+            raise RuntimeError("Decoding the images requires the 'Pillow' package")
+        with Image.open(path) as image:
+            image.load()
+    except RuntimeError:
+        raise
+    except Exception as e:
+        return f"cannot be read: {e}"
+    return None
+
+
+def check_images(
+    paths: list[str], depth: CheckDepth = CheckDepth.MARKERS
+) -> tuple[dict[str, str], int]:
+    """
+    Checks a batch of images, e.g. the pages of one doujinshi: one task for a process pool.
+
+    :returns: A tuple of ({path: why it is broken} for the broken ones, bytes checked).
+    """
+    broken: dict[str, str] = dict()
+    checked_bytes: int = 0
+    for path in paths:
+        if error := check_image(path, depth):
+            broken[path] = error
+        try:
+            checked_bytes += os.stat(path).st_size
+        except OSError:
+            pass
+    return broken, checked_bytes
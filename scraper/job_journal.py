@@ -0,0 +1,211 @@
+"""
+job_journal.py
+
+Persistent journal of the scraping jobs (one per doujinshi ID), stored in SQLite,
+so that long runs can be interrupted and resumed.
+"""
+
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from enum import Enum
+from pathlib import Path
+from typing import Iterator
+
+log: logging.Logger = logging.getLogger("scraper")
+
+
+class JobState(Enum):
+    """
+    Enum representing the state of the job of scraping one doujinshi.
+    """
+
+    PENDING = (
+        "pending"  # Was in flight when a run was interrupted: to be scraped again.
+    )
+    IN_FLIGHT = "in_flight"  # Being scraped by the current run.
+    DONE = "done"
+    FAILED = "failed"
+    NOT_FOUND = "not_found"  # The ID does not exist (anymore).
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass
+class JobProgress:
+    """
+    What happened during the job of scraping one doujinshi, filled in as it goes.
+    """
+
+    last_status: int | None = None
+    bytes: int = 0
+    not_found: bool = False
+    complete: bool = False
+
+    @property
+    def state(self) -> JobState:
+        if self.complete:
+            return JobState.DONE
+        if self.not_found:
+            return JobState.NOT_FOUND
+        return JobState.FAILED
+
+
+class JobJournal:
+    _SCHEMA: str = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_status INTEGER,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL NOT NULL
+        )
+    """
+    _START: str = """
+        INSERT INTO jobs (id, state, attempts, updated_at) VALUES (?, ?, 1, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            state = excluded.state, attempts = attempts + 1, updated_at = excluded.updated_at
+    """
+    _FINISH: str = """
+        INSERT INTO jobs (id, state, attempts, last_status, bytes, updated_at) VALUES (?, ?, 1, ?, ?, ?)
+        ON CONFLICT (id) DO UPDATE SET
+            state = excluded.state, last_status = excluded.last_status,
+            bytes = excluded.bytes, updated_at = excluded.updated_at
+    """
+
+    def __init__(
+        self,
+        filepath: str,
+        max_attempts: int = 3,
+        flush_every: int = 500,
+        flush_interval: float = 5.0,
+    ) -> None:
+        """
+        :param filepath: The SQLite file of the journal, created if needed.
+        :param max_attempts: IDs that failed this many times are not retried anymore.
+        :param flush_every: Write the pending updates to disk once there are this many of them...
+        :param flush_interval: ...or once the oldest one is this many seconds old.
+        """
+        self._filepath: Path = Path(filepath)
+        self._max_attempts: int = max(1, max_attempts)
+        self._flush_every: int = max(1, flush_every)
+        self._flush_interval: float = flush_interval
+
+        self._db: sqlite3.Connection = sqlite3.connect(self._filepath)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(self._SCHEMA)
+        # Left in flight by an interrupted run: the attempt never ended, so it is not counted.
+        self._db.execute(
+            "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0) WHERE state = ?",
+            (str(JobState.PENDING), str(JobState.IN_FLIGHT)),
+        )
+        self._db.commit()
+
+        self._pending_starts: list[tuple[int, str, float]] = list()
+        self._pending_finishes: list[tuple[int, str, int | None, int, float]] = list()
+        self._oldest_pending: float | None = None
+
+        # One bit per ID: set if the ID never needs to be scraped again.
+        self._finished: bytearray = bytearray()
+        self._load_finished()
+
+    def _load_finished(self) -> None:
+        count: int = 0
+        for (id,) in self._db.execute(
+            "SELECT id FROM jobs WHERE state IN (?, ?) OR (state = ? AND attempts >= ?)",
+            (
+                str(JobState.DONE),
+                str(JobState.NOT_FOUND),
+                str(JobState.FAILED),
+                self._max_attempts,
+            ),
+        ):
+            self._set_finished(id)
+            count += 1
+        log.info(f"Job journal {self._filepath}: {count} IDs already finished")
+
+    def _set_finished(self, id: int) -> None:
+        byte: int = id >> 3
+        if byte >= len(self._finished):
+            self._finished.extend(bytes(byte - len(self._finished) + 1024))
+        self._finished[byte] |= 1 << (id & 7)
+
+    def is_finished(self, id: int) -> bool:
+        """
+        Returns True if the ID is done, does not exist, or failed too many times.
+        Does not touch the disk.
+        """
+        byte: int = id >> 3
+        return byte < len(self._finished) and bool(
+            self._finished[byte] & (1 << (id & 7))
+        )
+
+    def start(self, id: int) -> None:
+        """Records that the ID is being scraped (one more attempt)."""
+        self._pending_starts.append((id, str(JobState.IN_FLIGHT), time.time()))
+        self._maybe_flush()
+
+    def finish(self, id: int, progress: JobProgress) -> None:
+        """Records how the scrape of the ID ended."""
+        state: JobState = progress.state
+        if state != JobState.FAILED:
+            self._set_finished(id)
+        self._pending_finishes.append(
+            (id, str(state), progress.last_status, progress.bytes, time.time())
+        )
+        self._maybe_flush()
+
+    def _maybe_flush(self) -> None:
+        now: float = time.monotonic()
+        if self._oldest_pending is None:
+            self._oldest_pending = now
+
+        pending: int = len(self._pending_starts) + len(self._pending_finishes)
+        if (
+            pending >= self._flush_every
+            or now - self._oldest_pending >= self._flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all the pending updates to disk, in one transaction."""
+        if not self._pending_starts and not self._pending_finishes:
+            return
+        try:
+            with self._db:
+                # Starts first: a job always starts before it finishes.
+                self._db.executemany(self._START, self._pending_starts)
+                self._db.executemany(self._FINISH, self._pending_finishes)
+        except sqlite3.Error as e:
+            log.error(f"Failed to write to the job journal {self._filepath}: {e}")
+            return
+
+        self._pending_starts.clear()
+        self._pending_finishes.clear()
+        self._oldest_pending = None
+
+    def unfinished_ids(self) -> Iterator[int]:
+        """
+        Yields the IDs that failed and can still be retried, or were interrupted.
+        """
+        self.flush()
+        # Fetched at once: the journal is written to while these are scraped.
+        rows: list[tuple[int]] = self._db.execute(
+            "SELECT id FROM jobs WHERE (state = ? AND attempts < ?) OR state = ? ORDER BY id",
+            (str(JobState.FAILED), self._max_attempts, str(JobState.PENDING)),
+        ).fetchall()
+        for (id,) in rows:
+            yield id
+
+    def summary(self) -> dict[str, int]:
+        """Returns the number of IDs in each state."""
+        self.flush()
+        return dict(self._db.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state"))
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
@@ -0,0 +1,342 @@
+"""
+library_index.py
+
+One SQLite index of the downloaded library, one row per doujinshi: its metadata,
+page count, page extensions, size on disk and whether it is complete. Kept up to date
+by the scraper as doujinshis finish, so that consumers (the web backend, the tag index)
+read one file instead of every `meta.json`, and never walk the tree.
+
+Rebuilt from an existing tree with `rebuild_index.py`.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zipfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from packed_gallery import PACKED_SUFFIX
+from parsers import IMAGE_TYPES
+
+log: logging.Logger = logging.getLogger("scraper")
+
+# One letter per page extension, as in the page tables of the site.
+_EXTENSION_CODES: dict[str, str] = {ext: code for code, ext in IMAGE_TYPES.items()}
+_MISSING_PAGE: str = "-"
+_OTHER_EXTENSION: str = "?"
+
+
+@dataclass
+class GalleryEntry:
+    """
+    What the index knows about one doujinshi.
+    """
+
+    id: int
+    meta: dict[str, Any]
+    page_count: int
+    # The extension of every page, "" if the page is missing.
+    extensions: list[str]
+    bytes: int
+    complete: bool
+    packed: bool = False
+
+    def _row(self) -> tuple[Any, ...]:
+        codes: str = "".join(
+            (_EXTENSION_CODES.get(ext, _OTHER_EXTENSION) if ext else _MISSING_PAGE)
+            for ext in self.extensions
+        )
+        return (
+            self.id,
+            json.dumps(self.meta, ensure_ascii=False),
+            self.page_count,
+            codes,
+            self.bytes,
+            int(self.complete),
+            int(self.packed),
+            self.meta.get("datetime_iso8601"),
+            time.time(),
+        )
+
+
+def entry_from_files(
+    id: int,
+    meta: dict[str, Any],
+    files: dict[str, int],
+    meta_filename: str = "meta.json",
+) -> GalleryEntry:
+    """
+    Builds the entry of a doujinshi from its metadata and the listing of its files.
+
+    :param files: {file name: size}, e.g. from a `storage.Storage` listing.
+    :param meta_filename: Left out of the size, as are hidden files (e.g. partial downloads).
+    """
+    page_count: int = int(meta.get("pages") or 0)
+    extensions: list[str] = [""] * page_count
+    for filename, size in files.items():
+        name, _, ext = filename.partition(".")
+        if name.isdigit() and 1 <= int(name) <= page_count and size > 0:
+            extensions[int(name) - 1] = ext
+
+    return GalleryEntry(
+        id,
+        meta,
+        page_count,
+        extensions,
+        sum(
+            size
+            for filename, size in files.items()
+            if filename != meta_filename and not filename.startswith(".")
+        ),
+        complete=page_count > 0 and all(extensions),
+    )
+
+
+def scan_loose(
+    doujin_dir: Path,
+    meta: dict[str, Any] | None = None,
+    meta_filename: str = "meta.json",
+) -> GalleryEntry | None:
+    """
+    Builds the entry of a `{id}/` directory with one scandir. Blocking.
+
+    :param meta: The metadata, if already known. Read from `meta_filename` otherwise.
+    :returns: None if the metadata is missing or unreadable.
+    """
+    try:
+        if meta is None:
+            with (doujin_dir / meta_filename).open("r", encoding="utf-8") as f:
+                meta = json.load(f)
+        files: dict[str, int] = {
+            entry.name: entry.stat(follow_symlinks=False).st_size
+            for entry in os.scandir(doujin_dir)
+            if entry.is_file(follow_symlinks=False)
+        }
+        return entry_from_files(int(doujin_dir.name), meta, files, meta_filename)
+    except Exception as e:
+        log.debug(f"Cannot index {doujin_dir}: {e}")
+        return None
+
+
+def scan_packed(
+    archive_path: Path, meta_filename: str = "meta.json"
+) -> GalleryEntry | None:
+    """
+    Builds the entry of a `{id}.cbz` archive from its central directory. Blocking.
+
+    :returns: None if the archive or its metadata is unreadable.
+    """
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            meta: dict[str, Any] = json.loads(zf.read(meta_filename))
+            names: list[str] = zf.namelist()
+        page_count: int = int(meta.get("pages") or 0)
+        extensions: list[str] = [""] * page_count
+        for name in names:
+            page, _, ext = name.partition(".")
+            if page.isdigit() and 1 <= int(page) <= page_count:
+                extensions[int(page) - 1] = ext
+        size: int = archive_path.stat().st_size
+    except Exception as e:
+        log.debug(f"Cannot index {archive_path}: {e}")
+        return None
+
+    return GalleryEntry(
+        int(archive_path.name.removesuffix(PACKED_SUFFIX)),
+        meta,
+        page_count,
+        extensions,
+        size,
+        complete=page_count > 0 and all(extensions),
+        packed=True,
+    )
+
+
+def scan(path: Path) -> GalleryEntry | None:
+    """Builds the entry of a doujinshi, loose or packed. Blocking."""
+    if path.name.endswith(PACKED_SUFFIX):
+        return scan_packed(path)
+    return scan_loose(path)
+
+
+def iter_galleries(save_dir: Path) -> Iterator[Path]:
+    """Yields the path of every doujinshi of `save_dir`, loose or packed."""
+    for entry in os.scandir(save_dir):
+        id: str = entry.name.removesuffix(PACKED_SUFFIX)
+        if not id.isdigit():
+            continue
+        if entry.is_dir(follow_symlinks=False) != (id == entry.name):
+            # A directory named like an archive, or a file named like a directory.
+            continue
+        yield Path(entry.path)
+
+
+class LibraryIndex:
+    _SCHEMA: str = """
+        CREATE TABLE IF NOT EXISTS {table} (
+            id INTEGER PRIMARY KEY,
+            meta TEXT NOT NULL,
+            pages INTEGER NOT NULL,
+            extensions TEXT NOT NULL,
+            bytes INTEGER NOT NULL,
+            complete INTEGER NOT NULL,
+            packed INTEGER NOT NULL,
+            uploaded_at TEXT,
+            updated_at REAL NOT NULL
+        )
+    """
+    _PUT: str = "INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+    # Where replace_all() builds the new index before swapping it in.
+    _REBUILD_TABLE: str = "galleries_rebuild"
+    _REBUILD_BATCH: int = 1000
+
+    def __init__(
+        self, filepath: str, flush_every: int = 200, flush_interval: float = 5.0
+    ) -> None:
+        """
+        :param filepath: The SQLite file of the index, created if needed.
+        :param flush_every: Write the pending updates to disk once there are this many of them...
+        :param flush_interval: ...or once the oldest one is this many seconds old.
+        """
+        self._filepath: Path = Path(filepath)
+        self._flush_every: int = max(1, flush_every)
+        self._flush_interval: float = flush_interval
+
+        self._db: sqlite3.Connection = sqlite3.connect(self._filepath)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(self._SCHEMA.format(table="galleries"))
+        self._db.commit()
+
+        self._pending: dict[int, tuple[Any, ...]] = dict()
+        self._oldest_pending: float | None = None
+
+    def put(self, entry: GalleryEntry) -> None:
+        """Adds or replaces the row of a doujinshi."""
+        self._pending[entry.id] = entry._row()
+        now: float = time.monotonic()
+        if self._oldest_pending is None:
+            self._oldest_pending = now
+        if (
+            len(self._pending) >= self._flush_every
+            or now - self._oldest_pending >= self._flush_interval
+        ):
+            self.flush()
+
+    def flush(self) -> None:
+        """Writes all the pending updates to disk, in one transaction."""
+        if not self._pending:
+            return
+        try:
+            with self._db:
+                self._db.executemany(
+                    self._PUT.format(table="galleries"), self._pending.values()
+                )
+        except sqlite3.Error as e:
+            log.error(f"Failed to write to the library index {self._filepath}: {e}")
+            return
+        self._pending.clear()
+        self._oldest_pending = None
+
+    def replace_all(self, entries: Iterable[GalleryEntry]) -> int:
+        """
+        Replaces the whole index with `entries`: readers see either the old index or the new one.
+
+        The new index is written to a table aside in short transactions, as `entries` comes
+        (e.g. from a slow scan of the tree), then swapped in with one. The database is only
+        locked for one batch at a time: the scraper keeps updating it meanwhile, and the rows
+        it updated during the rebuild are kept over the scanned ones.
+        The swap bumps the `generation`: the scanned rows are stamped with their scan time,
+        older than the rows written meanwhile, so readers syncing by `updated_at` must then
+        read everything again.
+
+        :returns: The number of rows written.
+        """
+        self.flush()
+        started_at: float = time.time()
+        rebuild: str = self._REBUILD_TABLE
+        put: str = self._PUT.format(table=rebuild)
+        with self._db:
+            # Left over by an interrupted rebuild.
+            self._db.execute(f"DROP TABLE IF EXISTS {rebuild}")
+            self._db.execute(self._SCHEMA.format(table=rebuild))
+
+        count: int = 0
+        batch: list[tuple[Any, ...]] = list()
+        try:
+            for entry in entries:
+                batch.append(entry._row())
+                if len(batch) >= self._REBUILD_BATCH:
+                    with self._db:
+                        self._db.executemany(put, batch)
+                    count += len(batch)
+                    batch.clear()
+            with self._db:
+                self._db.executemany(put, batch)
+                count += len(batch)
+                self._db.execute(
+                    f"INSERT OR REPLACE INTO {rebuild} SELECT * FROM galleries WHERE updated_at >= ?",
+                    (started_at,),
+                )
+                self._db.execute("DROP TABLE galleries")
+                self._db.execute(f"ALTER TABLE {rebuild} RENAME TO galleries")
+                self._db.execute(f"PRAGMA user_version = {self.generation + 1}")
+        except BaseException:
+            with self._db:
+                self._db.execute(f"DROP TABLE IF EXISTS {rebuild}")
+            raise
+        return count
+
+    @property
+    def generation(self) -> int:
+        """How many times the index was rebuilt by `replace_all`. Kept as the SQLite user_version."""
+        return self._db.execute("PRAGMA user_version").fetchone()[0]
+
+    def get(self, id: int) -> dict[str, Any] | None:
+        """Returns the row of a doujinshi, its metadata decoded."""
+        self.flush()
+        cursor = self._db.execute("SELECT * FROM galleries WHERE id = ?", (id,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        result: dict[str, Any] = {
+            column[0]: value for column, value in zip(cursor.description, row)
+        }
+        result["meta"] = json.loads(result["meta"])
+        return result
+
+    def updated_since(self, timestamp: float) -> list[tuple[int, bool]]:
+        """
+        Returns the (id, packed) of the complete doujinshis whose row was updated after
+        `timestamp` (a `time.time()`), e.g. to replicate only what finished since then.
+        """
+        self.flush()
+        return [
+            (id, bool(packed))
+            for id, packed in self._db.execute(
+                "SELECT id, packed FROM galleries WHERE complete = 1 AND updated_at > ?",
+                (timestamp,),
+            )
+        ]
+
+    def summary(self) -> dict[str, int]:
+        """Returns the number of doujinshis (complete or not), pages and bytes indexed."""
+        self.flush()
+        galleries, complete, pages, size = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(complete), 0), COALESCE(SUM(pages), 0), "
+            "COALESCE(SUM(bytes), 0) FROM galleries"
+        ).fetchone()
+        return {
+            "galleries": galleries,
+            "complete": complete,
+            "pages": pages,
+            "bytes": size,
+        }
+
+    def close(self) -> None:
+        self.flush()
+        self._db.close()
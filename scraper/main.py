@@ -8,6 +8,7 @@ Scrapes nhentai.net asynchronously.
 Author: Urpagin
 Date: 2025-07-05
 """
+
 import asyncio
 import logging
 from nhentai_scraper import Scraper
@@ -30,7 +31,10 @@ async def main() -> None:
         "../manga/",
         max_coroutines=1000,
         max_reqs_per_second=6,
+        # The image CDN tolerates far more traffic than the HTML pages.
+        host_rate_limits={"i*.nhentai.net": (60, 20)},
         batch_size=70,
+        extension_stats_filepath="../manga/.extension_stats.json",
     ) as s:
         # res = await s.scrape_single(583003)
         # log.info(f"Downloaded single doujin, response is: {res}")
@@ -39,6 +43,7 @@ async def main() -> None:
         # await s.scrape_multiple([1])
 
         # await s.scrape_all()
+        # await s.scrape_new()  # Daily sync: only what was uploaded since the last call.
         await s.scrape_random(-1, callback=callback)
 
 
@@ -7,36 +7,46 @@ Author: Urpagin
 Date: 2025-07-05
 """
 
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-# TODO: MAKE MANGA STORE HOSTABLE ELSEWHERE
-
-
 from os import name
+import os
 import time
 import random
-from typing import Generator, Iterator
+from typing import Awaitable, Generator, Iterator, TypeVar
 from pathlib import Path
 from urllib.parse import urlparse, urlunparse
+from fnmatch import fnmatch
 
 
 from enum import Enum
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import multiprocessing
 import json
 from urllib.parse import urljoin
 import parsers
+from job_journal import JobJournal, JobProgress
+from tombstones import TombstoneStore
+from id_permutation import PermutationCursor, RandomPermutation
+from sync_state import SyncState
+from storage import LocalStorage, Storage
+from content_store import ContentStore
+from packed_gallery import pack_dir, packed_path
+from library_index import LibraryIndex, entry_from_files, scan, scan_loose
+from contextvars import ContextVar
 from pathlib import Path
 import logging
 from typing import Any, Callable, Iterable
+from collections import Counter, deque
 import asyncio
 import aiohttp
 
 log: logging.Logger = logging.getLogger("scraper")
 
+T = TypeVar("T")
+
+# The progress of the doujinshi the current task is scraping, if any.
+_current_job: ContextVar[JobProgress | None] = ContextVar("current_job", default=None)
+
 
 class ImageExtension(Enum):
     """
@@ -74,13 +84,20 @@ class ImageExtension(Enum):
         yield from (m for m in cls if m != ext)
 
 
-def image_link_generator(previous_image_url: str) -> Generator[str, None, None]:
+def image_link_generator(
+    previous_image_url: str,
+    predictor: "ExtensionPredictor | None" = None,
+    gallery_counts: Counter["ImageExtension"] | None = None,
+) -> Generator[str, None, None]:
     """
     Sequentially generates URLs to try for the next image page with different extensions.
-    The first extension is always the one of the `previous_image_url` and then cycles through other ones.
+    Without a `predictor`, the first extension is always the one of the `previous_image_url` and then cycles through other ones.
+    With a `predictor`, only the likely extensions are generated, most likely first.
 
     Args:
         previous_image_url: URL of the previous image (e.g., 'https://example.com/gallery/1.jpg')
+        predictor: Learned extension frequencies to order and prune the candidates with.
+        gallery_counts: The extensions seen so far in the current gallery, for the `predictor`.
 
     Yields:
         str: Possible URLs for the next page with different file extensions
@@ -118,39 +135,465 @@ def image_link_generator(previous_image_url: str) -> Generator[str, None, None]:
     # Generate URLs with different extensions
     base_path = "/".join(path_parts[:-1])
 
-    for ext in ImageExtension.iter_starting_from(ext_img):
+    if predictor:
+        extensions: Iterable[ImageExtension] = predictor.candidates(
+            gallery_counts, previous=ext_img
+        )
+    else:
+        extensions = ImageExtension.iter_starting_from(ext_img)
+
+    for ext in extensions:
         # Reconstruct the URL
         new_path = f"{base_path}/{next_page_id}.{str(ext)}"
         new_parsed = parsed._replace(path=new_path)
         yield urlunparse(new_parsed)
 
 
+class ExtensionPredictor:
+    """
+    Learns how often each image extension is served, across all galleries and runs,
+    to guess the extension of a page whose URL is not known.
+
+    Candidates are scored by their global frequency, the frequency within the current
+    gallery (weighted by `gallery_weight`), and a bonus for the previous page's extension.
+    Extensions below `min_probability` are pruned; formats never served by the CDN are never tried.
+    """
+
+    # Never served by the image servers.
+    _EXCLUDED: frozenset[ImageExtension] = frozenset(
+        {
+            ImageExtension.SVG,
+            ImageExtension.ICO,
+            ImageExtension.BMP,
+            ImageExtension.TIFF,
+            ImageExtension.TIF,
+            ImageExtension.HEIC,
+            ImageExtension.HEIF,
+            ImageExtension.RAW,
+        }
+    )
+    # Pseudo-counts, so that a fresh predictor already has sensible guesses.
+    _PRIOR: dict[ImageExtension, int] = {
+        ImageExtension.JPG: 100,
+        ImageExtension.PNG: 20,
+        ImageExtension.WEBP: 10,
+        ImageExtension.GIF: 2,
+        ImageExtension.JPEG: 1,
+        ImageExtension.AVIF: 1,
+    }
+
+    def __init__(
+        self,
+        filepath: str | None = None,
+        min_probability: float = 0.002,
+        gallery_weight: float = 4.0,
+        previous_bonus: float = 0.5,
+    ) -> None:
+        """
+        :param filepath: The JSON file where the frequencies persist across runs. None to not persist them.
+        """
+        self._filepath: Path | None = Path(filepath) if filepath else None
+        self._min_probability: float = min_probability
+        self._gallery_weight: float = gallery_weight
+        self._previous_bonus: float = previous_bonus
+        self._counts: Counter[ImageExtension] = Counter(self._PRIOR)
+        self.hits: int = 0
+        self.misses: int = 0
+        self._load()
+
+    def _load(self) -> None:
+        if not self._filepath or not self._filepath.exists():
+            return
+        try:
+            with self._filepath.open("r", encoding="utf-8") as f:
+                for ext_str, count in json.load(f).items():
+                    ext: ImageExtension = ImageExtension.from_str(ext_str)
+                    if ext not in self._EXCLUDED:
+                        self._counts[ext] += int(count)
+        except Exception as e:
+            log.warning(
+                f"Failed to load extension frequencies from {self._filepath}: {e}"
+            )
+
+    def save(self) -> None:
+        if not self._filepath:
+            return
+        # Only what was observed, not the prior.
+        observed: Counter[ImageExtension] = self._counts - Counter(self._PRIOR)
+        try:
+            with self._filepath.open("w", encoding="utf-8") as f:
+                json.dump({str(ext): n for ext, n in observed.items()}, f, indent=2)
+        except Exception as e:
+            log.warning(
+                f"Failed to save extension frequencies to {self._filepath}: {e}"
+            )
+
+    def observe(
+        self,
+        ext: ImageExtension | str,
+        gallery_counts: Counter[ImageExtension] | None = None,
+    ) -> None:
+        """Records that a page was served with the extension `ext`."""
+        if isinstance(ext, str):
+            try:
+                ext = ImageExtension.from_str(ext)
+            except ValueError:
+                return
+        if ext in self._EXCLUDED:
+            return
+        self._counts[ext] += 1
+        if gallery_counts is not None:
+            gallery_counts[ext] += 1
+
+    def candidates(
+        self,
+        gallery_counts: Counter[ImageExtension] | None = None,
+        previous: ImageExtension | None = None,
+        top: int | None = None,
+    ) -> list[ImageExtension]:
+        """
+        Returns the likely extensions of the next page, most likely first.
+        """
+        total: int = sum(self._counts.values())
+        gallery_total: int = sum(gallery_counts.values()) if gallery_counts else 0
+        scores: dict[ImageExtension, float] = dict()
+        for ext, count in self._counts.items():
+            probability: float = count / total
+            if probability < self._min_probability and ext != previous:
+                continue
+            score: float = probability
+            if gallery_counts and gallery_total:
+                score += self._gallery_weight * gallery_counts[ext] / gallery_total
+            if ext == previous:
+                score += self._previous_bonus
+            scores[ext] = score
+
+        ranked: list[ImageExtension] = sorted(
+            scores, key=scores.__getitem__, reverse=True
+        )
+        return ranked[:top] if top else ranked
+
+
+class TokenBucket:
+    """
+    Token bucket: refills at `rate` tokens per second, holding at most `burst` tokens.
+    Callers reserve a token up front (the balance may go negative) and then sleep
+    for their own debt, so no lock is held while sleeping and waiters are served in order.
+    """
+
+    def __init__(self, rate: float, burst: int = 1) -> None:
+        self.base_rate: float = rate
+        self._rate: float = rate
+        self._burst: float = float(max(burst, 1))
+        self._tokens: float = self._burst
+        self._last: float = time.monotonic()
+
+    async def acquire(self) -> None:
+        now: float = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self._rate)
+
+    def scale(self, factor: float) -> None:
+        """Sets the refill rate to `factor` times the configured rate."""
+        now: float = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._last) * self._rate)
+        self._last = now
+        self._rate = self.base_rate * factor
+
+
+# A rate in requests per second, a (rate, burst) tuple, or None for no limit.
+HostLimit = float | tuple[float, int] | None
+
+
 class RateLimiter:
-    def __init__(self, max_calls_per_second: float | None):
-        if not max_calls_per_second or max_calls_per_second <= 0:
+    def __init__(
+        self,
+        max_calls_per_second: float | None,
+        burst: int = 1,
+        host_limits: dict[str, HostLimit] | None = None,
+    ):
+        """
+        :param max_calls_per_second: The default budget, shared by every host not matched by `host_limits`.
+        :param burst: How many calls the default budget lets through at once after being idle.
+        :param host_limits: Separate budgets keyed by hostname or fnmatch pattern (e.g. "i*.nhentai.net").
+            Each pattern owns one bucket shared by all the hosts it matches. First match wins.
+        """
+        self._default: TokenBucket | None = self._make_bucket(
+            (max_calls_per_second, burst) if max_calls_per_second else None
+        )
+        if not self._default:
             log.info(
                 f"Rate limiter disabled. Rate limiting: infinite requests per second"
             )
-            self._disabled = True
-            return
-        else:
-            self._disabled = False
 
-        self._interval = 1.0 / max_calls_per_second
-        self._lock = asyncio.Lock()
-        self._last = 0.0
+        self._host_buckets: list[tuple[str, TokenBucket | None]] = [
+            (pattern.lower(), self._make_bucket(limit))
+            for pattern, limit in (host_limits or {}).items()
+        ]
+        self._bucket_by_host: dict[str, TokenBucket | None] = dict()
+
+    def scale(self, factor: float) -> None:
+        """Scales every budget to `factor` times its configured rate."""
+        for _, bucket in self._host_buckets:
+            if bucket:
+                bucket.scale(factor)
+        if self._default:
+            self._default.scale(factor)
+
+    @staticmethod
+    def _make_bucket(limit: HostLimit) -> TokenBucket | None:
+        if isinstance(limit, tuple):
+            rate, burst = limit
+        else:
+            rate, burst = limit, 1
+        if not rate or rate <= 0:
+            return None
+        return TokenBucket(rate, burst)
+
+    def _bucket_for(self, url: str) -> TokenBucket | None:
+        host: str = (urlparse(url).hostname or "").lower()
+        if host not in self._bucket_by_host:
+            self._bucket_by_host[host] = next(
+                (b for pattern, b in self._host_buckets if fnmatch(host, pattern)),
+                self._default,
+            )
+        return self._bucket_by_host[host]
 
-    async def acquire(self):
+    async def acquire(self, url: str = ""):
+        bucket: TokenBucket | None = self._bucket_for(url)
         # No-op if disabled
-        if self._disabled:
+        if bucket:
+            await bucket.acquire()
+
+
+class SlotPool:
+    """
+    A semaphore whose number of slots can be changed while in use.
+    Lowering the limit never interrupts holders; it only delays the next acquirers.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self._limit: int = max(1, limit)
+        self._in_use: int = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @limit.setter
+    def limit(self, value: int) -> None:
+        self._limit = max(1, value)
+        self._wake()
+
+    @property
+    def in_use(self) -> int:
+        return self._in_use
+
+    def _wake(self) -> None:
+        while self._waiters and self._in_use < self._limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                # The slot is taken on behalf of the waiter.
+                self._in_use += 1
+                fut.set_result(None)
+
+    async def __aenter__(self) -> None:
+        if self._in_use < self._limit and not self._waiters:
+            self._in_use += 1
             return
 
-        async with self._lock:
-            now: float = time.monotonic()
-            wait_time: float = self._interval - (now - self._last)
-            if wait_time > 0:
-                await asyncio.sleep(wait_time)
-            self._last = time.monotonic()
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # Cancelled right after being handed a slot: give it back.
+                self._release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        self._release()
+
+    def _release(self) -> None:
+        self._in_use -= 1
+        self._wake()
+
+
+class AIMDController:
+    """
+    Additive increase, multiplicative decrease of a value between `minimum` and `maximum`.
+
+    Every healthy response raises the value by `increase / value` (so about `increase`
+    per full window of responses). Congestion (429s, 5xx errors, timeouts, latency rising above
+    `latency_tolerance` times its long-run average on a host) multiplies it by `decrease`,
+    at most once per `cooldown` seconds so that one burst of errors counts once.
+    """
+
+    def __init__(
+        self,
+        initial: float,
+        minimum: float,
+        maximum: float,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        cooldown: float = 1.0,
+    ) -> None:
+        self.minimum: float = minimum
+        self.maximum: float = max(minimum, maximum)
+        self.value: float = min(max(initial, self.minimum), self.maximum)
+        self._increase: float = increase
+        self._decrease: float = decrease
+        self._latency_tolerance: float = latency_tolerance
+        self._cooldown: float = cooldown
+        self._last_decrease: float = 0.0
+        # Per host: (fast EWMA, slow EWMA, samples)
+        self._latencies: dict[str, tuple[float, float, int]] = dict()
+
+    def _latency_rising(self, host: str, latency: float) -> bool:
+        fast, slow, samples = self._latencies.get(host, (latency, latency, 0))
+        fast = 0.3 * latency + 0.7 * fast
+        slow = 0.02 * latency + 0.98 * slow
+        self._latencies[host] = (fast, slow, samples + 1)
+        # Wait for a meaningful baseline before reading anything into it.
+        return samples >= 20 and fast > slow * self._latency_tolerance
+
+    def on_success(self, host: str, latency: float) -> None:
+        if self._latency_rising(host, latency):
+            self.on_congestion()
+            return
+        self.value = min(self.maximum, self.value + self._increase / self.value)
+
+    def on_congestion(self) -> bool:
+        """Returns True if the value was decreased."""
+        now: float = time.monotonic()
+        if now - self._last_decrease < self._cooldown:
+            return False
+        self._last_decrease = now
+        self.value = max(self.minimum, self.value * self._decrease)
+        return True
+
+
+@dataclass
+class ParseStats:
+    """
+    Counters of how long HTML parsing kept the event loop busy.
+    With the parse executor only the hand-off to the pool blocks the loop.
+    """
+
+    inline_calls: int = 0
+    inline_blocked_s: float = 0.0
+    offloaded_calls: int = 0
+    offloaded_blocked_s: float = 0.0
+    offloaded_wall_s: float = 0.0
+
+    def __str__(self) -> str:
+        inline_avg: float = self.inline_blocked_s / max(self.inline_calls, 1) * 1000
+        offloaded_avg: float = (
+            self.offloaded_blocked_s / max(self.offloaded_calls, 1) * 1000
+        )
+        return (
+            f"inline: {self.inline_calls} parses, loop blocked {self.inline_blocked_s:.3f}s "
+            f"({inline_avg:.3f} ms/parse); "
+            f"offloaded: {self.offloaded_calls} parses, loop blocked {self.offloaded_blocked_s:.3f}s "
+            f"({offloaded_avg:.3f} ms/parse), {self.offloaded_wall_s:.3f}s awaiting results"
+        )
+
+
+@dataclass
+class ConnectionStats:
+    """
+    Counters of how requests got their connection, filled by aiohttp tracing.
+    """
+
+    reused: int = 0
+    created: int = 0
+    dns_cache_hits: int = 0
+    dns_cache_misses: int = 0
+
+    def __str__(self) -> str:
+        total: int = self.reused + self.created
+        reuse_pct: float = self.reused / total * 100 if total else 0.0
+        return (
+            f"{self.reused} reused, {self.created} freshly opened ({reuse_pct:.1f}% reuse); "
+            f"DNS cache: {self.dns_cache_hits} hits, {self.dns_cache_misses} misses"
+        )
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_reuse(session, ctx, params) -> None:
+            self.reused += 1
+
+        async def on_create(session, ctx, params) -> None:
+            self.created += 1
+
+        async def on_dns_hit(session, ctx, params) -> None:
+            self.dns_cache_hits += 1
+
+        async def on_dns_miss(session, ctx, params) -> None:
+            self.dns_cache_misses += 1
+
+        trace_config.on_connection_reuseconn.append(on_reuse)
+        trace_config.on_connection_create_end.append(on_create)
+        trace_config.on_dns_cache_hit.append(on_dns_hit)
+        trace_config.on_dns_cache_miss.append(on_dns_miss)
+        return trace_config
+
+
+class MetadataSource(Enum):
+    """
+    Enum representing where the metadata of doujinshis is fetched from.
+    """
+
+    HTML = "html"  # The presentation page, https://nhentai.net/g/{id}/
+    API = (
+        "api"  # The JSON API, https://nhentai.net/api/gallery/{id}, falls back to HTML
+    )
+
+    def __str__(self) -> str:
+        return self.value
+
+
+@dataclass
+class MetadataStats:
+    """
+    Counters of how much fetching and parsing the metadata of doujinshis costs, for one source.
+    """
+
+    galleries: int = 0
+    bytes: int = 0
+    parse_s: float = 0.0
+
+    def __str__(self) -> str:
+        n: int = max(self.galleries, 1)
+        return (
+            f"{self.galleries} doujinshis, {self.bytes / n / 1024:.1f} KiB downloaded "
+            f"and {self.parse_s / n * 1000:.3f} ms spent parsing per doujinshi"
+        )
+
+
+@dataclass
+class GalleryRecord:
+    """
+    What the metadata stage of a scrape hands over to the image stage.
+    """
+
+    id: int
+    doujin_dir: Path
+    page_count: int
+    # The URL of every page, or only the URL of the first one when the page table
+    # is missing and the others have to be guessed.
+    image_urls: list[str] | None = None
+    first_image_url: str | None = None
+    # The tags, as saved to meta.json.
+    meta: dict[str, Any] | None = None
 
 
 class Scraper:
@@ -162,6 +605,35 @@ class Scraper:
         user_agents_filepath: str | None = None,
         timeout: int = 20,
         batch_size: int | None = None,
+        burst: int = 1,
+        host_rate_limits: dict[str, HostLimit] | None = None,
+        stream_downloads: bool = True,
+        chunk_size: int = 64 * 1024,
+        parse_in_pool: bool = True,
+        parse_workers: int | None = None,
+        parser_backend: parsers.ParserBackend | None = None,
+        adaptive: bool = True,
+        max_rate_scale: float = 1.0,
+        connection_limit: int = 100,
+        connection_limit_per_host: int = 0,
+        dns_cache_ttl: int | None = 300,
+        keepalive_timeout: float = 30.0,
+        connect_timeout: float | None = None,
+        read_timeout: float | None = None,
+        metadata_workers: int | None = None,
+        image_server: str | None = None,
+        metadata_source: MetadataSource = MetadataSource.HTML,
+        site_url: str = "https://nhentai.net",
+        extension_stats_filepath: str | None = None,
+        probe_width: int = 3,
+        resume: bool = False,
+        journal_filepath: str | None = None,
+        tombstones_filepath: str | None = None,
+        tombstone_ttl_days: float = 30.0,
+        content_store_dir: str | None = None,
+        packed: bool = False,
+        library_index_filepath: str | None = None,
+        storage: Storage | None = None,
     ) -> None:
         """
         :param save_dir: Where the downloaded doujinshis be saved.
@@ -169,7 +641,57 @@ class Scraper:
         :param max_reqs_per_second: Limits the number of HTTP requests per second. "I will allow no more than X requests per second."
         :param user_agents_filepath: The path pointing to a text file, each line with a user agent.
         :param timeout: The timeout in seconds for ALL requests sent in the program's lifetime.
-        :param batch_size: The number of URLs to fetch concurrently in the scrape_multiple() and scrape_random() methods.
+        :param batch_size: The number of doujinshis scraped concurrently (workers) in the scrape_multiple() and scrape_random() methods.
+        :param burst: How many requests may be sent at once after an idle period, on top of `max_reqs_per_second`.
+        :param host_rate_limits: Separate request budgets for some hosts, keyed by hostname or pattern. e.g. {"i*.nhentai.net": (50, 10)}
+            Values are requests per second, a (requests per second, burst) tuple, or None for unlimited.
+            Hosts not listed share `max_reqs_per_second`.
+        :param stream_downloads: Write image bodies to disk chunk by chunk (through a temporary file renamed once complete) instead of buffering whole responses in RAM.
+        :param chunk_size: The size in bytes of each chunk read from the network and written to disk when streaming.
+        :param parse_in_pool: Parse HTML in a process pool instead of on the event loop. Pass False to parse inline.
+        :param parse_workers: The number of parsing processes. Defaults to the number of CPU cores.
+        :param parser_backend: The HTML parsing engine. Defaults to the fastest one installed.
+        :param adaptive: Let an AIMD controller find the concurrency and request rate: both grow while
+            responses are healthy and are cut on 429s, 5xx errors, timeouts or rising latency.
+            `max_coroutines` then becomes the upper bound of the concurrency.
+        :param max_rate_scale: With `adaptive`, how far above the configured request rates the controller may go.
+            1 (the default) never exceeds them: the controller only slows down, then recovers.
+        :param connection_limit: The maximum number of simultaneous TCP connections. 0 for no limit.
+        :param connection_limit_per_host: The maximum number of simultaneous TCP connections to one host. 0 for no limit.
+        :param dns_cache_ttl: How long in seconds resolved addresses are cached. None caches them forever.
+        :param keepalive_timeout: How long in seconds an idle connection is kept open for reuse.
+        :param connect_timeout: The timeout in seconds to acquire a connection (including the TLS handshake). None for no separate limit.
+        :param read_timeout: The timeout in seconds between two reads of a response. None for no separate limit.
+        :param metadata_workers: Enables the pipelined mode of scrape_multiple() with this many metadata workers.
+            They fetch the tags and first image of each doujinshi while `batch_size` image workers download
+            the pages, each stage feeding the next through a bounded queue.
+        :param image_server: The base URL of the image server, e.g. "https://i3.nhentai.net".
+            Defaults to the one matching the thumbnail server of each gallery page (tN -> iN).
+        :param metadata_source: Where to fetch the metadata from. The JSON API is lighter to download and parse;
+            the HTML presentation page is used whenever the API fails.
+        :param site_url: The root URL of the site, e.g. to point the scraper to a local stub server (see stub_server.py).
+        :param extension_stats_filepath: Where the learned image extension frequencies persist across runs,
+            e.g. next to the library. None (the default) to not persist them.
+        :param probe_width: When the URL of a page must be guessed and the likeliest extension misses,
+            how many of the next likeliest ones are probed at once.
+        :param resume: Finish incomplete doujinshis already on disk, downloading only their missing or empty pages.
+            When False (the default), any existing doujinshi directory is skipped.
+        :param journal_filepath: An SQLite file recording the state of every ID scraped by scrape_multiple(),
+            so that an interrupted run resumes without re-checking finished IDs. See `job_journal.JobJournal`.
+        :param tombstones_filepath: A file remembering the IDs found dead (404) across runs, so that scrape_multiple()
+            does not request them again. See `tombstones.TombstoneStore`.
+        :param tombstone_ttl_days: How long a dead ID is skipped before being checked again.
+        :param content_store_dir: Deduplicate the images: each one is hashed as it is written and hardlinked
+            to one blob per content in this directory, which must be on the same filesystem as `save_dir`.
+            See `content_store.ContentStore`.
+        :param packed: Store each complete doujinshi as one uncompressed archive `{id}.cbz` instead of
+            a directory of files. Incomplete ones stay directories so that they can be resumed.
+            See `packed_gallery`.
+        :param library_index_filepath: An SQLite file indexing the library, one row per doujinshi,
+            updated as doujinshis finish. See `library_index.LibraryIndex`.
+        :param storage: Where the doujinshis are kept, e.g. an S3-compatible object store (see `storage.S3Storage`).
+            Defaults to `save_dir` on the local disk. With another storage, `save_dir` only holds the pages
+            being downloaded, and the paths returned name the doujinshis rather than point to them.
 
 
         To disable the rate limiter, pass ``None`` for `max_reqs_per_second`.
@@ -195,13 +717,68 @@ class Scraper:
         else:
             self._batch_size: int = batch_size
 
-        self._semaphore: asyncio.Semaphore = asyncio.Semaphore(max_coroutines)
-        self._rate_limiter: RateLimiter = RateLimiter(max_reqs_per_second)
+        self._metadata_workers: int | None = metadata_workers
+        self._image_server: str | None = image_server
+        self._extension_predictor: ExtensionPredictor = ExtensionPredictor(
+            extension_stats_filepath
+        )
+        self._probe_width: int = max(1, probe_width)
+        self._resume: bool = resume
+        self._journal: JobJournal | None = (
+            JobJournal(journal_filepath) if journal_filepath else None
+        )
+        self._tombstones: TombstoneStore | None = (
+            TombstoneStore(tombstones_filepath, tombstone_ttl_days)
+            if tombstones_filepath
+            else None
+        )
+        self._storage: Storage = storage or LocalStorage(self.save_dir)
+        if not isinstance(self._storage, LocalStorage) and (
+            packed or content_store_dir
+        ):
+            # Both work on the files of `save_dir`, where the pages only pass through.
+            log.warning(
+                "Packing and the content store only apply to the local storage: disabled"
+            )
+            packed, content_store_dir = False, None
+        self._packed: bool = packed
+        if packed and content_store_dir:
+            # The pages would be copied into the archive, leaving the blobs unused.
+            log.warning(
+                "The content store does not apply to packed doujinshis: disabled"
+            )
+            content_store_dir = None
+        self._content_store: ContentStore | None = (
+            ContentStore(content_store_dir) if content_store_dir else None
+        )
+        self._library_index: LibraryIndex | None = (
+            LibraryIndex(library_index_filepath) if library_index_filepath else None
+        )
+
+        self._adaptive: bool = adaptive
+        self._concurrency: AIMDController = AIMDController(
+            initial=min(max_coroutines, 8), minimum=1, maximum=max_coroutines
+        )
+        self._rate_scale: AIMDController = AIMDController(
+            initial=1.0, minimum=0.1, maximum=max_rate_scale, increase=0.05
+        )
+        self._slots: SlotPool = SlotPool(
+            int(self._concurrency.value) if adaptive else max_coroutines
+        )
+        self._rate_limiter: RateLimiter = RateLimiter(
+            max_reqs_per_second, burst, host_rate_limits
+        )
 
-        self._BASE_URL: str = "https://nhentai.net/g/"
+        self._SITE_URL: str = site_url.rstrip("/")
+        self._BASE_URL: str = f"{self._SITE_URL}/g/"
+        self._metadata_source: MetadataSource = metadata_source
+        self.metadata_stats: dict[MetadataSource, MetadataStats] = {
+            source: MetadataStats() for source in MetadataSource
+        }
         self._session: None | aiohttp.ClientSession = None
 
         self._user_agents: list[str] = list()
+        self._headers: list[dict[str, str]] = list()
         self._load_user_agents(user_agents_filepath)
 
         if timeout < 1:
@@ -210,8 +787,43 @@ class Scraper:
         else:
             self._timeout = timeout
 
+        self._connector_options: dict[str, Any] = {
+            "limit": connection_limit,
+            "limit_per_host": connection_limit_per_host,
+            "ttl_dns_cache": dns_cache_ttl,
+            "keepalive_timeout": keepalive_timeout,
+        }
+        self._client_timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(
+            total=self._timeout, connect=connect_timeout, sock_read=read_timeout
+        )
+        self.connection_stats: ConnectionStats = ConnectionStats()
+
+        self._stream_downloads: bool = stream_downloads
+        if chunk_size < 1:
+            chunk_size = 64 * 1024
+            log.warning(f"chunk_size must be at least 1. Defaulted to {chunk_size}.")
+        self._chunk_size: int = chunk_size
+
+        self._parse_in_pool: bool = parse_in_pool
+        self._parse_workers: int = parse_workers or os.cpu_count() or 1
+        self._parse_executor: ProcessPoolExecutor | None = None
+        self.parse_stats: ParseStats = ParseStats()
+        self._parser_backend: parsers.ParserBackend = (
+            parser_backend or parsers.ParserBackend.default()
+        )
+
     async def __aenter__(self):
-        self._session = aiohttp.ClientSession()
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(**self._connector_options),
+            timeout=self._client_timeout,
+            trace_configs=[self.connection_stats.trace_config()],
+        )
+        if self._parse_in_pool:
+            # "spawn" as forking a process running an event loop and threads is unsafe.
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=self._parse_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
@@ -219,6 +831,61 @@ class Scraper:
             await self._session.close()
         else:
             log.error("Session does not exist at __aexit__()!")
+        await self._storage.close()
+
+        if self._parse_executor:
+            # Joining the processes takes a while: off the event loop.
+            await asyncio.to_thread(
+                self._parse_executor.shutdown, wait=True, cancel_futures=True
+            )
+            self._parse_executor = None
+        log.info(f"HTML parsing stats: {self.parse_stats}")
+        log.info(f"Connection stats: {self.connection_stats}")
+        self._extension_predictor.save()
+        if self._journal:
+            log.info(f"Job journal: {self._journal.summary()}")
+            self._journal.close()
+        if self._tombstones is not None:
+            self._tombstones.save()
+        if self._content_store:
+            log.info(f"Deduplication stats: {self._content_store.stats}")
+        if self._library_index:
+            log.info(f"Library index: {self._library_index.summary()}")
+            self._library_index.close()
+        if self._extension_predictor.hits or self._extension_predictor.misses:
+            log.info(
+                f"Extension guesses: {self._extension_predictor.hits} hits, {self._extension_predictor.misses} wasted requests"
+            )
+        for source, stats in self.metadata_stats.items():
+            if stats.galleries:
+                log.info(f"Metadata stats ({source}): {stats}")
+        if self._adaptive:
+            log.info(
+                f"Adaptive limits settled at concurrency {self._slots.limit}, request rate x{self._rate_scale.value:.2f}"
+            )
+
+    async def _parse(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Runs the parser `func` (must be a picklable, module-level function) with `args`,
+        in the parse executor if enabled, otherwise inline on the event loop.
+        """
+        if not self._parse_executor:
+            start: float = time.perf_counter()
+            result: T = func(*args)
+            self.parse_stats.inline_calls += 1
+            self.parse_stats.inline_blocked_s += time.perf_counter() - start
+            return result
+
+        loop = asyncio.get_running_loop()
+        start = time.perf_counter()
+        future = loop.run_in_executor(self._parse_executor, func, *args)
+        submitted: float = time.perf_counter()
+        try:
+            return await future
+        finally:
+            self.parse_stats.offloaded_calls += 1
+            self.parse_stats.offloaded_blocked_s += submitted - start
+            self.parse_stats.offloaded_wall_s += time.perf_counter() - submitted
 
     def _build_doujin_url(self, id: int) -> str:
         """
@@ -234,6 +901,32 @@ class Scraper:
         """
         return str(urljoin(self._BASE_URL, f"{id}/1/"))
 
+    def _build_api_url(self, id: int) -> str:
+        """
+        Returns the JSON API URL of a doujinshi given its ID.
+        Example for id=33 -> https://nhentai.net/api/gallery/33
+        """
+        return f"{self._SITE_URL}/api/gallery/{id}"
+
+    def _build_image_urls(self, page_table: dict[str, Any]) -> list[str]:
+        """
+        Returns the URL of every page from a page table (see `parsers.parse_page_table`).
+        Example -> https://i3.nhentai.net/galleries/987654/1.jpg
+        """
+        server: str | None = self._image_server
+        if not server:
+            thumbnail_server: str | None = page_table["thumbnail_server"]
+            host: str = (
+                f"i{thumbnail_server[1:]}" if thumbnail_server else "i.nhentai.net"
+            )
+            server = f"https://{host}"
+
+        base: str = f"{server.rstrip('/')}/galleries/{page_table['media_id']}"
+        return [
+            f"{base}/{page}.{ext}"
+            for page, ext in enumerate(page_table["extensions"], start=1)
+        ]
+
     def _load_user_agents(self, filename: str | None = None) -> None:
         """
         Not good for the RAM if the file is large.
@@ -255,47 +948,242 @@ class Scraper:
             return "Mozilla/5.0 (Windows NT 6.0; Win64; x64; en-US) AppleWebKit/603.19 (KHTML, like Gecko) Chrome/50.0.2331.247 Safari/601"
         return random.choice(self._user_agents)
 
-    async def _fetch(self, url: str, retries: int = 3) -> tuple[bytes, int] | None:
+    def _get_headers(self) -> dict[str, str]:
+        """
+        Returns the request headers with a random user agent.
+        The dicts are built once per user agent, not on every request.
+        """
+        if not self._headers:
+            self._headers = [{"User-Agent": ua} for ua in self._user_agents] or [
+                {"User-Agent": self._get_user_agent()}
+            ]
+        return random.choice(self._headers)
+
+    async def _request(
+        self,
+        url: str,
+        on_response: Callable[[aiohttp.ClientResponse], Awaitable[T]],
+        retries: int = 3,
+        method: str = "GET",
+    ) -> tuple[T, int] | None:
+        """
+        Sends a `method` request to `url`, retrying on 429s and errors.
+        The body is consumed by `on_response` while the response is still open.
+
+        :returns: A tuple of (what `on_response` returned, HTTP status) or None if every attempt failed.
+        """
         if not self._session:
             log.error(f"Session does not exist; cannot fetch url {url}")
             return
 
         for attempt in range(1, retries + 1):
-            await self._rate_limiter.acquire()
+            await self._rate_limiter.acquire(url)
+            # Throttled requests wait outside of the slot pool.
+            delay: float | None = None
             try:
-                async with self._semaphore:
-                    timeout = aiohttp.ClientTimeout(total=self._timeout)
-                    headers = {"User-Agent": self._get_user_agent()}
-
-                    async with self._session.get(
-                        url, timeout=timeout, headers=headers
+                async with self._slots:
+                    sent_at: float = time.monotonic()
+                    async with self._session.request(
+                        method, url, headers=self._get_headers()
                     ) as res:
                         log.debug(f"Fetched URL: {url}")
+                        if job := _current_job.get():
+                            job.last_status = res.status
                         if res.status == 429:
                             retry_after = res.headers.get("Retry-After")
-                            delay: float = (
-                                float(retry_after) if retry_after else 2**attempt
-                            )
-                            log.warning(
-                                f"429 Too Many Requests. Retrying in {delay:.1f}s..."
-                            )
-                            await asyncio.sleep(delay)
-                            continue  # retry
-                        return await res.read(), res.status
-
+                            delay = float(retry_after) if retry_after else 2**attempt
+                            self._on_congestion()
+                        else:
+                            if res.status >= 500:
+                                # An overloaded server: backed off from as for a 429.
+                                self._on_congestion()
+                            else:
+                                self._on_success(url, time.monotonic() - sent_at)
+                            return await on_response(res), res.status
+
+            except asyncio.TimeoutError as e:
+                self._on_congestion()
+                log.warning(
+                    f"Timeout while fetching URL {url} (attempt {attempt}/{retries}): {e}"
+                )
             except Exception as e:
                 log.warning(
                     f"Error while fetching URL {url} (attempt {attempt}/{retries}): {e}"
                 )
 
+            if delay is not None:
+                log.warning(f"429 Too Many Requests. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
         log.error(f"Failed to fetch URL after {retries} attempts: {url}")
         return None
 
-    def _save_doujin_json(
+    def _on_success(self, url: str, latency: float) -> None:
+        if not self._adaptive:
+            return
+        self._concurrency.on_success(urlparse(url).hostname or "", latency)
+        self._rate_scale.on_success(urlparse(url).hostname or "", latency)
+        self._apply_limits()
+
+    def _on_congestion(self) -> None:
+        if not self._adaptive:
+            return
+        decreased: bool = self._concurrency.on_congestion()
+        self._rate_scale.on_congestion()
+        self._apply_limits()
+        if decreased:
+            log.info(
+                f"Congestion: concurrency cut to {self._slots.limit}, request rate scaled to x{self._rate_scale.value:.2f}"
+            )
+
+    def _apply_limits(self) -> None:
+        self._slots.limit = int(self._concurrency.value)
+        self._rate_limiter.scale(self._rate_scale.value)
+
+    async def _fetch(self, url: str, retries: int = 3) -> tuple[bytes, int] | None:
+        return await self._request(url, lambda res: res.read(), retries)
+
+    async def _probe(self, save_dir: Path, urls: list[str]) -> str | None:
+        """
+        Requests all the `urls` (the same page, with different extensions) at once, and downloads
+        into `save_dir` the one that exists: the request that hits is the download, no separate
+        existence check. With streamed downloads, a miss costs no more than a HEAD: its body is never read.
+        Should several hit, only the first one fully downloaded is kept: the others are never stored.
+
+        :returns: The URL downloaded, None if none exists or the download failed.
+        """
+        winner: str | None = None
+
+        def claim_for(url: str) -> Callable[[], bool]:
+            def claim() -> bool:
+                nonlocal winner
+                if winner is None:
+                    winner = url
+                return winner == url
+
+            return claim
+
+        async def get(url: str) -> str | None:
+            try:
+                status: int | None = await self._get_image(
+                    save_dir, url, retries=1, claim=claim_for(url)
+                )
+            except ValueError as e:
+                log.warning(e)
+                return None
+            if status is not None and self._is_req_success(status):
+                return url if winner == url else None
+            if status is not None:
+                self._extension_predictor.misses += 1
+
+        tasks = [asyncio.create_task(get(url)) for url in urls]
+        try:
+            for coro in asyncio.as_completed(tasks):
+                if await coro:
+                    break
+        finally:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return winner
+
+    async def _fetch_to_file(
+        self,
+        url: str,
+        file_path: Path,
+        retries: int = 3,
+        claim: Callable[[], bool] | None = None,
+    ) -> tuple[int, int] | None:
+        """
+        Streams the body of `url` into `file_path` without buffering it whole.
+        :param claim: See `_stream_to_file`.
+
+        :returns: A tuple of (number of bytes written, HTTP status) or None if every attempt failed.
+        """
+
+        async def on_response(res: aiohttp.ClientResponse) -> int:
+            if not self._is_req_success(res.status):
+                return 0
+            return await self._stream_to_file(res, file_path, claim)
+
+        return await self._request(url, on_response, retries)
+
+    async def _stream_to_file(
+        self,
+        res: aiohttp.ClientResponse,
+        file_path: Path,
+        claim: Callable[[], bool] | None = None,
+    ) -> int:
+        """
+        Writes the body of `res` chunk by chunk into a hidden temporary file next to
+        `file_path`, then hands it to the storage (atomically renamed into place, or uploaded).
+        Disk writes run off the event loop. A file named `file_path` therefore only ever
+        exists once fully downloaded.
+        With the content store, the body is hashed as it is written, then deduplicated.
+        :param claim: Called once the body is written: if it returns False, the file is
+            discarded instead of stored, e.g. another probe of the same page already won.
+
+        :returns: The number of bytes written.
+        """
+        tmp_path: Path = file_path.with_name(f".{file_path.name}.part")
+        f = await asyncio.to_thread(tmp_path.open, "wb")
+        hasher: Any = self._content_store.hasher() if self._content_store else None
+
+        def write(chunk: bytes) -> None:
+            f.write(chunk)
+            if hasher is not None:
+                hasher.update(chunk)
+
+        written: int = 0
+        try:
+            async for chunk in res.content.iter_chunked(self._chunk_size):
+                await asyncio.to_thread(write, chunk)
+                written += len(chunk)
+            await asyncio.to_thread(f.close)
+            if claim is not None and not claim():
+                tmp_path.unlink(missing_ok=True)
+                return written
+            await self._storage.put_file(self._storage_key(file_path), tmp_path)
+        except BaseException:
+            # Also covers cancellation: never leave a partial file behind.
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        if self._content_store and hasher is not None:
+            await asyncio.to_thread(
+                self._content_store.add, file_path, hasher.hexdigest()
+            )
+        return written
+
+    def _storage_key(self, path: Path) -> str:
+        """Returns the key of a file of `save_dir` in the storage, e.g. "177013/3.jpg"."""
+        return path.relative_to(self.save_dir).as_posix()
+
+    def _write_image(self, file_path: Path, content: bytes) -> None:
+        """
+        Writes `content` to `file_path`, deduplicated if the content store is enabled. Blocking.
+        Written aside then renamed, as when streaming: `file_path` may be a hardlink to a blob
+        shared with other doujinshis, which must never be written through.
+        """
+        tmp_path: Path = file_path.with_name(f".{file_path.name}.part")
+        try:
+            tmp_path.write_bytes(content)
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if self._content_store:
+            hasher: Any = self._content_store.hasher()
+            hasher.update(content)
+            self._content_store.add(file_path, hasher.hexdigest())
+
+    async def _save_doujin_json(
         self, doujin_dir: Path, content: dict[Any, Any], filename: str = "meta.json"
     ) -> bool:
         """
-        Saves the information about the doujin inside a JSON file to `save_dir`.
+        Saves the information about the doujin inside a JSON file to the storage.
         The default JSON filename is "meta.json".
         Returns True if successful, False otherwise.
         """
@@ -304,6 +1192,7 @@ class Scraper:
             return False
 
         try:
+            # Also where the pages are downloaded to, whatever the storage.
             doujin_dir.mkdir(parents=True, exist_ok=True)
         except Exception as e:
             log.warning(f"Could not save JSON: failed to create saving directory: {e}")
@@ -311,8 +1200,10 @@ class Scraper:
 
         json_path = doujin_dir / filename
         try:
-            with json_path.open("w", encoding="utf-8") as f:
-                json.dump(content, f, indent=2, ensure_ascii=False)
+            await self._storage.put_bytes(
+                self._storage_key(json_path),
+                json.dumps(content, indent=2, ensure_ascii=False).encode("utf-8"),
+            )
             return True
         except Exception as e:
             log.warning(f"Failed to dump JSON to {json_path}: {e}")
@@ -346,27 +1237,16 @@ class Scraper:
             return False
 
         try:
-            # Extract filename from URL if not provided
-            filename: str = url.split("/")[-1].split("?")[0]  # Remove query params
-            if not filename:
-                log.warning(f"No filename found for image at: {url}")
-                return False
-
-            res: tuple[bytes, int] | None = await self._fetch(url)
-            if not res:
+            status: int | None = await self._get_image(save_dir, url)
+            if status is None:
                 log.debug(f"Fetch failed for {url}.")
                 return False
 
-            content, status = res
             if not self._is_req_success(status):
                 log.warning(f"HTTP {status} for {url}")
                 return False
 
-            # Create directory and save file
-            file_path: Path = save_dir / filename
-            file_path.write_bytes(content)
-
-            log.debug(f"Downloaded {url} -> {file_path}")
+            log.debug(f"Downloaded {url} -> {save_dir}")
             return True
 
         except asyncio.TimeoutError:
@@ -379,6 +1259,62 @@ class Scraper:
             log.error(f"Unexpected error downloading {url}: {e}")
             return False
 
+    async def _get_image(
+        self,
+        save_dir: Path,
+        url: str,
+        retries: int = 3,
+        claim: Callable[[], bool] | None = None,
+    ) -> int | None:
+        """
+        Downloads an image from the URL into `save_dir`, if it exists.
+        :param claim: Called once the image is downloaded: if it returns False, it is not stored.
+
+        :returns: The HTTP status, None if every attempt failed.
+        :raises ValueError: If the URL names no file.
+        """
+        # Extract filename from URL if not provided
+        filename: str = url.split("/")[-1].split("?")[0]  # Remove query params
+        if not filename:
+            raise ValueError(f"No filename found for image at: {url}")
+
+        file_path: Path = save_dir / filename
+        if self._stream_downloads:
+            res: tuple[Any, int] | None = await self._fetch_to_file(
+                url, file_path, retries, claim
+            )
+        else:
+            res = await self._fetch(url, retries)
+        if not res:
+            return None
+
+        content, status = res
+        if not self._is_req_success(status):
+            return status
+
+        if not self._stream_downloads:
+            if claim is not None and not claim():
+                return status
+            if isinstance(self._storage, LocalStorage):
+                # Keep the disk write off the event loop.
+                await asyncio.to_thread(self._write_image, file_path, content)
+            else:
+                await self._storage.put_bytes(self._storage_key(file_path), content)
+
+        if job := _current_job.get():
+            job.bytes += content if self._stream_downloads else len(content)
+        return status
+
+    @staticmethod
+    def _page_url(url: str, page: int, ext: str) -> str:
+        """
+        Returns `url` pointing to another page of the same doujinshi.
+        Example for (https://i.nhentai.net/galleries/987654/1.jpg, 3, png) -> https://i.nhentai.net/galleries/987654/3.png
+        """
+        parsed = urlparse(url)
+        base_path: str = parsed.path.rsplit("/", 1)[0]
+        return urlunparse(parsed._replace(path=f"{base_path}/{page}.{ext}"))
+
     async def _fast_download_images_i_love_gambling(
         self, doujin_dir: Path, start_url: str, page_count: int
     ) -> tuple[int, int]:
@@ -396,31 +1332,53 @@ class Scraper:
         # Stop after `fail_limit` bad URLs
         fail_limit: int = 3
 
+        # Pages already on disk are not downloaded again.
+        present: dict[int, str] = await self._stored_pages(doujin_dir)
+
         # Download the initial image
-        if not await self._download_image(doujin_dir, start_url):
-            return fail_count, success_count
+        if 1 in present:
+            start_url = self._page_url(start_url, 1, present[1])
+        elif not await self._download_image(doujin_dir, start_url):
+            # A loss: the safe retry gets its chance.
+            return fail_count + 1, success_count
 
         success_count += 1
         log.debug(
             f"Downloaded image {success_count:03}/{page_count:03} for doujin #{doujin_dir.name}"
         )
+        gallery_counts: Counter[ImageExtension] = Counter()
+        self._extension_predictor.observe(start_url.rsplit(".", 1)[-1], gallery_counts)
 
         url_gambles = []
         # Cycle through all image IDs. Minus the first one.
-        # We assume (the gamble) that ALL the images have the same extension. (except the first one as we downloaded it)
-        for _ in range(page_count - 1):
+        # We assume (the gamble) that ALL the images have the likeliest extension.
+        for page in range(2, page_count + 1):
+            if page in present:
+                start_url = self._page_url(start_url, page, present[page])
+                success_count += 1
+                continue
+
             try:
-                start_url = next(image_link_generator(start_url))
+                start_url = next(
+                    image_link_generator(
+                        start_url, self._extension_predictor, gallery_counts
+                    )
+                )
             except StopIteration:
                 log.warning("Generator produced no URL. Aborting fast gamble.")
                 return fail_count, success_count
 
             url_gambles.append(start_url)
 
-        tasks = [
-            asyncio.create_task(self._download_image(doujin_dir, url))
-            for url in url_gambles
-        ]
+        async def gamble(url: str) -> bool:
+            if not await self._download_image(doujin_dir, url):
+                self._extension_predictor.misses += 1
+                return False
+            self._extension_predictor.hits += 1
+            self._extension_predictor.observe(url.rsplit(".", 1)[-1], gallery_counts)
+            return True
+
+        tasks = [asyncio.create_task(gamble(url)) for url in url_gambles]
         for coro in asyncio.as_completed(tasks):
             try:
                 if not await coro:
@@ -448,16 +1406,37 @@ class Scraper:
         await asyncio.gather(*tasks, return_exceptions=True)
         return fail_count, success_count
 
-    async def _download_images(
+    async def _download_images(self, doujin_dir: Path, urls: list[str]) -> bool:
+        """
+        Downloads all the doujin's images from their known URLs into `doujin_dir`, in parallel.
+
+        :returns: A boolean, whether all the downloads succeeded.
+        """
+        results: list[bool | BaseException] = await asyncio.gather(
+            *(self._download_image(doujin_dir, url) for url in urls),
+            return_exceptions=True,
+        )
+
+        failed: int = sum(1 for r in results if r is not True)
+        if failed:
+            log.warning(
+                f"Doujin #{doujin_dir.name}: {failed}/{len(urls)} images failed to download"
+            )
+        else:
+            log.debug(f"Downloaded {len(urls)} images for doujin #{doujin_dir.name}")
+        return not failed
+
+    async def _download_images_guessing(
         self, doujin_dir: Path, start_url: str, page_count: int
     ) -> bool:
         """
-        The thick of it. Downloads all the doujin's images into `doujin_dir`.
+        The thick of it. Downloads all the doujin's images into `doujin_dir`, guessing
+        their URLs from the first one. Only used when the page table is unavailable.
         :param doujin_dir: Where to save the images
         :param start_url: The URL of the first image to download.
         :param page_count: The threshold at which to trying to download images.
 
-        :returns: A boolean, whether there was any error during the downloads.
+        :returns: A boolean, whether all the downloads succeeded.
         """
 
         # the number of losses to let through.
@@ -474,36 +1453,64 @@ class Scraper:
 
         error_happened: bool = False
         downloaded_pages: int = 0
+        # Whatever the gamble got right is kept.
+        present: dict[int, str] = await self._stored_pages(doujin_dir)
 
         # Download the initial image
-        if not await self._download_image(doujin_dir, start_url):
-            error_happened = True
-            return True
+        if 1 in present:
+            start_url = self._page_url(start_url, 1, present[1])
+        elif not await self._download_image(doujin_dir, start_url):
+            return False
 
         downloaded_pages += 1
         log.debug(
             f"Downloaded image {downloaded_pages:03}/{page_count:03} for doujinshi #{doujin_dir.name}"
         )
 
+        gallery_counts: Counter[ImageExtension] = Counter()
+        self._extension_predictor.observe(start_url.rsplit(".", 1)[-1], gallery_counts)
+
         # Cycle through all image IDs. Minus the first one.
         for _ in range(page_count - 1):
-            for candidate_next in image_link_generator(start_url):
-                success: bool = await self._download_image(doujin_dir, candidate_next)
-                # Next URL becomes previous URL for the outer loop.
-                # In any case we change that.
-                previous_ext: str = candidate_next.rsplit(".")[-1]
-                start_url = candidate_next
-                if success:
-                    downloaded_pages += 1
-                    log.debug(
-                        f"Downloaded image {downloaded_pages:03}/{page_count:03} for doujinshi #{doujin_dir.name}"
-                    )
-                    break
-                else:
-                    log.warning(
-                        f"Doujin #{int(doujin_dir.name):06}: Image {_ + 2:03}/{page_count}, candidate ext {previous_ext} failed."
-                    )
-                    error_happened = True
+            if _ + 2 in present:
+                start_url = self._page_url(start_url, _ + 2, present[_ + 2])
+                downloaded_pages += 1
+                continue
+
+            candidates: list[str] = list(
+                image_link_generator(
+                    start_url, self._extension_predictor, gallery_counts
+                )
+            )
+            found: str | None = None
+            # The likeliest extension alone first: it is usually right, and a guess costs
+            # a request. On a miss, probe (and download) the next likeliest ones at once.
+            probed: int = 0
+            width: int = 1
+            while probed < len(candidates) and not found:
+                found = await self._probe(
+                    doujin_dir, candidates[probed : probed + width]
+                )
+                probed += width
+                width = self._probe_width
+
+            if not found:
+                log.warning(
+                    f"Doujin #{int(doujin_dir.name):06}: Image {_ + 2:03}/{page_count}, no candidate extension downloaded."
+                )
+                error_happened = True
+                # Carry on with the next page, assuming the likeliest extension.
+                start_url = candidates[0] if candidates else start_url
+                continue
+
+            # Next URL becomes previous URL for the outer loop.
+            start_url = found
+            self._extension_predictor.hits += 1
+            self._extension_predictor.observe(found.rsplit(".", 1)[-1], gallery_counts)
+            downloaded_pages += 1
+            log.debug(
+                f"Downloaded image {downloaded_pages:03}/{page_count:03} for doujinshi #{doujin_dir.name}"
+            )
 
         return not error_happened
 
@@ -515,32 +1522,207 @@ class Scraper:
 
         :returns: The path of the directory where the doujinshi has been saved, None if error.
         """
-        log.info(f"Scraping doujinshi #{id:06}")
+        if existing_dir := await self._existing_doujin_dir(id):
+            if job := _current_job.get():
+                job.complete = True
+            return existing_dir
+
+        record: GalleryRecord | None = await self._scrape_metadata(id)
+        if not record:
+            return
+
+        return await self._scrape_images(record)
+
+    async def repair(
+        self, id: int, rewrite_meta: bool = False, pages: list[int] | None = None
+    ) -> JobProgress:
+        """
+        Completes a damaged doujinshi directory in place: downloads only its missing or empty pages
+        (delete the broken ones first), at the cost of one metadata request. See `cleanup.py --repair`.
+        :param id: The sauce.
+        :param rewrite_meta: Also rewrite the meta file, e.g. when it is corrupt. Kept as is otherwise.
+        :param pages: The page numbers to download, if already known. None to list the directory for them.
+
+        :returns: What the repair did: whether the doujinshi is now complete, the bytes downloaded.
+        """
+        job = JobProgress()
+        token = _current_job.set(job)
+        try:
+            record: GalleryRecord | None = await self._scrape_metadata(
+                id, save_meta=rewrite_meta
+            )
+            if record:
+                await self._scrape_images(record, pages)
+        finally:
+            _current_job.reset(token)
+        return job
+
+    async def _existing_doujin_dir(self, id: int) -> Path | None:
+        """
+        Returns the directory (or archive, if packed) of the doujinshi if it has already been downloaded.
+        When resuming, only complete doujinshis count as downloaded.
+        """
+        # Only complete doujinshis get packed.
+        archive_path: Path = packed_path(self.save_dir, id)
+        if isinstance(self._storage, LocalStorage) and archive_path.exists():
+            log.debug(f"Doujinshi #{id:06} already packed: skipping")
+            return archive_path
 
         doujin_dir: Path = self.save_dir / str(id)
-        if doujin_dir.exists():
+        # One listing, rather than a request per page with a remote storage.
+        files: dict[str, int] = await self._stored_files(doujin_dir)
+        if not files:
+            return None
+
+        if not self._resume:
             log.warning(f"Doujin directory {doujin_dir} already exists: skipping")
             return doujin_dir
 
-        ###### Req for the tags
+        page_count: int | None = await self._read_page_count(doujin_dir)
+        if page_count and not self._missing_pages(files, page_count):
+            log.debug(f"Doujinshi #{id:06} already complete: skipping")
+            return doujin_dir
+
+        log.info(f"Resuming incomplete doujinshi #{id:06}")
+        return None
+
+    async def _read_page_count(
+        self, doujin_dir: Path, filename: str = "meta.json"
+    ) -> int | None:
+        """
+        Returns the page count saved in the JSON metadata of a doujinshi, None if unreadable.
+        """
+        try:
+            content: bytes | None = await self._storage.read(
+                self._storage_key(doujin_dir / filename)
+            )
+            page_count = json.loads(content).get("pages") if content else None
+            return int(page_count) if page_count else None
+        except Exception:
+            return None
+
+    async def _stored_files(self, doujin_dir: Path) -> dict[str, int]:
+        """
+        Returns the files of a doujinshi in the storage, {name: size}. Empty if unknown.
+        """
+        try:
+            return await self._storage.list(f"{self._storage_key(doujin_dir)}/")
+        except Exception as e:
+            log.warning(f"Failed to list {doujin_dir.name} in the storage: {e}")
+            return dict()
+
+    @staticmethod
+    def _pages_of(files: dict[str, int]) -> dict[int, str]:
+        """
+        Returns the extension of every non-empty page file ("N.ext") of a listing, by page number.
+        """
+        pages: dict[int, str] = dict()
+        for filename, size in files.items():
+            name, _, ext = filename.partition(".")
+            if name.isdigit() and ext and size > 0:
+                pages[int(name)] = ext
+        return pages
+
+    async def _stored_pages(self, doujin_dir: Path) -> dict[int, str]:
+        """
+        Returns the extension of every non-empty page of a doujinshi in the storage, by page number.
+        """
+        return self._pages_of(await self._stored_files(doujin_dir))
+
+    @classmethod
+    def _missing_pages(cls, files: dict[str, int], page_count: int) -> list[int]:
+        """
+        Returns the page numbers, from 1 to `page_count`, not in the listing `files` or zero-byte.
+        """
+        present: dict[int, str] = cls._pages_of(files)
+        return [page for page in range(1, page_count + 1) if page not in present]
+
+    async def _scrape_metadata(
+        self, id: int, save_meta: bool = True
+    ) -> GalleryRecord | None:
+        """
+        First stage of a scrape: fetches and saves the tags, and finds the first image.
+        :param save_meta: Write the tags to the meta file. False keeps the one on disk.
+
+        :returns: What the image stage needs to download the pages, None if error.
+        """
+        log.info(f"Scraping doujinshi #{id:06}")
+        doujin_dir: Path = self.save_dir / str(id)
+
         url_cover: str = self._build_doujin_url(id)
-        tags_content: tuple[bytes, int] | None = await self._fetch(url_cover)
-        if not tags_content:
-            return
+        fetched: tuple[dict[str, Any], dict[str, Any] | None] | None = None
+
+        ###### Req for the tags and page table, from the API
+        if self._metadata_source == MetadataSource.API:
+            url_api: str = self._build_api_url(id)
+            api_content: tuple[bytes, int] | None = await self._fetch(url_api)
+            if api_content and api_content[1] == 404:
+                log.info(f"Doujinshi #{id:06} does not exist")
+                self._mark_not_found()
+                return
+
+            if api_content and self._is_req_success(api_content[1]):
+                start: float = time.perf_counter()
+                fetched = await self._parse(
+                    parsers.parse_api_gallery, api_content[0], url_cover
+                )
+                self._record_metadata_stats(
+                    MetadataSource.API, len(api_content[0]), start
+                )
 
-        if not self._is_req_success(tags_content[1]):
-            return
+            if not fetched:
+                log.warning(
+                    f"API failed for doujinshi #{id:06}: falling back to the presentation page"
+                )
 
-        tags: dict[str, Any] = parsers.parse_tags(tags_content[0], url_cover)
+        ###### Req for the tags and page table, from the presentation page
+        if not fetched:
+            tags_content: tuple[bytes, int] | None = await self._fetch(url_cover)
+            if not tags_content:
+                return
+
+            if tags_content[1] == 404:
+                self._mark_not_found()
+            if not self._is_req_success(tags_content[1]):
+                return
+
+            start = time.perf_counter()
+            fetched = (
+                await self._parse(
+                    parsers.parse_tags, tags_content[0], url_cover, self._parser_backend
+                ),
+                await self._parse(parsers.parse_page_table, tags_content[0]),
+            )
+            self._record_metadata_stats(
+                MetadataSource.HTML, len(tags_content[0]), start
+            )
+
+        tags, page_table = fetched
         # log.debug(f"{tags = }")
         page_count: int | None = tags.get("pages")
         if not page_count:
             log.warning(f"Skipping doujinshi #{id:05}: Page count not found")
             return
 
-        if not self._save_doujin_json(doujin_dir, tags):
+        if save_meta and not await self._save_doujin_json(doujin_dir, tags):
             return
 
+        ###### The URLs of the images, straight from the page table
+        if page_table and len(page_table["extensions"]) == page_count:
+            for ext in page_table["extensions"]:
+                self._extension_predictor.observe(ext)
+            return GalleryRecord(
+                id,
+                doujin_dir,
+                page_count,
+                image_urls=self._build_image_urls(page_table),
+                meta=tags,
+            )
+
+        log.warning(
+            f"No usable page table for doujinshi #{id:06}: falling back to guessing image URLs"
+        )
+
         ###### Req for the first image direct link
         url_first_page: str = self._build_doujin_url_first_page(id)
         image_page_content: tuple[bytes, int] | None = await self._fetch(url_first_page)
@@ -550,8 +1732,10 @@ class Scraper:
         if not self._is_req_success(image_page_content[1]):
             return
 
-        direct_link_first_image: str | None = parsers.parse_image_direct_link(
-            image_page_content[0]
+        direct_link_first_image: str | None = await self._parse(
+            parsers.parse_image_direct_link,
+            image_page_content[0],
+            self._parser_backend,
         )
         if not direct_link_first_image:
             log.warning(
@@ -560,19 +1744,128 @@ class Scraper:
             return
 
         log.debug(f"{direct_link_first_image = }")
+        return GalleryRecord(
+            id,
+            doujin_dir,
+            page_count,
+            first_image_url=direct_link_first_image,
+            meta=tags,
+        )
+
+    @staticmethod
+    def _mark_not_found() -> None:
+        if job := _current_job.get():
+            job.not_found = True
+
+    def _record_metadata_stats(
+        self, source: MetadataSource, size: int, parse_start: float
+    ) -> None:
+        stats: MetadataStats = self.metadata_stats[source]
+        stats.galleries += 1
+        stats.bytes += size
+        if job := _current_job.get():
+            job.bytes += size
+        stats.parse_s += time.perf_counter() - parse_start
+
+    async def _scrape_images(
+        self, record: GalleryRecord, pages: list[int] | None = None
+    ) -> Path | None:
+        """
+        Second stage of a scrape: downloads the pages of the doujinshi, then packs it if enabled.
+        :param pages: The page numbers to download. None for the ones not stored yet.
+            Without a page table, the stored pages are always listed to be skipped.
+
+        :returns: The path of the directory (or archive) where the doujinshi has been saved.
+        """
+        # Where the pages are downloaded to, whatever the storage.
+        record.doujin_dir.mkdir(parents=True, exist_ok=True)
 
         ###### Reqs to download the images
-        if not await self._download_images(
-            doujin_dir, direct_link_first_image, page_count
-        ):
+        if record.image_urls:
+            # Only the pages not already stored, when resuming.
+            missing: set[int] = set(
+                pages
+                if pages is not None
+                else self._missing_pages(
+                    await self._stored_files(record.doujin_dir), record.page_count
+                )
+            )
+            if len(missing) < record.page_count:
+                log.info(
+                    f"Doujinshi #{record.id:06}: downloading the {len(missing)} missing pages out of {record.page_count}"
+                )
+            success: bool = await self._download_images(
+                record.doujin_dir,
+                [
+                    url
+                    for page, url in enumerate(record.image_urls, start=1)
+                    if page in missing
+                ],
+            )
+        elif record.first_image_url:
+            success = await self._download_images_guessing(
+                record.doujin_dir, record.first_image_url, record.page_count
+            )
+        else:
+            success = False
+
+        if not success:
             log.warning(
-                f"There has been at least one error trying to download #{id:06}"
+                f"There has been at least one error trying to download #{record.id:06}"
             )
+            await self._index_gallery(record.doujin_dir, record.meta)
+            self._remove_staging_dir(record.doujin_dir)
+            return record.doujin_dir
+
+        if job := _current_job.get():
+            job.complete = True
+        self._remove_staging_dir(record.doujin_dir)
+
+        saved_path: Path = record.doujin_dir
+        if self._packed:
+            try:
+                saved_path = await asyncio.to_thread(pack_dir, record.doujin_dir)
+            except Exception as e:
+                log.warning(f"Failed to pack doujinshi #{record.id:06}: {e}")
 
-        return doujin_dir
+        await self._index_gallery(saved_path, record.meta)
+        return saved_path
+
+    def _remove_staging_dir(self, doujin_dir: Path) -> None:
+        """
+        Removes the local directory the pages were downloaded to, with a remote storage.
+        """
+        if isinstance(self._storage, LocalStorage):
+            return
+        try:
+            doujin_dir.rmdir()
+        except OSError as e:
+            log.debug(f"Failed to remove the staging directory {doujin_dir}: {e}")
+
+    async def _index_gallery(
+        self, path: Path, meta: dict[str, Any] | None = None
+    ) -> None:
+        """
+        Updates the row of the doujinshi saved at `path` in the library index, if enabled.
+        """
+        if not self._library_index:
+            return
+        if not isinstance(self._storage, LocalStorage):
+            if meta is None:
+                return
+            entry = entry_from_files(
+                int(path.name), meta, await self._stored_files(path)
+            )
+        elif meta is not None and path.is_dir():
+            # The metadata is already known: only the directory is listed.
+            entry = await asyncio.to_thread(scan_loose, path, meta)
+        else:
+            entry = await asyncio.to_thread(scan, path)
+        if entry:
+            self._library_index.put(entry)
 
     async def _find_highest_id_parse_search(self) -> int:
-        url: str = "https://nhentai.net/search/?q=uploaded%3A%3C99999999d"
+        url: str = f"{self._SITE_URL}/search/?q=uploaded%3A%3C99999999d"
         content: tuple[bytes, int] | None = await self._fetch(url)
         if not content:
             log.error(f"Failed to find highest ID by querying URL: {url}")
@@ -581,7 +1874,9 @@ class Scraper:
             log.error(f"Failed to find highest ID, HTTP code {content[1]}: {url}")
             return -1
 
-        highest_id: int | None = parsers.parse_first_doujin_id_in_search(content[0])
+        highest_id: int | None = await self._parse(
+            parsers.parse_first_doujin_id_in_search, content[0], self._parser_backend
+        )
         if highest_id is None:
             log.error(f"Failed to find highest ID by parsing URL content: {url}")
             return -1
@@ -628,7 +1923,10 @@ class Scraper:
         return await self._find_highest_id_binary_search()
 
     async def scrape_multiple(
-        self, ids: Iterable[int], callback: Callable[[Path | None], None] | None = None
+        self,
+        ids: Iterable[int],
+        callback: Callable[[Path | None], None] | None = None,
+        on_done: Callable[[int], None] | None = None,
     ) -> None:
         """
         Downloads multiple doujinshis from their IDs (sauces).
@@ -653,13 +1951,19 @@ class Scraper:
 
                     scraper.scrape_multiple([1, 2, 3], callback=on_complete)
 
+            on_done: Optional function called with each ID taken from `ids` once it is
+                finished (or skipped), so that the caller knows exactly which ones are
+                left when the scrape is interrupted.
+
         Returns:
             None
 
         """
 
-        batch_size: int = self._batch_size
-        tasks = []
+        pipelined: bool = bool(self._metadata_workers)
+        image_workers: int = self._batch_size
+        # Without the pipeline, each worker does the whole scrape of a doujinshi.
+        metadata_workers: int = self._metadata_workers or image_workers
 
         total = len(ids) if hasattr(ids, "__len__") else None
 
@@ -669,46 +1973,170 @@ class Scraper:
             if not self._max_reqs_per_second
             else str(self._max_reqs_per_second)
         )
+        workers_str = (
+            f"{metadata_workers} metadata workers feeding {image_workers} image workers"
+            if pipelined
+            else f"{image_workers} doujinshis at once"
+        )
         log.info(
-            f"Scraping {total_str} doujinshis. Batch size of {batch_size}, number of concurrent downloads allowed: {self._max_coroutines}, number of requests per seconds allowed: {rps_str} req/s"
+            f"Scraping {total_str} doujinshis. {workers_str}, number of concurrent downloads allowed: {self._max_coroutines}, number of requests per seconds allowed: {rps_str} req/s"
         )
 
-        completed = 0
-        batch_processed: int = 0
+        # Both bounded: IDs are pulled lazily from `ids` as workers free up,
+        # and the metadata stage stays at most one round ahead of the image stage.
+        id_queue: asyncio.Queue[int | None] = asyncio.Queue(
+            maxsize=metadata_workers * 2
+        )
+        record_queue: asyncio.Queue[GalleryRecord | None] = asyncio.Queue(
+            maxsize=image_workers
+        )
+        completed: int = 0
+        succeeded: int = 0
+        dead: int = 0
+        failed_ids: list[int] = list()
+        skipped: int = 0
+        skipped_dead: int = 0
+        start: float = time.monotonic()
+        jobs: dict[int, JobProgress] = dict()
+
+        def start_job(id: int) -> None:
+            jobs[id] = JobProgress()
+            _current_job.set(jobs[id])
+            if self._journal:
+                self._journal.start(id)
+
+        def finish(id: int, result: Path | None) -> None:
+            nonlocal completed, succeeded, dead
+
+            progress: JobProgress = jobs.pop(id)
+            if progress.complete:
+                succeeded += 1
+            elif progress.not_found:
+                dead += 1
+            else:
+                failed_ids.append(id)
+            if self._journal:
+                self._journal.finish(id, progress)
+            if on_done:
+                on_done(id)
+            if self._tombstones is not None:
+                if progress.not_found:
+                    self._tombstones.add(id)
+                elif progress.complete:
+                    self._tombstones.discard(id)
+
+            if callback:
+                try:
+                    callback(result)
+                except Exception as e:
+                    log.error(f"Callback failed: {e}")
+
+            completed += 1
+            if total:
+                queues_str = (
+                    f", queued: {id_queue.qsize()} IDs, {record_queue.qsize()} doujinshis for images"
+                    if pipelined
+                    else ""
+                )
+                done: int = completed + skipped + skipped_dead
+                log.info(
+                    f"Progress: {done}/{total} ({done/total*100:.1f}%), {self._galleries_per_hour(completed, start):,.0f} doujinshis/h{queues_str}"
+                )
 
-        async def process_batch():
-            """Process current batch of tasks"""
-            nonlocal completed
-            nonlocal batch_processed
+        async def produce() -> None:
+            nonlocal skipped, skipped_dead
 
-            for coro in asyncio.as_completed(tasks):
-                completed += 1
-                if total:
-                    log.info(
-                        f"Progress: {completed}/{total} ({completed/total*100:.1f}%)"
-                    )
+            for id in ids:
+                if self._journal and self._journal.is_finished(id):
+                    skipped += 1
+                elif self._tombstones is not None and self._tombstones.is_dead(id):
+                    skipped_dead += 1
+                else:
+                    await id_queue.put(id)
+                    continue
+                if on_done:
+                    on_done(id)
+            # One stop marker per worker.
+            for _ in range(metadata_workers):
+                await id_queue.put(None)
+
+        async def metadata_work() -> None:
+            while (id := await id_queue.get()) is not None:
+                start_job(id)
                 try:
-                    result: Path | None = await coro
-                    if callback:
-                        callback(result)
+                    if not pipelined:
+                        finish(id, await self.scrape_single(id))
+                    elif existing_dir := await self._existing_doujin_dir(id):
+                        jobs[id].complete = True
+                        finish(id, existing_dir)
+                    elif record := await self._scrape_metadata(id):
+                        await record_queue.put(record)
+                    else:
+                        finish(id, None)
                 except Exception as e:
-                    log.error(f"Task failed: {e}")
-
-            batch_processed += 1
-            log.debug(f"Processed batch #{batch_processed}")
+                    log.error(f"Task failed for doujinshi #{id:06}: {e}")
+                    finish(id, None)
+
+        async def metadata_stage() -> None:
+            async with asyncio.TaskGroup() as tg:
+                for _ in range(metadata_workers):
+                    tg.create_task(metadata_work())
+            if pipelined:
+                for _ in range(image_workers):
+                    await record_queue.put(None)
+
+        async def image_work() -> None:
+            while (record := await record_queue.get()) is not None:
+                _current_job.set(jobs[record.id])
+                try:
+                    finish(record.id, await self._scrape_images(record))
+                except Exception as e:
+                    log.error(f"Task failed for doujinshi #{record.id:06}: {e}")
+                    finish(record.id, None)
+
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(produce())
+            tg.create_task(metadata_stage())
+            if pipelined:
+                for _ in range(image_workers):
+                    tg.create_task(image_work())
+
+        skipped_str: str = (
+            f", skipped {skipped} already finished according to the journal"
+            if skipped
+            else ""
+        )
+        if skipped_dead:
+            skipped_str += f", skipped {skipped_dead} known dead IDs"
+        log.info(
+            f"Scraped {succeeded} doujinshis in {time.monotonic() - start:.1f}s ({self._galleries_per_hour(succeeded, start):,.0f} doujinshis/h): "
+            f"{dead} IDs do not exist, {len(failed_ids)} failed{skipped_str}"
+        )
+        if failed_ids:
+            shown: str = ", ".join(str(id) for id in sorted(failed_ids)[:50])
+            more: str = (
+                f" and {len(failed_ids) - 50} more" if len(failed_ids) > 50 else ""
+            )
+            log.warning(f"Failed IDs: {shown}{more}")
 
-        for id in ids:
-            tasks.append(self.scrape_single(id))
+    @staticmethod
+    def _galleries_per_hour(completed: int, start: float) -> float:
+        elapsed: float = time.monotonic() - start
+        return completed / elapsed * 3600 if elapsed > 0 else 0.0
 
-            if len(tasks) >= batch_size:
-                await process_batch()
-                tasks.clear()
-                # After each batch, wait between 1 to 2 seconds.
-                await asyncio.sleep(random.uniform(1.5, 2.5))
+    async def scrape_unfinished(
+        self, callback: Callable[[Path | None], None] | None = None
+    ) -> None:
+        """
+        Scrapes again the IDs the job journal recorded as failed or interrupted.
+        Requires `journal_filepath`.
+        callback: Optional function called after each download completes.
+        """
+        if not self._journal:
+            log.error("Cannot scrape unfinished doujinshis: no job journal")
+            return
 
-        # Process any remaining tasks
-        if tasks:
-            await process_batch()
+        return await self.scrape_multiple(self._journal.unfinished_ids(), callback)
 
     async def scrape_all(
         self, callback: Callable[[Path | None], None] | None = None
@@ -726,12 +2154,56 @@ class Scraper:
 
         return await self.scrape_multiple(range(1, max_id + 1), callback)
 
+    async def scrape_new(
+        self,
+        state_filepath: str | None = None,
+        since_id: int | None = None,
+        callback: Callable[[Path | None], None] | None = None,
+    ) -> None:
+        """
+        Scrapes the doujinshis uploaded since the last call, from the newest down,
+        plus what the last call left unfinished (it was interrupted, or the IDs were in flight).
+        Costs one search request plus the new IDs: suited to a daily cron job.
+
+        state_filepath: Where what is left to scrape persists between calls.
+            Defaults to `.sync_state.json` in `save_dir`, so that it follows the library.
+        since_id: On the first call only (no state yet), scrape the IDs above this one
+            instead of the whole catalog.
+        callback: Optional function called after each download completes.
+            Receives the Path to the downloaded doujinshi, or None if
+            the download failed. Useful for progress tracking or logging.
+
+        IDs that failed are not retried by the next call: use a journal and scrape_unfinished().
+        """
+        state = SyncState(state_filepath or str(self.save_dir / ".sync_state.json"))
+        if not state.ceiling and since_id:
+            state.ceiling = since_id
+
+        highest_id: int = await self._find_highest_id()
+        if highest_id < 1:
+            log.error("Failed to determine the highest ID")
+            return
+
+        added: int = state.extend(highest_id)
+        log.info(
+            f"Scraping new doujinshis up to ID {highest_id}: {added} new IDs, {len(state) - added} left from the last run"
+        )
+
+        try:
+            await self.scrape_multiple(state, callback, state.done)
+        except BaseException:
+            state.save()
+            raise
+        state.finish()
+
     async def scrape_random(
         self,
         n: int,
         min_id: int = 1,
         max_id: int | None = None,
         callback: Callable[[Path | None], None] | None = None,
+        seed: int | None = None,
+        start: int = 0,
     ) -> None:
         """
         Downloads `n` doujinshis randomly from ID `min_id` up to and including ID `max_id`.
@@ -739,14 +2211,13 @@ class Scraper:
         Determines the highest ID and selects random doujinshis.
 
         Special Case:
-            if `n` is negative (-1), download up to and including `max_id` Ids.
+            if `n` is negative (-1), download all the IDs from `min_id` up to and including `max_id`.
             This makes it so you can download ALL the doujinshis of the site randomly by doing this:
             `scrape_random(-1)`
 
-        :param batch_size: How many doujinshis will be downloaded concurrently.
-
-        start >= 1.
-        As for stop, TODO.
+        The random order is a permutation computed on the fly (constant memory) from `seed`.
+        The same `n`, `min_id`, `max_id` and `seed` always give the same order; pass the
+        `start` position logged when a run stops to resume it where it was.
 
         callback: Optional function called after each download completes.
         Receives the Path to the downloaded doujinshi, or None if
@@ -767,8 +2238,18 @@ class Scraper:
             log.error("Cannot choose random IDs: max_id must be greater than min_id")
             return
 
+        id_range: range = range(min_id, max_id + 1)
         if n < 0:
-            n = max_id
+            n = len(id_range)
+
+        if len(id_range) < n:
+            log.warning(
+                "n is greater than ID population; please increase the population or decrease n"
+            )
+            return
+
+        if seed is None:
+            seed = random.getrandbits(32)
 
         rps_str = (
             "unlimited"
@@ -776,17 +2257,19 @@ class Scraper:
             else str(self._max_reqs_per_second)
         )
         log.info(
-            f"Scraping {n} doujinshis randomly from ID {min_id} to {max_id}. Batch size of {self._batch_size}, number of concurrent downloads allowed: {self._max_coroutines}, number of requests per seconds allowed: {rps_str} req/s"
+            f"Scraping {n - start} doujinshis randomly from ID {min_id} to {max_id} (seed {seed}, from position {start}). {self._batch_size} doujinshis at once, number of concurrent downloads allowed: {self._max_coroutines}, number of requests per seconds allowed: {rps_str} req/s"
         )
 
-        id_range: range = range(min_id, max_id + 1)
-
-        if len(id_range) < n:
-            log.warning(
-                "n is greater than ID population; please increase the population or decrease n"
-            )
-            return
-
-        # Random IDs (very RAM-inneficient, but oh well... (~7MiB for a list of 1_000_000 rnd integers...))
-        rnd_ids: list[int] = random.sample(id_range, n)
-        await self.scrape_multiple(rnd_ids, callback)
+        # Random IDs, generated lazily.
+        cursor = PermutationCursor(
+            RandomPermutation(len(id_range), seed), start, n, offset=min_id
+        )
+        try:
+            await self.scrape_multiple(cursor, callback, cursor.done)
+        finally:
+            # The first ID handed out and not finished: none is skipped by the next run.
+            resume_at: int = cursor.resume_position
+            if resume_at < n:
+                log.info(
+                    f"To resume: scrape_random({n}, min_id={min_id}, max_id={max_id}, seed={seed}, start={resume_at})"
+                )
@@ -0,0 +1,184 @@
+"""
+packed_gallery.py
+
+The packed layout of a doujinshi: one uncompressed (stored) ZIP, `{id}.cbz`, holding
+`meta.json` and the `{page}.{ext}` images, instead of a `{id}/` directory of files.
+One inode per doujinshi instead of one per page, and any comic reader opens it.
+
+Pages are read by offset, straight from the archive: images are stored, not compressed,
+so a page is one contiguous range of the file, located with the central directory.
+"""
+
+import json
+import os
+import shutil
+import struct
+import zipfile
+from pathlib import Path
+from typing import Any
+
+PACKED_SUFFIX: str = ".cbz"
+
+# Signature, ..., file name length, extra field length: the data follows both.
+_LOCAL_HEADER: struct.Struct = struct.Struct("<4s22xHH")
+_LOCAL_HEADER_SIGNATURE: bytes = b"PK\x03\x04"
+
+
+def packed_path(save_dir: Path, id: int) -> Path:
+    """Returns the path of the packed doujinshi `id`."""
+    return save_dir / f"{id}{PACKED_SUFFIX}"
+
+
+def _page_files(doujin_dir: Path) -> dict[int, Path]:
+    pages: dict[int, Path] = dict()
+    for entry in os.scandir(doujin_dir):
+        name, _, ext = entry.name.partition(".")
+        if name.isdigit() and ext and entry.is_file():
+            pages[int(name)] = Path(entry.path)
+    return pages
+
+
+def pack_dir(
+    doujin_dir: Path, meta_filename: str = "meta.json", remove: bool = True
+) -> Path:
+    """
+    Packs a complete doujinshi directory into `{id}.cbz` next to it. Blocking.
+    The archive only appears once fully written.
+
+    :param remove: Delete the directory once packed.
+    :returns: The path of the archive.
+    :raises ValueError: If the doujinshi is incomplete (a page, or the metadata, is missing).
+    """
+    meta_path: Path = doujin_dir / meta_filename
+    with meta_path.open("r", encoding="utf-8") as f:
+        page_count: int = int(json.load(f).get("pages") or 0)
+    pages: dict[int, Path] = _page_files(doujin_dir)
+    if page_count < 1 or sorted(pages) != list(range(1, page_count + 1)):
+        raise ValueError(
+            f"{doujin_dir} is incomplete: {len(pages)} pages out of {page_count}"
+        )
+
+    archive_path: Path = doujin_dir.with_name(f"{doujin_dir.name}{PACKED_SUFFIX}")
+    tmp_path: Path = archive_path.with_name(f".{archive_path.name}.part")
+    try:
+        with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_STORED) as zf:
+            zf.write(meta_path, meta_filename)
+            for page in range(1, page_count + 1):
+                zf.write(pages[page], pages[page].name)
+        os.replace(tmp_path, archive_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    if remove:
+        shutil.rmtree(doujin_dir)
+    return archive_path
+
+
+def unpack(archive_path: Path, remove: bool = True) -> Path:
+    """
+    Unpacks `{id}.cbz` into the `{id}/` directory next to it. Blocking.
+    The directory only appears once fully extracted.
+
+    :param remove: Delete the archive once unpacked.
+    :returns: The path of the directory.
+    """
+    doujin_dir: Path = archive_path.with_suffix("")
+    tmp_dir: Path = doujin_dir.with_name(f".{doujin_dir.name}.part")
+    try:
+        with zipfile.ZipFile(archive_path) as zf:
+            zf.extractall(tmp_dir)
+        os.replace(tmp_dir, doujin_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    if remove:
+        archive_path.unlink()
+    return doujin_dir
+
+
+class PackedGallery:
+    """
+    Random access to the pages of a packed doujinshi, without unpacking it:
+        with PackedGallery(Path("../manga/177013.cbz")) as gallery:
+            image: bytes = gallery.page(3)
+    """
+
+    def __init__(self, archive_path: Path, meta_filename: str = "meta.json") -> None:
+        self.path: Path = archive_path
+        self._meta_filename: str = meta_filename
+        self._fd: int = os.open(archive_path, os.O_RDONLY)
+        try:
+            # Only the central directory is read.
+            with open(self._fd, "rb", closefd=False) as f:
+                with zipfile.ZipFile(f) as zf:
+                    self._entries: dict[str, zipfile.ZipInfo] = {
+                        info.filename: info for info in zf.infolist()
+                    }
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+        self._pages: dict[int, zipfile.ZipInfo] = dict()
+        for name, info in self._entries.items():
+            page, _, ext = name.partition(".")
+            if page.isdigit() and ext:
+                self._pages[int(page)] = info
+
+    def __enter__(self) -> "PackedGallery":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def __len__(self) -> int:
+        """The number of pages."""
+        return len(self._pages)
+
+    def page_name(self, page: int) -> str:
+        """Returns the file name (`{page}.{ext}`) of page `page`, counted from 1."""
+        return self._page_info(page).filename
+
+    def page(self, page: int) -> bytes:
+        """Returns the image of page `page`, counted from 1."""
+        return self._read(self._page_info(page))
+
+    def meta(self) -> dict[str, Any]:
+        """Returns the JSON metadata of the doujinshi."""
+        info: zipfile.ZipInfo | None = self._entries.get(self._meta_filename)
+        if not info:
+            raise KeyError(f"{self.path} has no {self._meta_filename}")
+        return json.loads(self._read(info))
+
+    def _page_info(self, page: int) -> zipfile.ZipInfo:
+        info: zipfile.ZipInfo | None = self._pages.get(page)
+        if not info:
+            raise IndexError(f"{self.path} has no page {page}")
+        return info
+
+    def _read(self, info: zipfile.ZipInfo) -> bytes:
+        """Reads an entry by offset: 2 positioned reads, thread-safe."""
+        if info.compress_type != zipfile.ZIP_STORED:
+            with zipfile.ZipFile(self.path) as zf:
+                return zf.read(info)
+
+        header: bytes = os.pread(self._fd, _LOCAL_HEADER.size, info.header_offset)
+        signature, name_len, extra_len = _LOCAL_HEADER.unpack(header)
+        if signature != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(
+                f"{self.path}: bad local header for {info.filename}"
+            )
+
+        data_offset: int = (
+            info.header_offset + _LOCAL_HEADER.size + name_len + extra_len
+        )
+        data: bytes = os.pread(self._fd, info.file_size, data_offset)
+        if len(data) != info.file_size:
+            raise zipfile.BadZipFile(f"{self.path}: {info.filename} is truncated")
+        return data
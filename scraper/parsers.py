@@ -4,7 +4,7 @@ from enum import Enum
 from datetime import date, datetime, timezone
 
 from os import initgroups
-from typing import Any, Generator, Iterator, Never
+from typing import Any, Callable, Generator, Iterator, Never
 from pprint import pprint
 import time
 from bs4 import BeautifulSoup, Tag
@@ -15,17 +15,105 @@ from bs4.element import PageElement
 from itertools import cycle
 from dataclasses import dataclass
 import logging
+import re
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # Optional: falls back to the standard library.
+    _json_loads = json.loads
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # Optional: only the bs4 backend is available.
+    lxml = None
 
 
 logger: logging.Logger = logging.getLogger("scraper")
 
 
-def parse_tags(content: bytes, url: str) -> dict[str, Any]:
+class ParserBackend(Enum):
+    """
+    Enum representing the HTML parsing engines available to the parse functions.
+    Every backend returns exactly the same results.
+    """
+
+    BS4 = "bs4"  # bs4 with the pure-Python "html.parser"
+    LXML = "lxml"  # libxml2 through lxml, C-backed
+
+    def __str__(self) -> str:
+        return self.value
+
+    @classmethod
+    def available(cls) -> list["ParserBackend"]:
+        return [b for b in cls if b != cls.LXML or lxml is not None]
+
+    @classmethod
+    def default(cls) -> "ParserBackend":
+        """The fastest installed backend."""
+        return cls.LXML if lxml is not None else cls.BS4
+
+
+# `window._gallery = JSON.parse("...")` on the presentation page; the argument is a JS string literal.
+_GALLERY_JSON_RE = re.compile(
+    rb'window\._gallery\s*=\s*JSON\.parse\(("(?:[^"\\]|\\.)*")\)'
+)
+_THUMBNAIL_SERVER_RE = re.compile(rb"//(t\d*\.nhentai\.net)/galleries/")
+
+# Page image types as found in the gallery JSON, e.g. {"t": "j", "w": 1280, "h": 1810}
+IMAGE_TYPES: dict[str, str] = {"j": "jpg", "p": "png", "g": "gif", "w": "webp"}
+
+
+def _lxml_root(content: bytes) -> Any | None:
+    """
+    Parses `content` into an lxml tree. nhentai serves UTF-8.
+    Returns None if the document is empty.
+    """
+    if lxml is None:
+        raise RuntimeError("The lxml parser backend requires the 'lxml' package")
+    try:
+        parser = lxml.html.HTMLParser(encoding="utf-8")
+        return lxml.html.document_fromstring(content, parser=parser)
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _xpath_has_class(name: str) -> str:
+    """XPath predicate equivalent to bs4's ``class_=name`` (one of the classes)."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# bs4 leaves out the comments, and the content of <script>, <style> and <template>.
+_LXML_TEXT_XPATH: str = (
+    ".//text()[not(ancestor::script or ancestor::style or ancestor::template)]"
+)
+
+
+def _lxml_strings(el: Any) -> list[str]:
+    """Equivalent of bs4's ``Tag.strings``."""
+    return el.xpath(_LXML_TEXT_XPATH)
+
+
+def _lxml_text(el: Any) -> str:
+    """Equivalent of bs4's ``Tag.text``."""
+    return "".join(_lxml_strings(el))
+
+
+def parse_tags(
+    content: bytes, url: str, backend: ParserBackend = ParserBackend.BS4
+) -> dict[str, Any]:
     """
     Parses the tags from the HTML of the presentation page for a doujin.
     Tags into a dictionary.
     """
+    if backend == ParserBackend.LXML:
+        return _parse_tags_lxml(content, url)
+    return _parse_tags_bs4(content, url)
 
+
+def _parse_tags_bs4(content: bytes, url: str) -> dict[str, Any]:
     # Current time at which the doujin was scraped.
     current_datetime = datetime.now(timezone.utc).isoformat()
     tags = {"pages": None, "url": url, "datetime_scraped_at": current_datetime}
@@ -76,24 +164,88 @@ def parse_tags(content: bytes, url: str) -> dict[str, Any]:
     return tags
 
 
-def parse_image_direct_link(content: bytes) -> str | None:
+def _parse_tags_lxml(content: bytes, url: str) -> dict[str, Any]:
+    current_datetime = datetime.now(timezone.utc).isoformat()
+    tags = {"pages": None, "url": url, "datetime_scraped_at": current_datetime}
+
+    root = _lxml_root(content)
+    if root is None:
+        return tags
+
+    tags_section = next(iter(root.iterfind(".//section[@id='tags']")), None)
+    if tags_section is None:
+        return tags
+
+    for container in tags_section.xpath(f".//div[{_xpath_has_class('tag-container')}]"):
+        field_text = "".join(t.strip() for t in _lxml_strings(container))
+        field_name = field_text.split(":")[0].lower() if ":" in field_text else ""
+
+        if not field_name:
+            logger.debug(
+                f"Failed to parse tag field name (empty) for field text: {field_text}"
+            )
+            continue
+
+        for tag in container.xpath(f".//span[{_xpath_has_class('tags')}]"):
+            name_texts = [
+                _lxml_text(n).strip()
+                for n in tag.xpath(f".//span[{_xpath_has_class('name')}]")
+            ]
+            count_texts = [
+                _lxml_text(c).strip()
+                for c in tag.xpath(f".//span[{_xpath_has_class('count')}]")
+            ]
+            time = next(iter(tag.iterfind(".//time")), None)
+
+            if name_texts and count_texts:
+                tags[field_name] = [
+                    {"name": n, "count": c} for n, c in zip(name_texts, count_texts)
+                ]
+            elif name_texts and not count_texts:
+                for name in name_texts:
+                    if field_name == "pages":
+                        tags[field_name] = int(name)
+                    else:
+                        tags[field_name] = name
+
+            if time is not None:
+                tags["datetime_iso8601"] = time.get("datetime")
+                tags["time_relative"] = _lxml_text(time).strip()
+
+    return tags
+
+
+def parse_image_direct_link(
+    content: bytes, backend: ParserBackend = ParserBackend.BS4
+) -> str | None:
     """
     Returns the direct download link to the image.
     Content typically fetched from a URL such as:
     https://nhentai.net/g/{doujinshi_id}/{page_number}/
     """
-    soup = BeautifulSoup(content, "html.parser")
-    img = soup.select_one("#image-container img")
+    if backend == ParserBackend.LXML:
+        root = _lxml_root(content)
+        if root is None:
+            return None
+        img = next(iter(root.xpath("//*[@id='image-container']//img")), None)
+    else:
+        soup = BeautifulSoup(content, "html.parser")
+        img = soup.select_one("#image-container img")
 
-    if img and (src := img.get("src")):
+    if img is not None and (src := img.get("src")):
         return str(src)
 
 
-def parse_first_doujin_id_in_search(content: bytes) -> int | None:
+def parse_first_doujin_id_in_search(
+    content: bytes, backend: ParserBackend = ParserBackend.BS4
+) -> int | None:
     """
     Returns the ID of the first doujinshi by parsing the `content`.
     Content should come from a search results page.
     """
+    if backend == ParserBackend.LXML:
+        return _parse_first_doujin_id_in_search_lxml(content)
+
     parsed_id: int | None = None
 
     soup = BeautifulSoup(content, "html.parser")
@@ -114,3 +266,187 @@ def parse_first_doujin_id_in_search(content: bytes) -> int | None:
         logger.warning("Failed to parse first doujinshi ID from href")
 
     return parsed_id
+
+
+def _parse_first_doujin_id_in_search_lxml(content: bytes) -> int | None:
+    parsed_id: int | None = None
+
+    root = _lxml_root(content)
+    if root is None:
+        return None
+
+    # bs4 matches a class string containing spaces against the whole attribute.
+    container = next(
+        iter(root.xpath("//div[@class='container index-container']")), None
+    )
+    if container is None:
+        return None
+
+    a = next(iter(container.xpath(f".//a[{_xpath_has_class('cover')}]")), None)
+    if a is None:
+        return None
+
+    href: str = a.get("href", "").strip()
+    try:
+        parsed_id = int(href.split("/")[2])
+    except (IndexError, ValueError):
+        logger.warning("Failed to parse first doujinshi ID from href")
+
+    return parsed_id
+
+
+def parse_page_table(content: bytes) -> dict[str, Any] | None:
+    """
+    Returns what is needed to build the URL of every page of a doujin, from the
+    `window._gallery` JSON embedded in its presentation page:
+    https://nhentai.net/g/{doujinshi_id}/
+
+    e.g. {"media_id": "987654", "extensions": ["jpg", "png"], "thumbnail_server": "t3.nhentai.net"}
+    "thumbnail_server" is None if no thumbnail was found.
+    Returns None if the page table is missing or has an unknown image type.
+    """
+    match = _GALLERY_JSON_RE.search(content)
+    if not match:
+        return None
+
+    try:
+        gallery: dict[str, Any] = json.loads(json.loads(match.group(1)))
+        media_id: str = str(gallery["media_id"])
+        types: list[str] = [page["t"] for page in gallery["images"]["pages"]]
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Failed to parse the gallery JSON: {e}")
+        return None
+
+    try:
+        extensions: list[str] = [IMAGE_TYPES[t] for t in types]
+    except KeyError as e:
+        logger.warning(f"Unknown image type in the gallery JSON: {e}")
+        return None
+
+    server = _THUMBNAIL_SERVER_RE.search(content)
+    return {
+        "media_id": media_id,
+        "extensions": extensions,
+        "thumbnail_server": server.group(1).decode() if server else None,
+    }
+
+
+# Tag types of the JSON API, mapped to the field names of the presentation page, in page order.
+_API_TAG_FIELDS: dict[str, str] = {
+    "parody": "parodies",
+    "character": "characters",
+    "tag": "tags",
+    "artist": "artists",
+    "group": "groups",
+    "language": "languages",
+    "category": "categories",
+}
+
+
+def _abbreviate_count(count: int) -> str:
+    """
+    Formats a tag count the way the presentation page displays it, rounded down:
+    one decimal below 10K, none above. e.g. 1100 -> "1.1K", 1000 -> "1K", 12345 -> "12K".
+    """
+    if count < 1000:
+        return str(count)
+    if count < 10_000:
+        return f"{count // 100 / 10:g}K"
+    if count < 1_000_000:
+        return f"{count // 1000}K"
+    if count < 10_000_000:
+        return f"{count // 100_000 / 10:g}M"
+    return f"{count // 1_000_000}M"
+
+
+def _relative_time(then: datetime, now: datetime) -> str:
+    """e.g. "9 years ago", close to what the presentation page displays."""
+    seconds: int = max(0, int((now - then).total_seconds()))
+    for unit, length in (
+        ("year", 365 * 24 * 3600),
+        ("month", 30 * 24 * 3600),
+        ("week", 7 * 24 * 3600),
+        ("day", 24 * 3600),
+        ("hour", 3600),
+        ("minute", 60),
+    ):
+        if seconds >= length:
+            n: int = seconds // length
+            return f"{n} {unit}{'s' if n > 1 else ''} ago"
+    return "just now"
+
+
+def parse_api_gallery(
+    content: bytes, url: str
+) -> tuple[dict[str, Any], dict[str, Any]] | None:
+    """
+    Parses a gallery from the JSON API, e.g. https://nhentai.net/api/gallery/{doujinshi_id}
+    into the tags (same schema as `parse_tags`) and the page table (same schema as `parse_page_table`).
+    `url` is the URL of the presentation page, stored in the tags.
+    Returns None if the JSON is invalid.
+    """
+    current_datetime = datetime.now(timezone.utc)
+    tags: dict[str, Any] = {
+        "pages": None,
+        "url": url,
+        "datetime_scraped_at": current_datetime.isoformat(),
+    }
+
+    try:
+        gallery: dict[str, Any] = _json_loads(content)
+        by_field: dict[str, list[dict[str, str]]] = dict()
+        for tag in gallery.get("tags", []):
+            field_name: str | None = _API_TAG_FIELDS.get(tag["type"])
+            if field_name:
+                by_field.setdefault(field_name, []).append(
+                    {"name": tag["name"], "count": _abbreviate_count(tag["count"])}
+                )
+
+        for field_name in _API_TAG_FIELDS.values():
+            if field_name in by_field:
+                tags[field_name] = by_field[field_name]
+
+        tags["pages"] = int(gallery["num_pages"])
+        uploaded = datetime.fromtimestamp(int(gallery["upload_date"]), timezone.utc)
+        tags["datetime_iso8601"] = uploaded.isoformat()
+        tags["time_relative"] = _relative_time(uploaded, current_datetime)
+
+        types: list[str] = [page["t"] for page in gallery["images"]["pages"]]
+        page_table: dict[str, Any] = {
+            "media_id": str(gallery["media_id"]),
+            "extensions": [IMAGE_TYPES[t] for t in types],
+            "thumbnail_server": None,
+        }
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        logger.warning(f"Failed to parse the API gallery JSON: {e}")
+        return None
+
+    return tags, page_table
+
+
+# The kinds of HTML pages parsed, e.g. to check the backends against each other (see bench_parsers.py).
+PAGE_KINDS: tuple[str, ...] = ("gallery", "reader", "search")
+
+
+def page_kind(path: Path) -> str:
+    """The kind of a saved page, from the start of its file name. e.g. "gallery" for gallery_quirks.html"""
+    kind: str = path.name.split("_")[0].split(".")[0]
+    if kind not in PAGE_KINDS:
+        raise ValueError(f"Unknown kind of page: {path.name}")
+    return kind
+
+
+def page_parser(kind: str) -> Callable[[bytes, ParserBackend], Any]:
+    """The function parsing a kind of page (see `PAGE_KINDS`) with a given backend."""
+    if kind == "gallery":
+        return lambda content, backend: parse_tags(content, "url", backend)
+    if kind == "reader":
+        return parse_image_direct_link
+    return parse_first_doujin_id_in_search
+
+
+def comparable(result: Any) -> Any:
+    """Drops the fields of a parsing result that legitimately differ between two calls."""
+    if isinstance(result, dict):
+        return {k: v for k, v in result.items() if k != "datetime_scraped_at"}
+    return result
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+
+"""
+rebuild_index.py
+
+Rebuilds the library index (see `library_index`) from an existing doujinshi directory,
+loose and packed doujinshis alike, scanning them in parallel processes.
+
+    python3 rebuild_index.py ../manga/ --index ../manga/library.sqlite3
+
+The new index is built aside, then swapped in at once: readers never see it half-built,
+and the scraper can keep updating the index meanwhile.
+"""
+
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Iterator
+
+from library_index import GalleryEntry, LibraryIndex, iter_galleries, scan
+
+
+def scan_batch(paths: tuple[Path, ...]) -> list[GalleryEntry]:
+    return [entry for path in paths if (entry := scan(path))]
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("doujin_dir", type=Path, help="Where the doujinshis are")
+    arg_parser.add_argument(
+        "--index",
+        type=Path,
+        help="The SQLite file of the index (default: DOUJIN_DIR/library.sqlite3)",
+    )
+    arg_parser.add_argument(
+        "--workers", type=int, default=os.cpu_count() or 1, help="Scanning processes"
+    )
+    arg_parser.add_argument(
+        "--batch", type=int, default=256, help="Doujinshis scanned per task"
+    )
+    args = arg_parser.parse_args()
+
+    if not args.doujin_dir.is_dir():
+        arg_parser.error(f"{args.doujin_dir} is not a directory")
+    index = LibraryIndex(str(args.index or args.doujin_dir / "library.sqlite3"))
+    scanned: int = 0
+    start: float = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+
+        def entries() -> Iterator[GalleryEntry]:
+            nonlocal scanned
+            # Bounded read-ahead of the directory walk.
+            pending: deque[Future[list[GalleryEntry]]] = deque()
+            paths_iter: Iterator[Path] = iter_galleries(args.doujin_dir)
+            while paths := tuple(islice(paths_iter, max(1, args.batch))):
+                scanned += len(paths)
+                pending.append(executor.submit(scan_batch, paths))
+                if len(pending) >= args.workers * 2:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+        indexed: int = index.replace_all(entries())
+
+    elapsed: float = time.perf_counter() - start
+    summary: dict[str, int] = index.summary()
+    index.close()
+    print(
+        f"Indexed {indexed} doujinshis ({scanned - indexed} unreadable skipped) in {elapsed:.1f}s "
+        f"({scanned / elapsed:,.0f} doujinshis/s): {summary['complete']} complete, "
+        f"{summary['pages']} pages, {summary['bytes'] / 1024**2:,.1f} MiB"
+    )
+
+
+if __name__ == "__main__":
+    main()
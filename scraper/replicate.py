@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+"""
+replicate.py
+
+Replicates a doujinshi directory into another one (a backup disk, the directory served
+by the backend, ...), copying only the doujinshis that are new or changed, in parallel.
+
+    python3 replicate.py ../manga/ /mnt/backup/manga/
+    python3 replicate.py ../manga/ /mnt/backup/manga/ --index ../library.db
+
+Each doujinshi is compared by manifest: the list of its files with their sizes and
+modification times (or checksums, with --checksum). Only the files that differ are copied,
+with a reflink or copy_file_range() where the filesystems support it, through a temporary
+file renamed once complete. New doujinshis only appear at the destination once whole.
+The manifest of each doujinshi copied is recorded at the destination (`.replicate_manifests/`),
+checksums included: --checksum only reads the source files modified since, never the copies.
+
+A sync cursor is kept at the destination (`.replicate_state.json`): the next run only
+looks at the doujinshis modified since the previous one (or, with --index, at the ones
+the library index of the scraper saw finish). Nothing is ever deleted at the destination.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import stat
+import time
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no reflinks.
+    fcntl = None
+
+from library_index import LibraryIndex, iter_galleries
+from packed_gallery import PACKED_SUFFIX
+
+# From linux/fs.h: _IOW(0x94, 9, int)
+_FICLONE: int = 0x40049409
+# Rechecked by the next run as well: doujinshis indexed (or renamed into place) while
+# the previous run was starting.
+_CURSOR_SLACK_S: float = 300.0
+_STATE_FILENAME: str = ".replicate_state.json"
+_MANIFESTS_DIRNAME: str = ".replicate_manifests"
+
+# {file name: (size, modification time in ns)}
+Manifest = dict[str, tuple[int, int]]
+# What was copied to a doujinshi of the destination, kept in _MANIFESTS_DIRNAME there:
+# {file name: (size, modification time in ns, blake2b digest in hex or None if not computed)}
+# of the source files. The digests spare --checksum from reading both trees on every run.
+Record = dict[str, tuple[int, int, str | None]]
+
+
+def manifest(path: Path) -> Manifest:
+    """
+    Returns the manifest of a doujinshi: its files if a directory (the hidden ones,
+    e.g. partial downloads, excepted), the file itself if packed. Empty if it does not exist.
+    """
+    try:
+        if path.is_dir():
+            return {
+                entry.name: (st.st_size, st.st_mtime_ns)
+                for entry in os.scandir(path)
+                if not entry.name.startswith(".")
+                and entry.is_file(follow_symlinks=False)
+                and (st := entry.stat(follow_symlinks=False))
+            }
+        st: os.stat_result = path.stat()
+        return {path.name: (st.st_size, st.st_mtime_ns)}
+    except FileNotFoundError:
+        return dict()
+
+
+def file_digest(path: Path) -> bytes:
+    with path.open("rb") as f:
+        return hashlib.file_digest(f, "blake2b").digest()
+
+
+def _copy_data(src, dst, size: int) -> str:
+    """
+    Copies the content of the file `src` into the empty file `dst`, in the kernel when possible.
+
+    :returns: The method used: "reflink", "copy_file_range" or "read/write".
+    """
+    if fcntl is not None:
+        try:
+            # Copy-on-write filesystems (Btrfs, XFS, ...): no data is copied at all.
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+            return "reflink"
+        except OSError:
+            pass
+
+    if hasattr(os, "copy_file_range"):
+        copied: int = 0
+        try:
+            while copied < size:
+                n: int = os.copy_file_range(src.fileno(), dst.fileno(), size - copied)
+                if n == 0:
+                    break
+                copied += n
+            return "copy_file_range"
+        except OSError:
+            # e.g. across filesystems on older kernels: start over in user space.
+            if copied:
+                raise
+
+    shutil.copyfileobj(src, dst, 1024 * 1024)
+    return "read/write"
+
+
+def copy_file(src: Path, dst: Path) -> str:
+    """
+    Copies `src` to `dst` with its modification time, through a hidden temporary file
+    renamed once complete: `dst` never exists half-copied.
+
+    :returns: The method used, see `_copy_data`.
+    """
+    tmp_path: Path = dst.with_name(f".{dst.name}.part")
+    try:
+        with src.open("rb") as fsrc, tmp_path.open("wb") as fdst:
+            st: os.stat_result = os.fstat(fsrc.fileno())
+            method: str = _copy_data(fsrc, fdst, st.st_size)
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp_path, dst)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    return method
+
+
+def manifest_record_path(dst: Path) -> Path:
+    """Where the record of what was replicated to the doujinshi `dst` is kept: aside, not inside it."""
+    return dst.parent / _MANIFESTS_DIRNAME / f"{dst.name}.json"
+
+
+def load_record(dst: Path) -> Record:
+    """Returns the record of the doujinshi `dst`, empty if none (e.g. copied by an older version)."""
+    try:
+        with manifest_record_path(dst).open("r", encoding="utf-8") as f:
+            return {
+                name: (int(size), int(mtime_ns), digest)
+                for name, (size, mtime_ns, digest) in json.load(f).items()
+            }
+    except FileNotFoundError:
+        return dict()
+    except Exception as e:
+        print(
+            f"Failed to load the manifest record of '{dst.name}', checking it again: {e}"
+        )
+        return dict()
+
+
+def save_record(dst: Path, record: Record) -> None:
+    path: Path = manifest_record_path(dst)
+    path.parent.mkdir(exist_ok=True)
+    # Written aside then renamed: a crash never leaves a truncated file.
+    tmp_path: Path = path.with_name(f".{path.name}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump(record, f)
+    tmp_path.replace(path)
+
+
+def differs(
+    src_dir: Path,
+    dst_dir: Path,
+    name: str,
+    src_entry: tuple[int, int],
+    dst_entry: tuple[int, int] | None,
+    known: tuple[int, int, str | None] | None,
+    checksum: bool,
+) -> tuple[bool, str | None]:
+    """
+    Compares a file of the source with its copy. With `checksum`, only the source file is
+    read, and only if it was modified since recorded: the digest of the copy comes from the
+    record (the copy is only read if the record has none, e.g. it was copied without --checksum).
+
+    :returns: A tuple of (whether the file must be copied, the digest of the source file if known).
+    """
+    if dst_entry is None or src_entry[0] != dst_entry[0]:
+        return True, None
+    digest: str | None = known[2] if known and known[:2] == src_entry else None
+    if not checksum:
+        return src_entry[1] != dst_entry[1], digest
+    if known and known[:2] == src_entry:
+        return False, digest
+
+    digest = file_digest(src_dir / name).hex()
+    if known and known[0] == dst_entry[0] and known[2]:
+        dst_digest: str = known[2]
+    else:
+        dst_digest = file_digest(dst_dir / name).hex()
+    return digest != dst_digest, digest
+
+
+def replicate(src: Path, dst: Path, checksum: bool = False) -> tuple[int, Counter]:
+    """
+    Brings the doujinshi `dst` up to date with `src` (both directories, or both packed),
+    and records its manifest (see `Record`).
+
+    :returns: A tuple of (bytes copied, {copy method: files copied}).
+    """
+    src_manifest: Manifest = manifest(src)
+    methods: Counter[str] = Counter()
+    copied: int = 0
+
+    if src.is_dir() and not dst.exists():
+        # Copied aside then renamed: a new doujinshi only appears whole.
+        tmp_dir: Path = dst.with_name(f".{dst.name}.part")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir()
+        try:
+            for name, (size, _) in src_manifest.items():
+                methods[copy_file(src / name, tmp_dir / name)] += 1
+                copied += size
+            os.replace(tmp_dir, dst)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        save_record(
+            dst,
+            {
+                name: (
+                    size,
+                    mtime_ns,
+                    file_digest(src / name).hex() if checksum else None,
+                )
+                for name, (size, mtime_ns) in src_manifest.items()
+            },
+        )
+        return copied, methods
+
+    # The files are named relative to the doujinshi directory, or to the parent of the archive.
+    src_dir, dst_dir = (src, dst) if src.is_dir() else (src.parent, dst.parent)
+    dst_manifest: Manifest = manifest(dst)
+    known: Record = load_record(dst)
+    record: Record = dict()
+    for name, entry in src_manifest.items():
+        changed, digest = differs(
+            src_dir,
+            dst_dir,
+            name,
+            entry,
+            dst_manifest.get(name),
+            known.get(name),
+            checksum,
+        )
+        if changed:
+            methods[copy_file(src_dir / name, dst_dir / name)] += 1
+            copied += entry[0]
+            if checksum and digest is None:
+                digest = file_digest(src_dir / name).hex()
+        record[name] = (*entry, digest)
+    if record != known:
+        save_record(dst, record)
+    return copied, methods
+
+
+def load_cursor(state_path: Path, source: Path) -> float | None:
+    """Returns when the previous run from `source` started (time.time()), None if unknown."""
+    try:
+        with state_path.open("r", encoding="utf-8") as f:
+            state: dict = json.load(f)
+        if state.get("source") == str(source):
+            return float(state["cursor"])
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        print(f"Failed to load the sync cursor, checking everything: {e}")
+    return None
+
+
+def save_cursor(state_path: Path, source: Path, cursor: float) -> None:
+    # Written aside then renamed: a crash never leaves a truncated file.
+    tmp_path: Path = state_path.with_name(f".{state_path.name}.tmp")
+    with tmp_path.open("w", encoding="utf-8") as f:
+        json.dump({"source": str(source), "cursor": cursor}, f)
+    tmp_path.replace(state_path)
+
+
+def modified_ns(path: Path, meta_filename: str = "meta.json") -> int:
+    """
+    Returns when a doujinshi was last modified: its archive if packed; its directory (pages added,
+    renamed into place or deleted) or its meta file (rewritten in place, e.g. by a repair) if not.
+    """
+    st: os.stat_result = path.stat()
+    if not stat.S_ISDIR(st.st_mode):
+        return st.st_mtime_ns
+    try:
+        return max(st.st_mtime_ns, (path / meta_filename).stat().st_mtime_ns)
+    except FileNotFoundError:
+        return st.st_mtime_ns
+
+
+def candidates(
+    source: Path, cursor: float | None, index_filepath: Path | None
+) -> list[Path]:
+    """
+    Returns the doujinshis of `source` to compare: the ones modified (see `modified_ns`) or,
+    with the library index, finished since `cursor`. All of them if None.
+    """
+    since: float = (cursor - _CURSOR_SLACK_S) if cursor is not None else float("-inf")
+    if index_filepath:
+        index = LibraryIndex(str(index_filepath))
+        try:
+            rows: list[tuple[int, bool]] = index.updated_since(since)
+        finally:
+            index.close()
+        return [
+            source / (f"{id}{PACKED_SUFFIX}" if packed else str(id))
+            for id, packed in rows
+        ]
+
+    since_ns: float = since * 1e9
+    paths: list[Path] = list()
+    for path in iter_galleries(source):
+        try:
+            if modified_ns(path) > since_ns:
+                paths.append(path)
+        except FileNotFoundError:
+            continue
+    return paths
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("source", type=Path, help="The doujinshi directory to copy")
+    arg_parser.add_argument("destination", type=Path, help="Where to copy it")
+    arg_parser.add_argument(
+        "--workers",
+        type=int,
+        default=min(32, (os.cpu_count() or 1) * 4),
+        help="Doujinshis copied at once",
+    )
+    arg_parser.add_argument(
+        "--checksum",
+        action="store_true",
+        help="Compare the files of the same size by content, not by modification time",
+    )
+    arg_parser.add_argument(
+        "--index",
+        type=Path,
+        metavar="FILE",
+        help="The library index of the source (see library_index.py): only the doujinshis it "
+        "saw finish since the last run are compared, without walking the source",
+    )
+    arg_parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Ignore the sync cursor: compare every doujinshi",
+    )
+    args = arg_parser.parse_args()
+
+    source: Path = args.source.absolute()
+    destination: Path = args.destination.absolute()
+    if not source.is_dir():
+        arg_parser.error(f"{source} is not a directory")
+    if source == destination:
+        arg_parser.error("The source and the destination are the same directory")
+    if args.index and not args.index.is_file():
+        arg_parser.error(f"{args.index} does not exist")
+    destination.mkdir(parents=True, exist_ok=True)
+
+    state_path: Path = destination / _STATE_FILENAME
+    cursor: float | None = None if args.full else load_cursor(state_path, source)
+    run_start: float = time.time()
+    start: float = time.perf_counter()
+    paths: list[Path] = candidates(source, cursor, args.index)
+
+    updated: int = 0
+    failed: int = 0
+    size: int = 0
+    methods: Counter[str] = Counter()
+
+    def collect(path: Path, future: Future[tuple[int, Counter]]) -> None:
+        nonlocal updated, failed, size
+        try:
+            copied, used = future.result()
+        except Exception as e:
+            failed += 1
+            print(f"-> '{path.name}' failed: {e}")
+            return
+        if used:
+            updated += 1
+            size += copied
+            methods.update(used)
+
+    # Copies are disk I/O and syscalls that release the GIL: threads overlap them.
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        pending: deque[tuple[Path, Future]] = deque()
+        for path in paths:
+            pending.append(
+                (
+                    path,
+                    executor.submit(
+                        replicate, path, destination / path.name, args.checksum
+                    ),
+                )
+            )
+            if len(pending) >= args.workers * 4:
+                collect(*pending.popleft())
+        for item in pending:
+            collect(*item)
+    elapsed: float = time.perf_counter() - start
+
+    if failed:
+        # Kept: the failed doujinshis are compared again by the next run.
+        print("Sync cursor not advanced: some doujinshis failed")
+    else:
+        save_cursor(state_path, source, run_start)
+
+    copies: str = ", ".join(f"{count} {method}" for method, count in methods.items())
+    print(
+        f"Compared {len(paths)} doujinshis "
+        f"({'all of them' if cursor is None else 'modified since the last run'}): "
+        f"{updated} updated, {len(paths) - updated - failed} unchanged, {failed} failed. "
+        f"Copied {sum(methods.values())} files ({size / 1024**2:,.1f} MiB{': ' + copies if copies else ''}) "
+        f"in {elapsed:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
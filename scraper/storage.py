@@ -0,0 +1,395 @@
+"""
+storage.py
+
+Where the downloaded doujinshis are kept: on the local disk (`LocalStorage`), or in an
+S3-compatible object store (`S3Storage`: AWS S3, MinIO, Garage, ...) so that the library
+can be hosted elsewhere than on the scraping box.
+
+Files are addressed by key, relative to the root of the storage: `{id}/meta.json`,
+`{id}/{page}.{ext}`, `{id}.cbz`. The pages are always downloaded to a local file first,
+then handed to the storage with `put_file()`.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import hmac
+import logging
+import os
+import xml.etree.ElementTree as ElementTree
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+from yarl import URL
+
+log: logging.Logger = logging.getLogger("scraper")
+
+
+class StorageError(OSError):
+    """A storage operation failed."""
+
+
+class Storage(ABC):
+    """
+    The interface of a storage. Failures raise `StorageError` (or `OSError` for the local disk).
+    """
+
+    @abstractmethod
+    async def list(self, prefix: str) -> dict[str, int]:
+        """
+        Lists the files whose key starts with `prefix`, e.g. "177013/", in one go.
+
+        :returns: {key relative to `prefix`: size in bytes}. Empty if there are none.
+        """
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Returns True if the file exists."""
+
+    @abstractmethod
+    async def read(self, key: str) -> bytes | None:
+        """Returns the content of a file, None if it does not exist."""
+
+    @abstractmethod
+    async def put_bytes(self, key: str, content: bytes) -> None:
+        """Writes a file, replacing it if it exists."""
+
+    @abstractmethod
+    async def put_file(self, key: str, local_path: Path) -> None:
+        """Moves a complete local file into the storage: `local_path` is gone afterwards."""
+
+    async def close(self) -> None:
+        pass
+
+
+class LocalStorage(Storage):
+    """
+    A directory of the local disk. Every filesystem call runs off the event loop: on a slow
+    or network disk, even a listing can block for long.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root: Path = Path(root)
+
+    def __str__(self) -> str:
+        return str(self.root)
+
+    def _list(self, prefix: str) -> dict[str, int]:
+        directory, _, name_prefix = prefix.rpartition("/")
+        files: dict[str, int] = dict()
+        try:
+            for entry in os.scandir(self.root / directory):
+                if entry.name.startswith(name_prefix) and entry.is_file():
+                    files[entry.name[len(name_prefix) :]] = entry.stat().st_size
+        except FileNotFoundError:
+            pass
+        return files
+
+    def _read(self, key: str) -> bytes | None:
+        try:
+            return (self.root / key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def _write(self, key: str, content: bytes) -> None:
+        path: Path = self.root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+    async def list(self, prefix: str) -> dict[str, int]:
+        return await asyncio.to_thread(self._list, prefix)
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread((self.root / key).exists)
+
+    async def read(self, key: str) -> bytes | None:
+        return await asyncio.to_thread(self._read, key)
+
+    async def put_bytes(self, key: str, content: bytes) -> None:
+        await asyncio.to_thread(self._write, key, content)
+
+    async def put_file(self, key: str, local_path: Path) -> None:
+        path: Path = self.root / key
+        if local_path != path:
+            await asyncio.to_thread(os.replace, local_path, path)
+
+
+class S3Storage(Storage):
+    """
+    A bucket of an S3-compatible object store, spoken to directly with aiohttp (path-style
+    URLs, Signature Version 4). Try it against the local stand-in `stub_s3.py`, or MinIO:
+        S3Storage("http://127.0.0.1:9000", "manga", access_key="...", secret_key="...")
+
+    Files are streamed from disk, never read whole: small ones in one PUT, large ones
+    (e.g. packed doujinshis) in a multipart upload of concurrent parts.
+    """
+
+    _NAMESPACE: str = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+    _UNSIGNED_PAYLOAD: str = "UNSIGNED-PAYLOAD"
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        bucket: str,
+        prefix: str = "",
+        access_key: str | None = None,
+        secret_key: str | None = None,
+        region: str = "us-east-1",
+        upload_workers: int = 16,
+        multipart_threshold: int = 16 * 1024**2,
+        part_size: int = 8 * 1024**2,
+        timeout: float = 60.0,
+        retries: int = 3,
+    ) -> None:
+        """
+        :param endpoint_url: The root URL of the object store, e.g. "https://s3.eu-west-3.amazonaws.com".
+        :param bucket: The bucket holding the library. It must exist.
+        :param prefix: A prefix of every key, e.g. "manga/", to share a bucket.
+        :param access_key: Defaults to the AWS_ACCESS_KEY_ID environment variable.
+        :param secret_key: Defaults to the AWS_SECRET_ACCESS_KEY environment variable.
+        :param region: The region requests are signed for. Most S3-compatible stores ignore it.
+        :param upload_workers: The maximum number of uploads (whole files or parts) at once.
+        :param multipart_threshold: Files this large or larger are uploaded in parts.
+        :param part_size: The size of each part. 5 MiB at least, except for the last one.
+        :param timeout: The timeout in seconds of each request.
+        :param retries: How many times a request failing with a network error or a 5xx is attempted.
+        """
+        self._endpoint: str = endpoint_url.rstrip("/")
+        self._host: str = urlsplit(self._endpoint).netloc
+        self._bucket: str = bucket
+        self._prefix: str = prefix
+        self._access_key: str = access_key or os.environ.get("AWS_ACCESS_KEY_ID", "")
+        self._secret_key: str = secret_key or os.environ.get(
+            "AWS_SECRET_ACCESS_KEY", ""
+        )
+        self._region: str = region
+        self._uploads: asyncio.Semaphore = asyncio.Semaphore(max(1, upload_workers))
+        self._multipart_threshold: int = multipart_threshold
+        self._part_size: int = max(5 * 1024**2, part_size)
+        self._timeout: aiohttp.ClientTimeout = aiohttp.ClientTimeout(total=timeout)
+        self._retries: int = max(1, retries)
+        self._session: aiohttp.ClientSession | None = None
+
+    def __str__(self) -> str:
+        return f"{self._endpoint}/{self._bucket}/{self._prefix}"
+
+    ###### Signature Version 4
+
+    def _sign(
+        self,
+        method: str,
+        path: str,
+        query: str,
+        payload_hash: str,
+        now: datetime.datetime,
+    ) -> dict[str, str]:
+        """Returns the headers authenticating a request."""
+        amz_date: str = now.strftime("%Y%m%dT%H%M%SZ")
+        scope: str = f"{amz_date[:8]}/{self._region}/s3/aws4_request"
+        headers: dict[str, str] = {
+            "host": self._host,
+            "x-amz-content-sha256": payload_hash,
+            "x-amz-date": amz_date,
+        }
+        signed_headers: str = ";".join(sorted(headers))
+        canonical_request: str = "\n".join(
+            (
+                method,
+                path,
+                query,
+                "".join(f"{name}:{headers[name]}\n" for name in sorted(headers)),
+                signed_headers,
+                payload_hash,
+            )
+        )
+        string_to_sign: str = "\n".join(
+            (
+                "AWS4-HMAC-SHA256",
+                amz_date,
+                scope,
+                hashlib.sha256(canonical_request.encode()).hexdigest(),
+            )
+        )
+
+        key: bytes = f"AWS4{self._secret_key}".encode()
+        for part in (amz_date[:8], self._region, "s3", "aws4_request"):
+            key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+        signature: str = hmac.new(
+            key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+
+        headers["authorization"] = (
+            f"AWS4-HMAC-SHA256 Credential={self._access_key}/{scope}, "
+            f"SignedHeaders={signed_headers}, Signature={signature}"
+        )
+        return headers
+
+    ###### Requests
+
+    async def _request(
+        self,
+        method: str,
+        key: str | None,
+        query: dict[str, str] | None = None,
+        body: bytes | Path | None = None,
+        expected: tuple[int, ...] = (200,),
+    ) -> tuple[int, bytes, Any]:
+        """
+        Sends a signed request about `key` (the bucket if None), retried on network errors and 5xx.
+        A `Path` body is streamed from disk.
+
+        :returns: A tuple of (HTTP status, body, headers).
+        :raises StorageError: If the status is not one of `expected` (after the retries).
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=self._timeout)
+
+        path: str = f"/{quote(self._bucket)}"
+        if key is not None:
+            path += f"/{quote(self._prefix + key, safe='/~')}"
+        canonical_query: str = "&".join(
+            f"{quote(name, safe='~')}={quote(value, safe='~')}"
+            for name, value in sorted((query or {}).items())
+        )
+        url = URL(
+            f"{self._endpoint}{path}" + (f"?{canonical_query}" if query else ""),
+            encoded=True,
+        )
+        if isinstance(body, bytes):
+            payload_hash: str = hashlib.sha256(body).hexdigest()
+        elif body is None:
+            payload_hash = hashlib.sha256(b"").hexdigest()
+        else:
+            payload_hash = self._UNSIGNED_PAYLOAD
+
+        error: str = ""
+        for attempt in range(self._retries):
+            if attempt:
+                await asyncio.sleep(2 ** (attempt - 1))
+            headers: dict[str, str] = self._sign(
+                method,
+                path,
+                canonical_query,
+                payload_hash,
+                datetime.datetime.now(datetime.timezone.utc),
+            )
+            data: Any = body
+            try:
+                if isinstance(body, Path):
+                    data = await asyncio.to_thread(body.open, "rb")
+                    headers["content-length"] = str(os.fstat(data.fileno()).st_size)
+                async with self._session.request(
+                    method, url, headers=headers, data=data
+                ) as res:
+                    content: bytes = await res.read()
+                    if res.status in expected:
+                        return res.status, content, res.headers
+                    error = f"HTTP {res.status}: {content[:200]!r}"
+                    if res.status < 500:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+            finally:
+                if isinstance(body, Path) and data is not body:
+                    data.close()
+
+        raise StorageError(f"{method} {url} failed: {error}")
+
+    async def list(self, prefix: str) -> dict[str, int]:
+        files: dict[str, int] = dict()
+        full_prefix: str = self._prefix + prefix
+        query: dict[str, str] = {"list-type": "2", "prefix": full_prefix}
+        while True:
+            _, content, _ = await self._request("GET", None, query)
+            root = ElementTree.fromstring(content)
+            for item in root.iter(f"{self._NAMESPACE}Contents"):
+                key: str = item.findtext(f"{self._NAMESPACE}Key", "")
+                files[key[len(full_prefix) :]] = int(
+                    item.findtext(f"{self._NAMESPACE}Size", "0")
+                )
+            token: str | None = root.findtext(f"{self._NAMESPACE}NextContinuationToken")
+            if root.findtext(f"{self._NAMESPACE}IsTruncated") != "true" or not token:
+                return files
+            query["continuation-token"] = token
+
+    async def exists(self, key: str) -> bool:
+        status, _, _ = await self._request("HEAD", key, expected=(200, 404))
+        return status == 200
+
+    async def read(self, key: str) -> bytes | None:
+        status, content, _ = await self._request("GET", key, expected=(200, 404))
+        return content if status == 200 else None
+
+    async def put_bytes(self, key: str, content: bytes) -> None:
+        async with self._uploads:
+            await self._request("PUT", key, body=content)
+
+    async def put_file(self, key: str, local_path: Path) -> None:
+        size: int = local_path.stat().st_size
+        if size < self._multipart_threshold:
+            async with self._uploads:
+                await self._request("PUT", key, body=local_path)
+        else:
+            await self._put_multipart(key, local_path, size)
+        local_path.unlink()
+
+    async def _put_multipart(self, key: str, local_path: Path, size: int) -> None:
+        """Uploads a large file in parts, at most `upload_workers` at once across all files."""
+        _, content, _ = await self._request("POST", key, {"uploads": ""})
+        upload_id: str = ElementTree.fromstring(content).findtext(
+            f"{self._NAMESPACE}UploadId", ""
+        )
+
+        def read_part(fd: int, offset: int) -> bytes:
+            return os.pread(fd, min(self._part_size, size - offset), offset)
+
+        async def put_part(fd: int, number: int, offset: int) -> str:
+            async with self._uploads:
+                data: bytes = await asyncio.to_thread(read_part, fd, offset)
+                _, _, headers = await self._request(
+                    "PUT",
+                    key,
+                    {"partNumber": str(number), "uploadId": upload_id},
+                    body=data,
+                )
+            return headers["ETag"]
+
+        fd: int = os.open(local_path, os.O_RDONLY)
+        try:
+            etags: list[str] = await asyncio.gather(
+                *(
+                    put_part(fd, number, offset)
+                    for number, offset in enumerate(
+                        range(0, size, self._part_size), start=1
+                    )
+                )
+            )
+            parts: str = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            await self._request(
+                "POST",
+                key,
+                {"uploadId": upload_id},
+                body=f"<CompleteMultipartUpload>{parts}</CompleteMultipartUpload>".encode(),
+            )
+        except BaseException:
+            # Otherwise the parts uploaded are kept (and billed) until aborted.
+            try:
+                await self._request(
+                    "DELETE", key, {"uploadId": upload_id}, expected=(204, 404)
+                )
+            except StorageError as e:
+                log.warning(f"Failed to abort the multipart upload of {key}: {e}")
+            raise
+        finally:
+            os.close(fd)
+
+    async def close(self) -> None:
+        if self._session:
+            await self._session.close()
+            self._session = None
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+
+"""
+stub_s3.py
+
+A local, in-memory stand-in for an S3-compatible object store, so that `storage.S3Storage`
+can be run and measured without a real bucket:
+    python3 stub_s3.py --port 9000
+
+    Scraper(..., storage=S3Storage("http://127.0.0.1:9000", "manga", access_key="x", secret_key="x"))
+
+Speaks the subset of the S3 API the scraper uses, path-style: PUT, GET, HEAD and DELETE of
+objects, multipart uploads, and ListObjectsV2. Any bucket exists. Signatures are required
+but not checked. The number of requests of every kind is kept in `app["requests"]`.
+"""
+
+import argparse
+import hashlib
+import uuid
+from collections import Counter
+from xml.sax.saxutils import escape
+
+from aiohttp import web
+
+_MAX_KEYS: int = 1000
+_XMLNS: str = 'xmlns="http://s3.amazonaws.com/doc/2006-03-01/"'
+
+
+def _xml(body: str) -> web.Response:
+    return web.Response(
+        text=f'<?xml version="1.0" encoding="UTF-8"?>\n{body}',
+        content_type="application/xml",
+    )
+
+
+def _etag(content: bytes) -> str:
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def make_app() -> web.Application:
+    app = web.Application(client_max_size=64 * 1024**2)
+    objects: dict[tuple[str, str], bytes] = dict()
+    # Upload ID: {part number: content}
+    uploads: dict[str, dict[int, bytes]] = dict()
+    requests: Counter[str] = Counter()
+    app["objects"] = objects
+    app["requests"] = requests
+
+    @web.middleware
+    async def authenticated(request: web.Request, handler):
+        if not request.headers.get("Authorization", "").startswith("AWS4-HMAC-SHA256"):
+            raise web.HTTPForbidden(text="Missing signature")
+        return await handler(request)
+
+    app.middlewares.append(authenticated)
+
+    async def list_objects(request: web.Request) -> web.Response:
+        requests["LIST"] += 1
+        bucket: str = request.match_info["bucket"]
+        prefix: str = request.query.get("prefix", "")
+        after: str = request.query.get("continuation-token", "")
+        keys: list[str] = sorted(
+            key
+            for b, key in objects
+            if b == bucket and key.startswith(prefix) and key > after
+        )
+        page, truncated = keys[:_MAX_KEYS], len(keys) > _MAX_KEYS
+        contents: str = "".join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{len(objects[bucket, key])}</Size></Contents>"
+            for key in page
+        )
+        token: str = (
+            f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>"
+            if truncated
+            else ""
+        )
+        return _xml(
+            f"<ListBucketResult {_XMLNS}><Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>"
+            f"<KeyCount>{len(page)}</KeyCount><IsTruncated>{str(truncated).lower()}</IsTruncated>"
+            f"{token}{contents}</ListBucketResult>"
+        )
+
+    async def put_object(request: web.Request) -> web.Response:
+        bucket, key = request.match_info["bucket"], request.match_info["key"]
+        content: bytes = await request.read()
+        if upload_id := request.query.get("uploadId"):
+            requests["PUT part"] += 1
+            if upload_id not in uploads:
+                raise web.HTTPNotFound()
+            uploads[upload_id][int(request.query["partNumber"])] = content
+        else:
+            requests["PUT"] += 1
+            objects[bucket, key] = content
+        return web.Response(headers={"ETag": _etag(content)})
+
+    async def get_object(request: web.Request) -> web.Response:
+        requests[request.method] += 1
+        content: bytes | None = objects.get(
+            (request.match_info["bucket"], request.match_info["key"])
+        )
+        if content is None:
+            raise web.HTTPNotFound()
+        return web.Response(body=content, headers={"ETag": _etag(content)})
+
+    async def post_object(request: web.Request) -> web.Response:
+        bucket, key = request.match_info["bucket"], request.match_info["key"]
+        if "uploads" in request.query:
+            requests["POST initiate"] += 1
+            upload_id: str = uuid.uuid4().hex
+            uploads[upload_id] = dict()
+            return _xml(
+                f"<InitiateMultipartUploadResult {_XMLNS}><Bucket>{escape(bucket)}</Bucket>"
+                f"<Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId></InitiateMultipartUploadResult>"
+            )
+
+        requests["POST complete"] += 1
+        parts: dict[int, bytes] | None = uploads.pop(request.query["uploadId"], None)
+        if parts is None:
+            raise web.HTTPNotFound()
+        content: bytes = b"".join(parts[number] for number in sorted(parts))
+        objects[bucket, key] = content
+        return _xml(
+            f"<CompleteMultipartUploadResult {_XMLNS}><Key>{escape(key)}</Key>"
+            f"<ETag>{escape(_etag(content))}</ETag></CompleteMultipartUploadResult>"
+        )
+
+    async def delete_object(request: web.Request) -> web.Response:
+        requests["DELETE"] += 1
+        if upload_id := request.query.get("uploadId"):
+            uploads.pop(upload_id, None)
+        else:
+            objects.pop((request.match_info["bucket"], request.match_info["key"]), None)
+        return web.Response(status=204)
+
+    app.router.add_get("/{bucket}", list_objects)
+    app.router.add_put("/{bucket}/{key:.+}", put_object)
+    # Also answers HEAD.
+    app.router.add_get("/{bucket}/{key:.+}", get_object)
+    app.router.add_post("/{bucket}/{key:.+}", post_object)
+    app.router.add_delete("/{bucket}/{key:.+}", delete_object)
+    return app
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=9000)
+    args = arg_parser.parse_args()
+
+    web.run_app(make_app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+
+"""
+stub_server.py
+
+A local stand-in for nhentai.net serving made-up doujinshis, so the scraper can be
+run and measured without touching the real site:
+    python3 stub_server.py --port 8080
+
+    Scraper(..., site_url="http://127.0.0.1:8080", image_server="http://127.0.0.1:8080")
+
+Serves the presentation pages (/g/{id}/), the reader pages (/g/{id}/1/), the JSON API
+(/api/gallery/{id}), the search page (/search/) and the images (/galleries/{media_id}/{page}.{ext}).
+Every ID divisible by 7 and every ID above --max-id does not exist (404).
+With --broken-api-every N, the API answers truncated JSON for every ID divisible by N,
+so that the scraper falls back to the presentation page.
+"""
+
+import argparse
+import json
+import random
+from datetime import datetime, timezone
+from typing import Any
+
+from aiohttp import web
+
+from parsers import IMAGE_TYPES
+
+# Valid enough image files: the right magic number, a body, the right end marker.
+_IMAGE_HEAD: dict[str, bytes] = {
+    "jpg": b"\xff\xd8\xff\xe0",
+    "png": b"\x89PNG\r\n\x1a\n",
+    "gif": b"GIF89a",
+    "webp": b"RIFF\x00\x00\x00\x00WEBPVP8 ",
+}
+_IMAGE_TAIL: dict[str, bytes] = {
+    "jpg": b"\xff\xd9",
+    "png": b"\x00\x00\x00\x00IEND\xaeB`\x82",
+    "gif": b"\x3b",
+    "webp": b"",
+}
+
+# The tag counts used, as the presentation page displays them.
+_TAG_COUNTS: dict[int, str] = {
+    7: "7",
+    950: "950",
+    1_100: "1.1K",
+    2_900: "2.9K",
+    12_345: "12K",
+    2_500_000: "2.5M",
+}
+
+_TAG_TYPES: list[tuple[str, str]] = [
+    ("parody", "Parodies"),
+    ("character", "Characters"),
+    ("tag", "Tags"),
+    ("artist", "Artists"),
+    ("group", "Groups"),
+    ("language", "Languages"),
+    ("category", "Categories"),
+]
+
+
+def media_id_of(id: int) -> str:
+    return str(100_000 + id)
+
+
+def make_gallery(id: int, max_id: int) -> dict[str, Any] | None:
+    """
+    Returns the API JSON of the doujinshi `id`, the same on every call. None if it does not exist.
+    """
+    if id < 1 or id > max_id or id % 7 == 0:
+        return None
+
+    rnd = random.Random(id)
+    num_pages: int = rnd.randint(2, 40)
+    tags: list[dict[str, Any]] = [
+        {
+            "id": rnd.randint(1, 100_000),
+            "type": tag_type,
+            "name": f"{tag_type} {rnd.randint(1, 50)}",
+            "url": f"/{tag_type}/x/",
+            "count": rnd.choice(list(_TAG_COUNTS)),
+        }
+        for tag_type, _ in _TAG_TYPES
+        for _ in range(rnd.randint(0, 3) if tag_type != "language" else 1)
+    ]
+    return {
+        "id": id,
+        "media_id": media_id_of(id),
+        "title": {"english": f"Doujinshi {id}", "japanese": "", "pretty": f"{id}"},
+        "images": {
+            "pages": [
+                {"t": rnd.choice("jjjjpw"), "w": 1280, "h": 1810}
+                for _ in range(num_pages)
+            ],
+            "cover": {"t": "j", "w": 350, "h": 500},
+            "thumbnail": {"t": "j", "w": 250, "h": 350},
+        },
+        "scanlator": "",
+        "upload_date": 1_400_000_000 + id * 600,
+        "tags": tags,
+        "num_pages": num_pages,
+        "num_favorites": rnd.randint(0, 1000),
+    }
+
+
+def render_presentation_page(gallery: dict[str, Any]) -> str:
+    containers: list[str] = list()
+    for tag_type, label in _TAG_TYPES:
+        links: str = "".join(
+            f'<a href="{t["url"]}" class="tag tag-{t["id"]} ">'
+            f'<span class="name">{t["name"]}</span><span class="count">{_TAG_COUNTS[t["count"]]}</span></a>'
+            for t in gallery["tags"]
+            if t["type"] == tag_type
+        )
+        hidden: str = "" if links else " hidden"
+        containers.append(
+            f'<div class="tag-container field-name{hidden}">{label}:'
+            f'<span class="tags">{links}</span></div>'
+        )
+
+    uploaded = datetime.fromtimestamp(gallery["upload_date"], timezone.utc)
+    # Every upload date is in 2014 or 2015: years away.
+    years: int = (datetime.now(timezone.utc) - uploaded).days // 365
+    containers.append(
+        '<div class="tag-container field-name">Pages:<span class="tags"><a class="tag">'
+        f'<span class="name">{gallery["num_pages"]}</span></a></span></div>'
+    )
+    containers.append(
+        '<div class="tag-container field-name">Uploaded:<span class="tags">'
+        f'<time class="nobold" datetime="{uploaded.isoformat()}">'
+        f"{years} years ago</time></span></div>"
+    )
+
+    gallery_js: str = json.dumps(json.dumps(gallery))
+    return (
+        '<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>{gallery["title"]["pretty"]}</title></head><body>'
+        f'<div id="info"><h1 class="title">{gallery["title"]["english"]}</h1>'
+        f'<section id="tags">{"".join(containers)}</section></div>'
+        f"<script>window._gallery = JSON.parse({gallery_js});</script>"
+        "</body></html>"
+    )
+
+
+def render_image(media_id: str, page: int, ext: str) -> bytes:
+    body: bytes = f"{media_id}/{page}".encode() * (2000 + page * 37)
+    return _IMAGE_HEAD[ext] + body + _IMAGE_TAIL[ext]
+
+
+def make_app(max_id: int = 10_000, broken_api_every: int = 0) -> web.Application:
+    app = web.Application()
+
+    def gallery_or_404(request: web.Request) -> dict[str, Any]:
+        gallery = make_gallery(int(request.match_info["id"]), max_id)
+        if not gallery:
+            raise web.HTTPNotFound()
+        return gallery
+
+    async def presentation(request: web.Request) -> web.Response:
+        return web.Response(
+            text=render_presentation_page(gallery_or_404(request)),
+            content_type="text/html",
+        )
+
+    async def reader(request: web.Request) -> web.Response:
+        gallery = gallery_or_404(request)
+        ext: str = IMAGE_TYPES[gallery["images"]["pages"][0]["t"]]
+        src: str = f"{request.url.origin()}/galleries/{gallery['media_id']}/1.{ext}"
+        return web.Response(
+            text=f'<section id="image-container"><a><img src="{src}"></a></section>',
+            content_type="text/html",
+        )
+
+    async def api(request: web.Request) -> web.Response:
+        gallery = gallery_or_404(request)
+        if broken_api_every and gallery["id"] % broken_api_every == 0:
+            return web.Response(
+                text=json.dumps(gallery)[:100], content_type="application/json"
+            )
+        return web.json_response(gallery)
+
+    async def search(request: web.Request) -> web.Response:
+        return web.Response(
+            text=(
+                '<div class="container index-container"><div class="gallery">'
+                f'<a href="/g/{max_id}/" class="cover">latest</a></div></div>'
+            ),
+            content_type="text/html",
+        )
+
+    async def image(request: web.Request) -> web.Response:
+        name, _, ext = request.match_info["filename"].partition(".")
+        id: int = int(request.match_info["media_id"]) - 100_000
+        gallery = make_gallery(id, max_id)
+        try:
+            page: int = int(name)
+            expected: str = IMAGE_TYPES[gallery["images"]["pages"][page - 1]["t"]]
+        except (TypeError, ValueError, IndexError):
+            raise web.HTTPNotFound()
+        if ext != expected:
+            raise web.HTTPNotFound()
+
+        return web.Response(
+            body=render_image(request.match_info["media_id"], page, ext),
+            content_type=f"image/{ext}",
+        )
+
+    app.router.add_get("/g/{id:\\d+}/", presentation)
+    app.router.add_get("/g/{id:\\d+}", presentation)
+    app.router.add_get("/g/{id:\\d+}/1/", reader)
+    app.router.add_get("/api/gallery/{id:\\d+}", api)
+    app.router.add_get("/search/", search)
+    app.router.add_get("/galleries/{media_id:\\d+}/{filename}", image)
+    return app
+
+
+def main() -> None:
+    arg_parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument(
+        "--max-id", type=int, default=10_000, help="The highest doujinshi ID"
+    )
+    arg_parser.add_argument(
+        "--broken-api-every",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Break the API answer of every ID divisible by N",
+    )
+    args = arg_parser.parse_args()
+
+    web.run_app(
+        make_app(args.max_id, args.broken_api_every), host=args.host, port=args.port
+    )
+
+
+if __name__ == "__main__":
+    main()
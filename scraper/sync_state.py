@@ -0,0 +1,115 @@
+"""
+sync_state.py
+
+What incremental runs (`Scraper.scrape_new()`) still have to scrape, persisted between runs:
+the highest ID ever reached, the ID ranges below it not scraped yet (newest first),
+and the IDs that were in flight when the last run stopped.
+
+A run that completes leaves no gap, so the next one only covers the IDs uploaded since.
+"""
+
+import json
+import logging
+from pathlib import Path
+from typing import Iterator
+
+log: logging.Logger = logging.getLogger("scraper")
+
+
+class SyncState:
+    def __init__(self, filepath: str, save_every: int = 100) -> None:
+        """
+        :param filepath: The JSON file the state persists in, created if needed.
+        :param save_every: Save to disk every this many IDs handed out, on top of `save()`.
+            Bounds what a killed run redoes.
+        """
+        self._filepath: Path = Path(filepath)
+        self._save_every: int = max(1, save_every)
+        self.ceiling: int = 0
+        # Inclusive (low, high) ranges, the newest first.
+        self._gaps: list[tuple[int, int]] = list()
+        self._in_flight: list[int] = list()
+        # The IDs handed out and not reported `done()` yet, saved as in flight.
+        self._unfinished: dict[int, None] = dict()
+        self._load()
+
+    def _load(self) -> None:
+        if not self._filepath.exists():
+            return
+        try:
+            with self._filepath.open("r", encoding="utf-8") as f:
+                state = json.load(f)
+            self.ceiling = int(state["ceiling"])
+            self._gaps = [(int(low), int(high)) for low, high in state["gaps"]]
+            self._in_flight = [int(id) for id in state["in_flight"]]
+        except Exception as e:
+            log.warning(f"Failed to load sync state from {self._filepath}: {e}")
+            self.ceiling = 0
+            self._gaps.clear()
+            self._in_flight.clear()
+
+    def save(self) -> None:
+        state = {
+            "ceiling": self.ceiling,
+            "gaps": self._gaps,
+            "in_flight": [*self._unfinished, *self._in_flight],
+        }
+        # Written aside then renamed: a crash never leaves a truncated file.
+        tmp_path: Path = self._filepath.with_name(f".{self._filepath.name}.tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as f:
+                json.dump(state, f)
+            tmp_path.replace(self._filepath)
+        except Exception as e:
+            log.warning(f"Failed to save sync state to {self._filepath}: {e}")
+
+    def extend(self, highest_id: int) -> int:
+        """
+        Adds the IDs uploaded since the last run, up to `highest_id`, as the newest gap.
+        Returns how many were added.
+        """
+        if highest_id <= self.ceiling:
+            return 0
+        self._gaps.insert(0, (self.ceiling + 1, highest_id))
+        added: int = highest_id - self.ceiling
+        self.ceiling = highest_id
+        return added
+
+    def __len__(self) -> int:
+        """The number of IDs left to scrape."""
+        return len(self._in_flight) + sum(high - low + 1 for low, high in self._gaps)
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        Yields the IDs left to scrape: first the ones in flight when the last run stopped,
+        then the gaps from the newest ID down. Saved progress counts the IDs handed out and not
+        reported `done()` yet as in flight.
+        """
+        self._unfinished.clear()
+        handed_out: int = 0
+
+        while self._in_flight or self._gaps:
+            if self._in_flight:
+                id: int = self._in_flight.pop(0)
+            else:
+                low, high = self._gaps[0]
+                id = high
+                if low < high:
+                    self._gaps[0] = (low, high - 1)
+                else:
+                    self._gaps.pop(0)
+
+            self._unfinished[id] = None
+            handed_out += 1
+            if handed_out % self._save_every == 0:
+                self.save()
+            yield id
+
+    def done(self, id: int) -> None:
+        """Records that `id`, handed out, is finished."""
+        self._unfinished.pop(id, None)
+
+    def finish(self) -> None:
+        """Records that every ID handed out is finished, and saves."""
+        self._unfinished.clear()
+        self.save()
@@ -0,0 +1,626 @@
+"""
+tag_index.py
+
+Inverted index of the downloaded library: from each tag (and artist, parody, language, ...)
+to the sorted IDs of the doujinshis having it, and a query engine over it:
+
+    index = TagIndex("../manga/tags.idx")
+    index.update_from_library("../manga/library.sqlite3")
+    index.query('tag:"full color" AND language:english AND NOT tag:yaoi AND pages:20..60')
+    index.query("(artist:a OR artist:b) uploaded:2020-01..2021")
+
+Terms are `field:value`, quoted if the value has spaces; `field` is one of the lists of
+meta.json (tags, artists, parodies, ...), singular or plural. Ranges are inclusive and may
+be open: `pages:20..`, `uploaded:..2019-06-30` (dates as YYYY, YYYY-MM or YYYY-MM-DD).
+Adjacent terms are ANDed. NOT binds tighter than AND, which binds tighter than OR.
+
+Posting lists are sorted `array`s of IDs (4 bytes per posting), saved delta-encoded and
+compressed. Queries turn the lists they touch into bitmaps (Python ints) and combine them
+with bitwise operations, so a query costs the size of its posting lists, not of the library.
+"""
+
+import json
+import logging
+import re
+import sqlite3
+import struct
+import zlib
+from abc import ABC, abstractmethod
+from array import array
+from bisect import bisect_left
+from collections import deque
+from datetime import date, datetime
+from itertools import compress, repeat
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+log: logging.Logger = logging.getLogger("scraper")
+
+# The lists of meta.json that are indexed.
+TAG_FIELDS: tuple[str, ...] = (
+    "parodies",
+    "characters",
+    "tags",
+    "artists",
+    "groups",
+    "languages",
+    "categories",
+)
+_FIELD_ALIASES: dict[str, str] = {
+    "parody": "parodies",
+    "character": "characters",
+    "tag": "tags",
+    "artist": "artists",
+    "group": "groups",
+    "language": "languages",
+    "category": "categories",
+}
+_RANGE_FIELDS: tuple[str, ...] = ("pages", "uploaded")
+
+# Per-ID flags (0 or 1 bytes) to binary digits, and back: big bitmaps are converted in C.
+_FLAGS_TO_DIGITS: bytes = bytes.maketrans(b"\x00\x01", b"01")
+_DIGITS_TO_FLAGS: bytes = bytes.maketrans(b"01", b"\x00\x01")
+_ONE_DIGIT: re.Pattern[bytes] = re.compile(b"1")
+
+
+def _flags_to_bitmap(flags: bytes | bytearray) -> int:
+    """Returns the bitmap of the IDs whose flag byte is 1."""
+    return int(flags.translate(_FLAGS_TO_DIGITS)[::-1] or b"0", 2)
+
+
+def _to_bitmap(ids: Iterable[int]) -> int:
+    """Returns the bitmap of `ids`, sorted if a posting list."""
+    if isinstance(ids, array) and ids and len(ids) * 8 > ids[-1]:
+        # Dense: the flags are set without a Python loop.
+        flags = bytearray(ids[-1] + 1)
+        deque(map(flags.__setitem__, ids, repeat(1)), maxlen=0)
+        return _flags_to_bitmap(flags)
+
+    bits = bytearray()
+    for id in ids:
+        byte: int = id >> 3
+        if byte >= len(bits):
+            bits.extend(bytes(byte - len(bits) + 1024))
+        bits[byte] |= 1 << (id & 7)
+    return int.from_bytes(bits, "little")
+
+
+def _ids_of(bitmap: int) -> list[int]:
+    """Returns the sorted IDs set in `bitmap`."""
+    # The binary digits, lowest ID first.
+    digits: bytes = format(bitmap, "b").encode()[::-1]
+    if bitmap.bit_count() * 8 > len(digits):
+        # Dense: one flag per ID, selected in C.
+        flags: bytes = digits.translate(_DIGITS_TO_FLAGS)
+        return list(compress(range(len(flags)), flags))
+    return [match.start() for match in _ONE_DIGIT.finditer(digits)]
+
+
+def _day_of(meta: dict[str, Any]) -> int:
+    """Returns the upload date of a doujinshi as a day number, 0 if unknown."""
+    try:
+        return datetime.fromisoformat(meta["datetime_iso8601"]).date().toordinal()
+    except (KeyError, TypeError, ValueError):
+        return 0
+
+
+def _parse_day(text: str, end: bool) -> int:
+    """Parses YYYY, YYYY-MM or YYYY-MM-DD into a day number: the first day, or the last if `end`."""
+    parts: list[int] = [int(part) for part in text.split("-")]
+    if len(parts) == 3:
+        return date(*parts).toordinal()
+    year: int = parts[0]
+    if len(parts) == 2:
+        month: int = parts[1]
+        if not end:
+            return date(year, month, 1).toordinal()
+        next_month: date = date(year + month // 12, month % 12 + 1, 1)
+        return next_month.toordinal() - 1
+    return date(year, 12, 31).toordinal() if end else date(year, 1, 1).toordinal()
+
+
+def _month_of(day: int) -> str:
+    return date.fromordinal(day).strftime("%Y-%m")
+
+
+def terms_of(meta: dict[str, Any]) -> set[str]:
+    """Returns the index terms of a doujinshi, from its meta.json content."""
+    terms: set[str] = set()
+    for field in TAG_FIELDS:
+        for tag in meta.get(field) or ():
+            terms.add(f"{field}:{str(tag['name']).lower()}")
+    return terms
+
+
+class Query(ABC):
+    """A node of a parsed query. Evaluates against the index, or against one meta.json."""
+
+    @abstractmethod
+    def evaluate(self, index: "TagIndex") -> int:
+        """Returns the bitmap of the matching IDs."""
+
+    @abstractmethod
+    def matches(self, meta: dict[str, Any]) -> bool:
+        """Returns True if the doujinshi of `meta` matches."""
+
+
+class Term(Query):
+    def __init__(self, field: str, value: str) -> None:
+        self.key: str = f"{field}:{value.lower()}"
+
+    def evaluate(self, index: "TagIndex") -> int:
+        return index._bitmap(self.key)
+
+    def matches(self, meta: dict[str, Any]) -> bool:
+        return self.key in terms_of(meta)
+
+
+class Range(Query):
+    def __init__(self, field: str, low: int | None, high: int | None) -> None:
+        self.field: str = field
+        self.low: int = low if low is not None else 0
+        self.high: int = high if high is not None else 2**31
+
+    def evaluate(self, index: "TagIndex") -> int:
+        if self.field == "pages":
+            return index._pages_range(self.low, self.high)
+        return index._days_range(self.low, self.high)
+
+    def matches(self, meta: dict[str, Any]) -> bool:
+        if self.field == "pages":
+            value: int = int(meta.get("pages") or 0)
+        else:
+            value = _day_of(meta)
+        # Unknown page counts and dates are not indexed under any value: never in range.
+        return bool(value) and self.low <= value <= self.high
+
+
+class Not(Query):
+    def __init__(self, operand: Query) -> None:
+        self.operand: Query = operand
+
+    def evaluate(self, index: "TagIndex") -> int:
+        return index._universe() & ~self.operand.evaluate(index)
+
+    def matches(self, meta: dict[str, Any]) -> bool:
+        return not self.operand.matches(meta)
+
+
+class And(Query):
+    def __init__(self, operands: list[Query]) -> None:
+        self.operands: list[Query] = operands
+
+    def evaluate(self, index: "TagIndex") -> int:
+        result: int = self.operands[0].evaluate(index)
+        for operand in self.operands[1:]:
+            if not result:
+                break
+            result &= operand.evaluate(index)
+        return result
+
+    def matches(self, meta: dict[str, Any]) -> bool:
+        return all(operand.matches(meta) for operand in self.operands)
+
+
+class Or(Query):
+    def __init__(self, operands: list[Query]) -> None:
+        self.operands: list[Query] = operands
+
+    def evaluate(self, index: "TagIndex") -> int:
+        result: int = 0
+        for operand in self.operands:
+            result |= operand.evaluate(index)
+        return result
+
+    def matches(self, meta: dict[str, Any]) -> bool:
+        return any(operand.matches(meta) for operand in self.operands)
+
+
+_TOKEN: re.Pattern[str] = re.compile(
+    r'\s*(?:(?P<paren>[()])|(?P<field>[a-z_]+):(?:"(?P<quoted>[^"]*)"|(?P<bare>[^\s()]+))|(?P<word>[^\s()]+))',
+    re.IGNORECASE,
+)
+
+
+def parse_query(text: str) -> Query:
+    """
+    Parses a query (see the module docstring).
+
+    :raises ValueError: If the query is malformed.
+    """
+    tokens: list[tuple[str, Any]] = list()
+    position: int = 0
+    text = text.strip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if not match:
+            raise ValueError(f"Cannot parse the query at: {text[position:]!r}")
+        position = match.end()
+        if match["paren"]:
+            tokens.append((match["paren"], None))
+        elif match["field"]:
+            value: str = (
+                match["quoted"] if match["quoted"] is not None else match["bare"]
+            )
+            tokens.append(("term", _make_term(match["field"].lower(), value)))
+        elif match["word"].upper() in ("AND", "OR", "NOT"):
+            tokens.append((match["word"].upper(), None))
+        else:
+            raise ValueError(f"Expected field:value, got {match['word']!r}")
+
+    position = 0
+
+    def peek() -> str | None:
+        return tokens[position][0] if position < len(tokens) else None
+
+    def take() -> tuple[str, Any]:
+        nonlocal position
+        position += 1
+        return tokens[position - 1]
+
+    def parse_or() -> Query:
+        operands: list[Query] = [parse_and()]
+        while peek() == "OR":
+            take()
+            operands.append(parse_and())
+        return operands[0] if len(operands) == 1 else Or(operands)
+
+    def parse_and() -> Query:
+        operands: list[Query] = [parse_not()]
+        while peek() in ("AND", "NOT", "term", "("):
+            if peek() == "AND":
+                take()
+            operands.append(parse_not())
+        return operands[0] if len(operands) == 1 else And(operands)
+
+    def parse_not() -> Query:
+        if peek() == "NOT":
+            take()
+            return Not(parse_not())
+        kind, value = take() if peek() else (None, None)
+        if kind == "term":
+            return value
+        if kind == "(":
+            query: Query = parse_or()
+            if peek() != ")":
+                raise ValueError("Missing closing parenthesis")
+            take()
+            return query
+        raise ValueError(f"Expected a term, got {kind or 'the end of the query'}")
+
+    query: Query = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Unexpected {peek()} in the query")
+    return query
+
+
+def _make_term(field: str, value: str) -> Query:
+    field = _FIELD_ALIASES.get(field, field)
+    if field in _RANGE_FIELDS:
+        low_text, dots, high_text = value.partition("..")
+        if not dots:
+            high_text = low_text
+        if field == "pages":
+            low = int(low_text) if low_text else None
+            high = int(high_text) if high_text else None
+        else:
+            low = _parse_day(low_text, end=False) if low_text else None
+            high = _parse_day(high_text, end=True) if high_text else None
+        return Range(field, low, high)
+    if field not in TAG_FIELDS:
+        raise ValueError(f"Unknown field {field!r}")
+    return Term(field, value)
+
+
+class TagIndex:
+    _MAGIC: bytes = b"NHTI3"
+    # Length of the key, number of IDs
+    _POSTING_HEADER: struct.Struct = struct.Struct("<HI")
+
+    def __init__(self, filepath: str | None = None, cache_size: int = 256) -> None:
+        """
+        :param filepath: The file the index persists in. None to keep it in memory only.
+        :param cache_size: How many posting lists to keep as bitmaps between queries.
+        """
+        self._filepath: Path | None = Path(filepath) if filepath else None
+        self._cache_size: int = cache_size
+        self._postings: dict[str, array] = dict()
+        # Per ID, 1 if indexed.
+        self._indexed: bytearray = bytearray()
+        # Per ID, 0 if unknown.
+        self._pages: array = array("I")
+        self._days: array = array("I")
+        self._count: int = 0
+        # Seconds since the epoch: the library index rows updated after it are not indexed yet.
+        self.synced_at: float = 0.0
+        # The generation of the library index synced from: once rebuilt, it is read again whole.
+        self.library_generation: int = 0
+        self._bitmaps: dict[str, int] = dict()
+        # The bitmap of every ID indexed, kept up to date once built.
+        self._all: int | None = None
+        # The range keys (pages:N, uploaded:YYYY-MM) by prefix, None when outdated.
+        self._range_keys: dict[str, list[str]] | None = None
+        self._load()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, id: int) -> bool:
+        return 0 <= id < len(self._indexed) and self._indexed[id] == 1
+
+    def _load(self) -> None:
+        if not self._filepath or not self._filepath.exists():
+            return
+        try:
+            data: bytes = zlib.decompress(self._filepath.read_bytes())
+            if not data.startswith(self._MAGIC):
+                raise ValueError("not a tag index file")
+            offset: int = len(self._MAGIC)
+            self.synced_at, self.library_generation = struct.unpack_from(
+                "<dI", data, offset
+            )
+            offset += 12
+            (size,) = struct.unpack_from("<I", data, offset)
+            offset += 4
+            self._indexed = bytearray(data[offset : offset + size])
+            offset += size
+            for numbers in (self._pages, self._days):
+                (size,) = struct.unpack_from("<I", data, offset)
+                offset += 4
+                numbers.frombytes(data[offset : offset + size * 4])
+                offset += size * 4
+            while offset < len(data):
+                key_len, count = self._POSTING_HEADER.unpack_from(data, offset)
+                offset += self._POSTING_HEADER.size
+                key: str = data[offset : offset + key_len].decode()
+                offset += key_len
+                deltas = array("I", data[offset : offset + count * 4])
+                offset += count * 4
+                # Delta-decoded in place.
+                for i in range(1, count):
+                    deltas[i] += deltas[i - 1]
+                self._postings[key] = deltas
+        except Exception as e:
+            log.warning(f"Failed to load the tag index {self._filepath}: {e}")
+            self._postings.clear()
+            self._indexed = bytearray()
+            self._pages = array("I")
+            self._days = array("I")
+            self.synced_at = 0.0
+            self.library_generation = 0
+        self._count = self._indexed.count(1)
+
+    def save(self) -> None:
+        if not self._filepath:
+            return
+        chunks: list[bytes] = [
+            self._MAGIC,
+            struct.pack("<dI", self.synced_at, self.library_generation),
+            struct.pack("<I", len(self._indexed)),
+            bytes(self._indexed),
+        ]
+        for numbers in (self._pages, self._days):
+            chunks.append(struct.pack("<I", len(numbers)))
+            chunks.append(numbers.tobytes())
+        for key, ids in self._postings.items():
+            # Small deltas compress far better than the IDs themselves.
+            deltas = array("I", ids)
+            for i in range(len(deltas) - 1, 0, -1):
+                deltas[i] -= deltas[i - 1]
+            encoded_key: bytes = key.encode()
+            chunks.append(self._POSTING_HEADER.pack(len(encoded_key), len(ids)))
+            chunks.append(encoded_key)
+            chunks.append(deltas.tobytes())
+
+        # Written aside then renamed: a crash never leaves a truncated file.
+        tmp_path: Path = self._filepath.with_name(f".{self._filepath.name}.tmp")
+        try:
+            tmp_path.write_bytes(zlib.compress(b"".join(chunks), 6))
+            tmp_path.replace(self._filepath)
+        except Exception as e:
+            log.warning(f"Failed to save the tag index to {self._filepath}: {e}")
+
+    def _insert(self, key: str, id: int) -> None:
+        ids: array | None = self._postings.get(key)
+        if ids is None:
+            ids = self._postings[key] = array("I")
+            self._range_keys = None
+        # Usually appended: new doujinshis have the highest IDs.
+        if not ids or ids[-1] < id:
+            ids.append(id)
+        else:
+            position: int = bisect_left(ids, id)
+            if position == len(ids) or ids[position] != id:
+                ids.insert(position, id)
+        self._bitmaps.pop(key, None)
+
+    def _discard(self, key: str, id: int) -> None:
+        ids: array | None = self._postings.get(key)
+        if ids is None:
+            return
+        position: int = bisect_left(ids, id)
+        if position < len(ids) and ids[position] == id:
+            del ids[position]
+            self._bitmaps.pop(key, None)
+            if not ids:
+                del self._postings[key]
+                self._range_keys = None
+
+    def _set_number(self, numbers: array | bytearray, id: int, value: int) -> None:
+        if id >= len(numbers):
+            numbers.extend(bytes(id - len(numbers) + 1024))
+        numbers[id] = value
+
+    def add(self, id: int, meta: dict[str, Any]) -> None:
+        """Indexes a doujinshi from its meta.json content, replacing what was indexed for it."""
+        if id in self:
+            self.remove(id)
+        pages: int = int(meta.get("pages") or 0)
+        day: int = _day_of(meta)
+        for key in terms_of(meta):
+            self._insert(key, id)
+        if pages:
+            self._insert(f"pages:{pages}", id)
+        if day:
+            self._insert(f"uploaded:{_month_of(day)}", id)
+        self._set_number(self._indexed, id, 1)
+        self._set_number(self._pages, id, pages)
+        self._set_number(self._days, id, day)
+        self._count += 1
+        if self._all is not None:
+            self._all |= 1 << id
+
+    def remove(self, id: int) -> None:
+        """Removes a doujinshi from the index. Scans every posting list: meant to be rare."""
+        if id not in self:
+            return
+        for key in list(self._postings):
+            self._discard(key, id)
+        self._forget(id)
+
+    def remove_all(self, ids: Iterable[int]) -> int:
+        """
+        Removes doujinshis from the index, scanning every posting list once for all of them.
+
+        :returns: The number of doujinshis removed.
+        """
+        removed: set[int] = {id for id in ids if id in self}
+        if not removed:
+            return 0
+        for key, postings in list(self._postings.items()):
+            kept = array("I", (id for id in postings if id not in removed))
+            if len(kept) == len(postings):
+                continue
+            self._bitmaps.pop(key, None)
+            if kept:
+                self._postings[key] = kept
+            else:
+                del self._postings[key]
+                self._range_keys = None
+        for id in removed:
+            self._forget(id)
+        return len(removed)
+
+    def _indexed_ids(self) -> Iterator[int]:
+        return (id for id, indexed in enumerate(self._indexed) if indexed)
+
+    def _forget(self, id: int) -> None:
+        self._indexed[id] = 0
+        self._pages[id] = 0
+        self._days[id] = 0
+        self._count -= 1
+        if self._all is not None:
+            self._all &= ~(1 << id)
+
+    def update_from_library(self, library_filepath: str) -> int:
+        """
+        Indexes the doujinshis of the library index (see `library_index`) added or updated
+        since the last update, all of them if it was rebuilt since, and removes the ones
+        no longer in it. Saves the index if anything changed.
+
+        :returns: The number of doujinshis indexed or removed.
+        """
+        db = sqlite3.connect(f"file:{library_filepath}?mode=ro", uri=True)
+        try:
+            # One snapshot: a rebuild swapped in meanwhile is seen whole or not at all.
+            db.execute("BEGIN")
+            (generation,) = db.execute("PRAGMA user_version").fetchone()
+            # The rows of a rebuild are stamped older than the ones synced already.
+            synced_at: float = (
+                self.synced_at if generation == self.library_generation else 0.0
+            )
+            rows = db.execute(
+                "SELECT id, meta, updated_at FROM galleries WHERE updated_at > ? ORDER BY id",
+                (synced_at,),
+            )
+            count: int = 0
+            for id, meta, updated_at in rows:
+                self.add(id, json.loads(meta))
+                synced_at = max(synced_at, updated_at)
+                count += 1
+            # Only the IDs, from the primary key: cheap next to reading the metadata.
+            in_library: set[int] = {
+                id for (id,) in db.execute("SELECT id FROM galleries")
+            }
+        finally:
+            db.close()
+
+        count += self.remove_all(
+            id for id in self._indexed_ids() if id not in in_library
+        )
+        if count or generation != self.library_generation:
+            self.synced_at = synced_at
+            self.library_generation = generation
+            self.save()
+        return count
+
+    def _universe(self) -> int:
+        if self._all is None:
+            self._all = _flags_to_bitmap(self._indexed)
+        return self._all
+
+    def _bitmap(self, key: str) -> int:
+        bitmap: int | None = self._bitmaps.get(key)
+        if bitmap is None:
+            bitmap = _to_bitmap(self._postings.get(key, ()))
+            if len(self._bitmaps) >= self._cache_size:
+                self._bitmaps.pop(next(iter(self._bitmaps)))
+            self._bitmaps[key] = bitmap
+        return bitmap
+
+    def _keys(self, field: str) -> list[str]:
+        if self._range_keys is None:
+            self._range_keys = {range_field: list() for range_field in _RANGE_FIELDS}
+            for key in self._postings:
+                field_of_key: str = key.partition(":")[0]
+                if field_of_key in self._range_keys:
+                    self._range_keys[field_of_key].append(key)
+        return self._range_keys[field]
+
+    def _pages_range(self, low: int, high: int) -> int:
+        result: int = 0
+        for key in self._keys("pages"):
+            if low <= int(key[6:]) <= high:
+                result |= self._bitmap(key)
+        return result
+
+    def _days_range(self, low: int, high: int) -> int:
+        result: int = 0
+        for key in self._keys("uploaded"):
+            ids: array = self._postings[key]
+            year, month = map(int, key[9:].split("-"))
+            first: int = date(year, month, 1).toordinal()
+            last: int = _parse_day(key[9:], end=True)
+            if last < low or first > high:
+                continue
+            if low <= first and last <= high:
+                result |= self._bitmap(key)
+            else:
+                # A month partially in the range: its IDs are checked one by one.
+                result |= _to_bitmap(id for id in ids if low <= self._days[id] <= high)
+        return result
+
+    def query(self, text: str | Query) -> list[int]:
+        """
+        Returns the sorted IDs of the doujinshis matching the query.
+
+        :raises ValueError: If the query is malformed.
+        """
+        query: Query = parse_query(text) if isinstance(text, str) else text
+        return _ids_of(query.evaluate(self))
+
+    def count(self, text: str | Query) -> int:
+        """Returns how many doujinshis match the query."""
+        query: Query = parse_query(text) if isinstance(text, str) else text
+        return query.evaluate(self).bit_count()
+
+    def top_terms(self, field: str, n: int = 10) -> list[tuple[str, int]]:
+        """Returns the `n` most frequent values of `field`, with their counts."""
+        field = _FIELD_ALIASES.get(field, field)
+        prefix: str = f"{field}:"
+        counts: Iterator[tuple[str, int]] = (
+            (key[len(prefix) :], len(ids))
+            for key, ids in self._postings.items()
+            if key.startswith(prefix)
+        )
+        return sorted(counts, key=lambda item: item[1], reverse=True)[:n]
@@ -0,0 +1,85 @@
+import asyncio
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import pytest
+from aiohttp import web
+
+# The scraper modules are run as scripts, from their own directory.
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import stub_server  # noqa: E402
+from nhentai_scraper import Scraper  # noqa: E402
+
+FIXTURES_DIR: Path = Path(__file__).resolve().parent / "fixtures"
+
+
+@pytest.fixture
+def stub_site() -> Iterator[Callable[[web.Application | None], str]]:
+    """
+    Starts stub servers (see stub_server.py) on ephemeral ports, each on an event loop
+    of its own thread: the code under test can run its own loops, e.g. with asyncio.run().
+
+    :returns: A function starting the given app (a default stub if None) and returning its URL.
+    """
+    servers: list[tuple[asyncio.AbstractEventLoop, web.AppRunner, threading.Thread]] = (
+        list()
+    )
+
+    def start(app: web.Application | None = None) -> str:
+        loop = asyncio.new_event_loop()
+        runner = web.AppRunner(app or stub_server.make_app(max_id=100))
+        loop.run_until_complete(runner.setup())
+        loop.run_until_complete(web.TCPSite(runner, "127.0.0.1", 0).start())
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        servers.append((loop, runner, thread))
+        return f"http://127.0.0.1:{runner.addresses[0][1]}"
+
+    yield start
+
+    for loop, runner, thread in servers:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.run_until_complete(runner.cleanup())
+        loop.close()
+
+
+@pytest.fixture
+def stub_url(stub_site: Callable[..., str]) -> str:
+    """The URL of a default stub server."""
+    return stub_site()
+
+
+def _stub_settings(url: str) -> dict[str, Any]:
+    return {
+        "site_url": url,
+        "image_server": url,
+        "max_reqs_per_second": None,
+        "adaptive": False,
+    }
+
+
+@pytest.fixture
+def stub_settings() -> Callable[[str], dict[str, Any]]:
+    """:returns: A function giving the Scraper settings to scrape the stub server at `url`, unthrottled."""
+    return _stub_settings
+
+
+@pytest.fixture
+def make_scraper() -> Callable[..., Scraper]:
+    """
+    :returns: A function creating a Scraper that saves to `save_dir` and scrapes the stub
+        server at `url`, parsing inline. Other settings are passed through.
+    """
+
+    def make(save_dir: Path, url: str, **settings: Any) -> Scraper:
+        return Scraper(
+            str(save_dir),
+            parse_in_pool=False,
+            **{**_stub_settings(url), **settings},
+        )
+
+    return make
@@ -0,0 +1,46 @@
+"""The adaptive limits never exceed the configured request rate, and back off from server errors."""
+
+import asyncio
+from pathlib import Path
+from typing import Callable
+
+from aiohttp import web
+
+import stub_server
+from nhentai_scraper import Scraper
+
+
+def test_rate_stays_within_the_configured_one(
+    tmp_path: Path, stub_url: str, make_scraper: Callable[..., Scraper]
+):
+    async def fetch() -> float:
+        async with make_scraper(
+            tmp_path, stub_url, adaptive=True, max_reqs_per_second=1000
+        ) as scraper:
+            for _ in range(200):
+                assert await scraper._fetch(f"{stub_url}/g/1/")
+            return scraper._rate_scale.value
+
+    assert asyncio.run(fetch()) == 1.0
+
+
+def test_server_errors_are_congestion(
+    tmp_path: Path, stub_site: Callable[..., str], make_scraper: Callable[..., Scraper]
+):
+    @web.middleware
+    async def overloaded(request: web.Request, handler):
+        raise web.HTTPServiceUnavailable()
+
+    app = stub_server.make_app(max_id=100)
+    app.middlewares.append(overloaded)
+    url: str = stub_site(app)
+
+    async def fetch() -> float:
+        async with make_scraper(
+            tmp_path, url, adaptive=True, max_reqs_per_second=1000
+        ) as scraper:
+            result = await scraper._fetch(f"{url}/g/1/")
+            assert result and result[1] == 503
+            return scraper._rate_scale.value
+
+    assert asyncio.run(fetch()) < 1.0
@@ -0,0 +1,71 @@
+"""The verification reuses the scans, and skips the doujinshis unchanged since verified."""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+
+import stub_server
+from cleanup import Cleanup
+from image_check import CheckDepth
+
+
+def _make_doujinshi(save_dir: Path, id: int, pages: int) -> Path:
+    doujin_dir: Path = save_dir / str(id)
+    doujin_dir.mkdir(parents=True)
+    (doujin_dir / "meta.json").write_text(json.dumps({"pages": pages}))
+    for page in range(1, pages + 1):
+        (doujin_dir / f"{page}.jpg").write_bytes(
+            stub_server.render_image(str(id), page, "jpg")
+        )
+    return doujin_dir
+
+
+def _verify(save_dir: Path, monkeypatch: pytest.MonkeyPatch) -> tuple[list, int]:
+    """:returns: The broken pages found, and the number of directories listed."""
+    listed: list[Path] = list()
+    scan_dir = Cleanup._scan_dir
+
+    def counting_scan_dir(self, doujin_dir: Path, dir_mtime_ns: int):
+        listed.append(doujin_dir)
+        return scan_dir(self, doujin_dir, dir_mtime_ns)
+
+    monkeypatch.setattr(Cleanup, "_scan_dir", counting_scan_dir)
+    clean = Cleanup(str(save_dir), workers=2, verify=CheckDepth.MARKERS)
+    to_delete, complete_dirs = clean._scan_all()
+    assert not to_delete
+    return sorted(clean._verify_pages(complete_dirs)), len(listed)
+
+
+def test_verify_reuses_scans_and_skips_unchanged(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture
+):
+    first: Path = _make_doujinshi(tmp_path, 1, 3)
+    second: Path = _make_doujinshi(tmp_path, 2, 4)
+    # Truncated: the end marker is missing.
+    (second / "2.jpg").write_bytes((second / "2.jpg").read_bytes()[:-10])
+
+    broken, listed = _verify(tmp_path, monkeypatch)
+    assert [path for path, _ in broken] == [second / "2.jpg"]
+    # One listing per doujinshi, shared by the scan and the verification.
+    assert listed == 2
+    assert "Verified 7 pages" in capsys.readouterr().out
+
+    # Nothing changed: nothing listed nor checked, the findings are remembered.
+    broken, listed = _verify(tmp_path, monkeypatch)
+    assert [path for path, _ in broken] == [second / "2.jpg"]
+    assert listed == 0
+    output: str = capsys.readouterr().out
+    assert "Verified 0 pages" in output
+    assert "2 doujinshis unchanged since checked" in output
+
+    # A page renamed into place: only that page is checked again.
+    page: Path = first / "3.jpg"
+    tmp: Path = first / ".3.jpg.part"
+    tmp.write_bytes(page.read_bytes()[:-10])
+    os.replace(tmp, page)
+    broken, listed = _verify(tmp_path, monkeypatch)
+    assert [path for path, _ in broken] == [first / "3.jpg", second / "2.jpg"]
+    assert listed == 1
+    assert "Verified 1 pages" in capsys.readouterr().out
@@ -0,0 +1,27 @@
+"""An interrupted random scrape resumes from the first position it had not finished."""
+
+from id_permutation import PermutationCursor, RandomPermutation
+
+
+def test_permutation_is_deterministic():
+    assert sorted(RandomPermutation(1000, seed=3)) == list(range(1000))
+    assert list(RandomPermutation(1000, seed=3).iter_from(500, 510)) == [
+        RandomPermutation(1000, seed=3)[position] for position in range(500, 510)
+    ]
+
+
+def test_cursor_resumes_at_the_first_unfinished():
+    permutation = RandomPermutation(100, seed=1)
+    cursor = PermutationCursor(permutation, start=10, offset=1)
+    values = iter(cursor)
+    handed_out: list[int] = [next(values) for _ in range(20)]
+    assert cursor.resume_position == 10
+
+    for value in handed_out:
+        if value != handed_out[7]:
+            cursor.done(value)
+    assert cursor.position == 30
+    assert cursor.resume_position == 17
+
+    cursor.done(handed_out[7])
+    assert cursor.resume_position == 30
@@ -0,0 +1,34 @@
+"""An interrupted run must leave its in-flight IDs to be scraped again."""
+
+from pathlib import Path
+
+from job_journal import JobJournal, JobProgress
+
+
+def test_in_flight_ids_are_retried(tmp_path: Path):
+    filepath: str = str(tmp_path / "journal.sqlite3")
+    journal = JobJournal(filepath, max_attempts=1)
+    for id in (1, 2, 3, 4):
+        journal.start(id)
+    journal.finish(2, JobProgress(complete=True))
+    journal.finish(3, JobProgress(last_status=500))
+    journal.finish(4, JobProgress(not_found=True))
+    # Interrupted with 1 in flight.
+    journal.close()
+
+    journal = JobJournal(filepath, max_attempts=1)
+    assert not journal.is_finished(1)
+    assert journal.is_finished(2)
+    # Failed as many times as allowed.
+    assert journal.is_finished(3)
+    assert journal.is_finished(4)
+    assert list(journal.unfinished_ids()) == [1]
+    assert journal.summary() == {"pending": 1, "done": 1, "failed": 1, "not_found": 1}
+
+    journal.start(1)
+    journal.finish(1, JobProgress(last_status=500))
+    journal.close()
+    journal = JobJournal(filepath, max_attempts=1)
+    assert journal.is_finished(1)
+    assert not list(journal.unfinished_ids())
+    journal.close()
@@ -0,0 +1,59 @@
+"""Rebuilding the library index must not lock the scraper out of it."""
+
+import sqlite3
+from pathlib import Path
+from typing import Iterator
+
+from library_index import GalleryEntry, LibraryIndex, scan_loose
+
+
+def _entry(id: int, title: str = "") -> GalleryEntry:
+    return GalleryEntry(id, {"pages": 1, "title": title}, 1, ["jpg"], 10, True)
+
+
+def test_replace_all_lets_others_write(tmp_path: Path):
+    filepath: str = str(tmp_path / "library.sqlite3")
+    index = LibraryIndex(filepath)
+    index.replace_all(_entry(id, "old") for id in range(1, 10))
+
+    scraper_index = LibraryIndex(filepath)
+    # A short busy timeout: a write locked out by the rebuild fails at once.
+    scraper_index._db.execute("PRAGMA busy_timeout = 100")
+    reader = sqlite3.connect(filepath)
+
+    def entries() -> Iterator[GalleryEntry]:
+        for id in range(1, 3000):
+            if id == 2500:
+                # Scraped while the rebuild scans the tree: written, and kept.
+                scraper_index.put(_entry(5, "scraped"))
+                scraper_index.put(_entry(5000, "scraped"))
+                scraper_index.flush()
+                assert not scraper_index._pending
+                # Readers still see the old index.
+                assert reader.execute("SELECT COUNT(*) FROM galleries").fetchone() == (
+                    10,
+                )
+            yield _entry(id, "rebuilt")
+
+    assert index.replace_all(entries()) == 2999
+    assert index.summary()["galleries"] == 3000
+    assert index.get(1)["meta"]["title"] == "rebuilt"
+    assert index.get(5)["meta"]["title"] == "scraped"
+    assert index.get(5000)["meta"]["title"] == "scraped"
+    assert scraper_index.get(5000)["meta"]["title"] == "scraped"
+    reader.close()
+    scraper_index.close()
+    index.close()
+
+
+def test_size_leaves_out_meta_and_hidden_files(tmp_path: Path):
+    doujin_dir: Path = tmp_path / "42"
+    doujin_dir.mkdir()
+    (doujin_dir / "meta.json").write_text('{"pages": 2}')
+    (doujin_dir / "1.jpg").write_bytes(b"x" * 100)
+    (doujin_dir / ".2.png.part").write_bytes(b"x" * 1000)
+
+    entry = scan_loose(doujin_dir)
+    assert entry.bytes == 100
+    assert entry.extensions == ["jpg", ""]
+    assert not entry.complete
@@ -0,0 +1,79 @@
+"""The JSON API and the presentation page must give the scraper the same doujinshis."""
+
+import asyncio
+import dataclasses
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+import stub_server
+from job_journal import JobProgress
+from nhentai_scraper import GalleryRecord, MetadataSource, Scraper, _current_job
+
+MAX_ID: int = 100
+BROKEN_API_EVERY: int = 11
+
+
+def _comparable(record: GalleryRecord | None) -> GalleryRecord | None:
+    if record is None or record.meta is None:
+        return record
+    meta: dict[str, Any] = dict(record.meta)
+    del meta["datetime_scraped_at"]
+    return dataclasses.replace(record, meta=meta)
+
+
+async def _scrape(
+    scraper: Scraper, ids: list[int]
+) -> list[tuple[GalleryRecord | None, bool]]:
+    """:returns: The record of every ID, and whether it was found dead."""
+    results: list[tuple[GalleryRecord | None, bool]] = list()
+    async with scraper:
+        for id in ids:
+            job = JobProgress()
+            token = _current_job.set(job)
+            try:
+                record = await scraper._scrape_metadata(id, save_meta=False)
+            finally:
+                _current_job.reset(token)
+            results.append((_comparable(record), job.not_found))
+    return results
+
+
+@pytest.mark.parametrize(
+    "ids",
+    [
+        pytest.param([1, 2, 3, 10, 58], id="found"),
+        pytest.param([7, 14, MAX_ID + 1], id="404"),
+        pytest.param([11, 22, 33], id="api fallback"),
+    ],
+)
+def test_api_and_html_agree(
+    tmp_path: Path,
+    stub_site: Callable[..., str],
+    make_scraper: Callable[..., Scraper],
+    ids: list[int],
+):
+    # Both from the same server: the URLs in the records match.
+    url: str = stub_site(stub_server.make_app(MAX_ID, BROKEN_API_EVERY))
+    from_api = asyncio.run(
+        _scrape(make_scraper(tmp_path, url, metadata_source=MetadataSource.API), ids)
+    )
+    from_html = asyncio.run(
+        _scrape(make_scraper(tmp_path, url, metadata_source=MetadataSource.HTML), ids)
+    )
+
+    for id, (api_record, api_dead), (html_record, html_dead) in zip(
+        ids, from_api, from_html
+    ):
+        assert api_dead == html_dead == (stub_server.make_gallery(id, MAX_ID) is None)
+        if api_dead:
+            assert api_record is html_record is None
+            continue
+
+        assert api_record is not None
+        assert api_record == html_record
+        assert (
+            api_record.image_urls
+            and len(api_record.image_urls) == api_record.page_count
+        )
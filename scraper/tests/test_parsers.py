@@ -0,0 +1,80 @@
+"""Every parser backend must give the same results as bs4 on the saved pages."""
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+import parsers
+from conftest import FIXTURES_DIR
+from parsers import ParserBackend
+
+FIXTURES: list[Path] = sorted(FIXTURES_DIR.glob("*.html"))
+
+# Known results, so that the backends cannot agree on a page that no longer parses.
+EXPECTED: dict[str, Any] = {
+    "gallery.html": {
+        "pages": 3,
+        "url": "url",
+        "parodies": [{"name": "original", "count": "72K"}],
+        "tags": [
+            {"name": "full color", "count": "64K"},
+            {"name": "sole female", "count": "96K"},
+            {"name": "schoolgirl uniform", "count": "72K"},
+            {"name": "x-ray", "count": "25K"},
+        ],
+        "artists": [{"name": "artist name", "count": "413"}],
+        "groups": [{"name": "circle name", "count": "1.1K"}],
+        "languages": [
+            {"name": "english", "count": "122K"},
+            {"name": "translated", "count": "168K"},
+        ],
+        "categories": [{"name": "doujinshi", "count": "326K"}],
+        "datetime_iso8601": "2014-06-28T14:12:14.209987+00:00",
+        "time_relative": "11 years ago",
+    },
+    "gallery_quirks.html": {
+        "pages": 210,
+        "url": "url",
+        "parodies": [{"name": "touhou\n\t\t\tproject", "count": "12K"}],
+        "characters": [
+            {"name": "reimu hakurei", "count": "3.1K"},
+            {"name": "marisa\xa0kirisame", "count": "2.9K"},
+        ],
+        "tags": [
+            {"name": "big breasts & more", "count": "150K"},
+            {"name": "日本語タグ", "count": "7"},
+        ],
+        "languages": [{"name": "japanese", "count": "301K"}],
+        "datetime_iso8601": "2020-02-29T23:59:59+00:00",
+        "time_relative": "5 years ago",
+    },
+    "reader.html": "https://i3.nhentai.net/galleries/987654/1.jpg",
+    "search.html": 583036,
+    "search_empty.html": None,
+}
+
+
+def test_every_fixture_has_an_expected_result():
+    assert sorted(path.name for path in FIXTURES) == sorted(EXPECTED)
+
+
+@pytest.mark.parametrize("backend", ParserBackend.available(), ids=str)
+@pytest.mark.parametrize("path", FIXTURES, ids=lambda path: path.name)
+def test_backends_agree(path: Path, backend: ParserBackend):
+    func = parsers.page_parser(parsers.page_kind(path))
+    content: bytes = path.read_bytes()
+
+    result: Any = parsers.comparable(func(content, backend))
+    assert result == parsers.comparable(func(content, ParserBackend.BS4))
+    assert result == EXPECTED[path.name]
+
+
+def test_page_table():
+    content: bytes = (FIXTURES_DIR / "gallery.html").read_bytes()
+    assert parsers.parse_page_table(content) == {
+        "media_id": "987654",
+        "extensions": ["jpg", "png", "webp"],
+        "thumbnail_server": "t3.nhentai.net",
+    }
+    assert parsers.parse_page_table(b"<html></html>") is None
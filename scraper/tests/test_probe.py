@@ -0,0 +1,143 @@
+"""Without a page table, the page URLs are guessed: each guess that hits is the download."""
+
+import asyncio
+from collections import Counter
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+from aiohttp import web
+
+import stub_server
+from parsers import IMAGE_TYPES
+from nhentai_scraper import Scraper
+
+
+async def _guess(
+    scraper: Scraper, save_dir: Path, url: str, id: int, first_ext: str | None = None
+) -> bool:
+    gallery: dict[str, Any] = stub_server.make_gallery(id, 100)
+    first_ext = first_ext or IMAGE_TYPES[gallery["images"]["pages"][0]["t"]]
+    async with scraper:
+        return await scraper._download_images_guessing(
+            save_dir,
+            f"{url}/galleries/{gallery['media_id']}/1.{first_ext}",
+            gallery["num_pages"],
+        )
+
+
+@pytest.mark.parametrize("stream_downloads", [True, False], ids=["stream", "buffer"])
+def test_guessed_pages_are_downloaded_once(
+    tmp_path: Path,
+    stub_site: Callable[..., str],
+    make_scraper: Callable[..., Scraper],
+    stream_downloads: bool,
+):
+    requests: Counter[str] = Counter()
+
+    @web.middleware
+    async def count(request: web.Request, handler):
+        requests[request.method] += 1
+        return await handler(request)
+
+    app = stub_server.make_app(max_id=100)
+    app.middlewares.append(count)
+    url: str = stub_site(app)
+
+    # A doujinshi mixing extensions: guesses miss.
+    id: int = 3
+    gallery = stub_server.make_gallery(id, 100)
+    extensions: list[str] = [
+        IMAGE_TYPES[page["t"]] for page in gallery["images"]["pages"]
+    ]
+    assert len(set(extensions)) > 1
+
+    scraper: Scraper = make_scraper(tmp_path, url, stream_downloads=stream_downloads)
+    assert asyncio.run(_guess(scraper, tmp_path, url, id))
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        f"{page}.{ext}" for page, ext in enumerate(extensions, start=1)
+    )
+    for page, ext in enumerate(extensions, start=1):
+        assert (tmp_path / f"{page}.{ext}").read_bytes() == stub_server.render_image(
+            gallery["media_id"], page, ext
+        )
+    assert requests["HEAD"] == 0
+
+
+def test_missing_first_page_fails(
+    tmp_path: Path, stub_url: str, make_scraper: Callable[..., Scraper]
+):
+    scraper: Scraper = make_scraper(tmp_path, stub_url)
+    assert not asyncio.run(_guess(scraper, tmp_path, stub_url, 3, first_ext="gif"))
+    assert not list(tmp_path.iterdir())
+
+
+def _uniform_app(
+    extensions: set[str], requests: Counter[str], flaky_page: int = 0
+) -> web.Application:
+    """
+    A stub server on which every page exists in all of `extensions`, and only those.
+    The first request of `flaky_page` misses.
+    """
+    flaked: set[int] = set()
+
+    @web.middleware
+    async def uniform_images(request: web.Request, handler):
+        if not request.path.startswith("/galleries/"):
+            return await handler(request)
+        media_id, filename = request.path.split("/")[2:4]
+        name, _, ext = filename.partition(".")
+        page: int = int(name)
+        requests[ext] += 1
+        if ext not in extensions:
+            raise web.HTTPNotFound()
+        if page == flaky_page and page not in flaked:
+            flaked.add(page)
+            raise web.HTTPNotFound()
+        return web.Response(body=stub_server.render_image(media_id, page, ext))
+
+    app = stub_server.make_app(max_id=100)
+    app.middlewares.append(uniform_images)
+    return app
+
+
+def test_right_guesses_cost_one_request(
+    tmp_path: Path, stub_site: Callable[..., str], make_scraper: Callable[..., Scraper]
+):
+    requests: Counter[str] = Counter()
+    # Page 2 missed by the gamble: guessed again, right.
+    url: str = stub_site(_uniform_app({"jpg"}, requests, flaky_page=2))
+
+    scraper: Scraper = make_scraper(tmp_path, url)
+    assert asyncio.run(_guess(scraper, tmp_path, url, 3, first_ext="jpg"))
+
+    pages: int = stub_server.make_gallery(3, 100)["num_pages"]
+    # Not a single request for another extension.
+    assert requests == {"jpg": pages + 1}
+    assert len(list(tmp_path.iterdir())) == pages
+
+
+@pytest.mark.parametrize("stream_downloads", [True, False], ids=["stream", "buffer"])
+def test_only_one_probe_hit_is_kept(
+    tmp_path: Path,
+    stub_site: Callable[..., str],
+    make_scraper: Callable[..., Scraper],
+    stream_downloads: bool,
+):
+    requests: Counter[str] = Counter()
+    url: str = stub_site(_uniform_app({"jpg", "png", "webp"}, requests))
+    base_url: str = f"{url}/galleries/{stub_server.media_id_of(3)}"
+
+    async def probe() -> str | None:
+        async with make_scraper(
+            tmp_path, url, stream_downloads=stream_downloads
+        ) as scraper:
+            return await scraper._probe(
+                tmp_path, [f"{base_url}/3.{ext}" for ext in ("jpg", "png", "webp")]
+            )
+
+    found: str | None = asyncio.run(probe())
+    assert found
+    # Every candidate hit, only the winner is stored: no other file, no partial file.
+    assert [path.name for path in tmp_path.iterdir()] == [found.rsplit("/", 1)[-1]]
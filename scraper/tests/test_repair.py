@@ -0,0 +1,55 @@
+"""cleanup.py --repair downloads only what the damaged doujinshis are missing."""
+
+import asyncio
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable
+
+import pytest
+
+from cleanup import Cleanup
+from nhentai_scraper import Scraper
+
+
+async def _scrape(scraper: Scraper, ids: list[int]) -> None:
+    async with scraper:
+        for id in ids:
+            assert await scraper.scrape_single(id)
+
+
+def test_repair_downloads_only_the_missing_pages(
+    tmp_path: Path,
+    stub_url: str,
+    stub_settings: Callable[[str], dict[str, Any]],
+    make_scraper: Callable[..., Scraper],
+    monkeypatch: pytest.MonkeyPatch,
+):
+    save_dir: Path = tmp_path / "manga"
+    asyncio.run(_scrape(make_scraper(save_dir, stub_url), [1, 2]))
+    pages: dict[str, bytes] = {
+        path.name: path.read_bytes() for path in (save_dir / "1").iterdir()
+    }
+    untouched: dict[str, int] = {
+        path.name: path.stat().st_mtime_ns for path in (save_dir / "1").iterdir()
+    }
+
+    # A page gone, an empty page, and a corrupt meta file.
+    page_2: Path = next((save_dir / "1").glob("2.*"))
+    page_3: Path = next((save_dir / "1").glob("3.*"))
+    page_2.unlink()
+    page_3.write_bytes(b"")
+    (save_dir / "2" / "meta.json").write_text("{")
+
+    # Nothing is written to the working directory.
+    monkeypatch.chdir(tmp_path)
+    Cleanup(str(save_dir), workers=2).repair(stub_settings(stub_url))
+
+    assert {
+        path.name: path.read_bytes() for path in (save_dir / "1").iterdir()
+    } == pages
+    for path in (save_dir / "1").iterdir():
+        if path not in (page_2, page_3):
+            assert path.stat().st_mtime_ns == untouched[path.name]
+    assert json.loads((save_dir / "2" / "meta.json").read_text())["pages"] > 0
+    assert sorted(os.listdir(tmp_path)) == ["manga"]
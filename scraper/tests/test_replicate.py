@@ -0,0 +1,139 @@
+"""replicate.py copies only what is new or changed, and only advances its cursor when all went well."""
+
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import replicate
+
+
+def _make_doujinshi(root: Path, id: int, pages: int) -> Path:
+    doujin_dir: Path = root / str(id)
+    doujin_dir.mkdir(parents=True)
+    (doujin_dir / "meta.json").write_text(json.dumps({"pages": pages}))
+    for page in range(1, pages + 1):
+        (doujin_dir / f"{page}.jpg").write_bytes(f"{id} page {page}".encode() * 100)
+    return doujin_dir
+
+
+def _contents(path: Path) -> dict[str, bytes]:
+    return {entry.name: entry.read_bytes() for entry in path.iterdir()}
+
+
+def _run(source: Path, destination: Path, monkeypatch: pytest.MonkeyPatch, *args):
+    monkeypatch.setattr(
+        sys, "argv", ["replicate.py", str(source), str(destination), *args]
+    )
+    replicate.main()
+
+
+def test_new_gallery_is_copied_whole(tmp_path: Path):
+    src: Path = _make_doujinshi(tmp_path / "src", 1, 3)
+    (src / ".4.jpg.part").write_bytes(b"partial")
+    (tmp_path / "dst").mkdir()
+
+    copied, methods = replicate.replicate(src, tmp_path / "dst" / "1")
+
+    assert _contents(tmp_path / "dst" / "1") == {
+        name: content
+        for name, content in _contents(src).items()
+        if not name.startswith(".")
+    }
+    assert copied == sum(size for size, _ in replicate.manifest(src).values())
+    assert sum(methods.values()) == 4
+    assert sorted(os.listdir(tmp_path / "dst")) == [".replicate_manifests", "1"]
+
+
+def test_only_changed_files_are_recopied(tmp_path: Path):
+    src: Path = _make_doujinshi(tmp_path / "src", 1, 3)
+    (tmp_path / "dst").mkdir()
+    dst: Path = tmp_path / "dst" / "1"
+    replicate.replicate(src, dst)
+
+    # Unchanged: nothing copied.
+    assert replicate.replicate(src, dst) == (0, {})
+
+    (src / "2.jpg").write_bytes(b"repaired page")
+    copied, methods = replicate.replicate(src, dst)
+    assert copied == len(b"repaired page")
+    assert sum(methods.values()) == 1
+    assert _contents(dst) == _contents(src)
+
+
+def test_cursor_only_advances_without_failures(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    source: Path = tmp_path / "src"
+    destination: Path = tmp_path / "dst"
+    _make_doujinshi(source, 1, 2)
+    _make_doujinshi(source, 2, 2)
+    state_path: Path = destination / ".replicate_state.json"
+    copy_file = replicate.copy_file
+
+    def failing_copy_file(src: Path, dst: Path) -> str:
+        if src.parent.name == "2":
+            raise OSError("No space left on device")
+        return copy_file(src, dst)
+
+    monkeypatch.setattr(replicate, "copy_file", failing_copy_file)
+    _run(source, destination, monkeypatch)
+    assert _contents(destination / "1") == _contents(source / "1")
+    # No half-copied doujinshi left behind, no cursor.
+    assert sorted(os.listdir(destination)) == [".replicate_manifests", "1"]
+
+    monkeypatch.setattr(replicate, "copy_file", copy_file)
+    _run(source, destination, monkeypatch)
+    assert _contents(destination / "2") == _contents(source / "2")
+    assert replicate.load_cursor(state_path, source.absolute()) is not None
+
+
+def test_meta_rewritten_in_place_is_a_candidate(tmp_path: Path):
+    source: Path = tmp_path / "src"
+    doujin_dir: Path = _make_doujinshi(source, 1, 2)
+    hour_ago_ns: int = time.time_ns() - 3600 * 10**9
+    for path in (doujin_dir / "meta.json", doujin_dir):
+        os.utime(path, ns=(hour_ago_ns, hour_ago_ns))
+    cursor: float = time.time() - 1800
+    assert replicate.candidates(source, cursor, None) == []
+
+    # Rewritten in place: the directory's modification time is unchanged.
+    (doujin_dir / "meta.json").write_text(json.dumps({"pages": 2, "title": "x"}))
+    assert doujin_dir.stat().st_mtime_ns == hour_ago_ns
+    assert replicate.candidates(source, cursor, None) == [doujin_dir]
+
+
+def test_checksums_are_recorded(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    src: Path = _make_doujinshi(tmp_path / "src", 1, 3)
+    (tmp_path / "dst").mkdir()
+    dst: Path = tmp_path / "dst" / "1"
+    replicate.replicate(src, dst, checksum=True)
+
+    hashed: list[Path] = list()
+    file_digest = replicate.file_digest
+
+    def counting_file_digest(path: Path) -> bytes:
+        hashed.append(path)
+        return file_digest(path)
+
+    monkeypatch.setattr(replicate, "file_digest", counting_file_digest)
+
+    # Unchanged since recorded: nothing read.
+    assert replicate.replicate(src, dst, checksum=True) == (0, {})
+    assert hashed == []
+
+    # Touched, same content: only the source is read.
+    os.utime(src / "2.jpg", ns=(0, 10**9))
+    assert replicate.replicate(src, dst, checksum=True) == (0, {})
+    assert hashed == [src / "2.jpg"]
+
+    # Same size, new content: copied, and only the source is read.
+    hashed.clear()
+    (src / "3.jpg").write_bytes(bytes(len((src / "3.jpg").read_bytes())))
+    copied, methods = replicate.replicate(src, dst, checksum=True)
+    assert sum(methods.values()) == 1
+    assert hashed == [src / "3.jpg"]
+    assert _contents(dst) == _contents(src)
@@ -0,0 +1,66 @@
+"""
+The summary of scrape_multiple() tells the successes, the dead IDs and the failures apart,
+and every ID taken is reported done, whatever its outcome.
+"""
+
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from aiohttp import web
+
+import stub_server
+from nhentai_scraper import Scraper
+
+IDS: list[int] = list(range(1, 16))
+
+
+@pytest.fixture
+def broken_url(stub_site: Callable[..., str]) -> str:
+    """A stub server on which 7 and 14 do not exist, and the images of 5 fail."""
+
+    @web.middleware
+    async def broken_images(request: web.Request, handler):
+        if request.path.startswith(f"/galleries/{stub_server.media_id_of(5)}/"):
+            raise web.HTTPInternalServerError()
+        return await handler(request)
+
+    app = stub_server.make_app(max_id=100)
+    app.middlewares.append(broken_images)
+    return stub_site(app)
+
+
+async def _scrape(
+    scraper: Scraper, on_done: Callable[[int], None] | None = None
+) -> None:
+    async with scraper:
+        await scraper.scrape_multiple(IDS, on_done=on_done)
+
+
+def test_summary_counts_only_successes(
+    tmp_path: Path,
+    broken_url: str,
+    make_scraper: Callable[..., Scraper],
+    caplog: pytest.LogCaptureFixture,
+):
+    caplog.set_level(logging.INFO, logger="scraper")
+    asyncio.run(_scrape(make_scraper(tmp_path, broken_url)))
+
+    summary: str = next(
+        record.getMessage()
+        for record in caplog.records
+        if record.getMessage().startswith("Scraped ")
+    )
+    assert summary.startswith("Scraped 12 doujinshis in ")
+    assert "2 IDs do not exist, 1 failed" in summary
+    assert "Failed IDs: 5" in caplog.text
+
+
+def test_every_id_is_reported_done(
+    tmp_path: Path, broken_url: str, make_scraper: Callable[..., Scraper]
+):
+    done: list[int] = list()
+    asyncio.run(_scrape(make_scraper(tmp_path, broken_url), done.append))
+    assert sorted(done) == IDS
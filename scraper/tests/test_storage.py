@@ -0,0 +1,64 @@
+"""Every storage must behave the same."""
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from aiohttp.test_utils import TestServer
+
+import stub_s3
+from storage import LocalStorage, S3Storage, Storage
+
+
+def test_storage_is_abstract():
+    with pytest.raises(TypeError):
+        Storage()
+
+
+async def _exercise(storage: Storage, staging: Path) -> None:
+    await storage.put_bytes("1/meta.json", b'{"pages": 2}')
+    page: Path = staging / "1.jpg"
+    page.write_bytes(b"page 1")
+    await storage.put_file("1/1.jpg", page)
+    assert not page.exists()
+    # Large enough for a multipart upload to S3.
+    archive: Path = staging / "2.cbz"
+    archive.write_bytes(bytes(range(256)) * (11 * 1024**2 // 256))
+    await storage.put_file("2.cbz", archive)
+
+    assert await storage.list("1/") == {"meta.json": 12, "1.jpg": 6}
+    assert await storage.list("3/") == {}
+    assert await storage.read("1/1.jpg") == b"page 1"
+    assert await storage.read("1/2.jpg") is None
+    assert len(await storage.read("2.cbz")) == 11 * 1024**2
+    assert await storage.exists("1/meta.json")
+    assert not await storage.exists("1/2.jpg")
+
+
+def test_local_storage(tmp_path: Path):
+    (tmp_path / "root" / "1").mkdir(parents=True)
+    (tmp_path / "staging").mkdir()
+    asyncio.run(_exercise(LocalStorage(tmp_path / "root"), tmp_path / "staging"))
+
+
+def test_s3_storage(tmp_path: Path):
+    async def run() -> None:
+        server = TestServer(stub_s3.make_app())
+        await server.start_server()
+        storage = S3Storage(
+            str(server.make_url("")),
+            "manga",
+            prefix="library/",
+            access_key="x",
+            secret_key="x",
+            multipart_threshold=6 * 1024**2,
+            part_size=5 * 1024**2,
+        )
+        try:
+            await _exercise(storage, tmp_path)
+        finally:
+            await storage.close()
+            await server.close()
+        assert server.app["requests"]["PUT part"] == 3
+
+    asyncio.run(run())
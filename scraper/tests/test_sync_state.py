@@ -0,0 +1,28 @@
+"""An interrupted scrape_new() resumes with the IDs it had not finished, however many were in flight."""
+
+from pathlib import Path
+
+from sync_state import SyncState
+
+
+def test_sync_state_saves_the_unfinished_ids(tmp_path: Path):
+    filepath: str = str(tmp_path / "sync_state.json")
+    state = SyncState(filepath)
+    state.extend(10)
+    ids = iter(state)
+    handed_out: list[int] = [next(ids) for _ in range(5)]
+    assert handed_out == [10, 9, 8, 7, 6]
+    # Finished out of order, 9 and 7 still in flight.
+    for id in (10, 8, 6):
+        state.done(id)
+    # Interrupted.
+    state.save()
+
+    state = SyncState(filepath)
+    assert state.ceiling == 10
+    assert len(state) == 7
+    assert list(state) == [9, 7, 5, 4, 3, 2, 1]
+    state.finish()
+
+    state = SyncState(filepath)
+    assert len(state) == 0
@@ -0,0 +1,125 @@
+"""The tag index must answer queries like a linear scan of the meta.json files."""
+
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+
+from bench_tag_index import make_meta
+from library_index import GalleryEntry, LibraryIndex
+from tag_index import TagIndex, parse_query
+
+
+def _metas() -> dict[int, dict[str, Any]]:
+    metas: dict[int, dict[str, Any]] = {
+        id: meta for id in range(1, 300) if (meta := make_meta(id))
+    }
+    # Scraped without a page count or an upload date.
+    metas[400] = {"tags": [{"name": "tag 7", "count": "1"}]}
+    metas[401] = {"pages": 0, "languages": [{"name": "language 3", "count": "1"}]}
+    return metas
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        'tag:"tag 7"',
+        'tag:"tag 7" AND language:"language 3"',
+        '(artist:"artist 1" OR artist:"artist 2") AND NOT tag:"tag 7"',
+        "pages:..10",
+        "pages:0..",
+        "NOT pages:1..",
+        'language:"language 3" pages:..30 uploaded:2014-05-14..2014-05-20',
+        "uploaded:..2014-06 OR NOT uploaded:2000..",
+    ],
+)
+def test_index_matches_linear_scan(query: str):
+    metas = _metas()
+    index = TagIndex()
+    for id, meta in metas.items():
+        index.add(id, meta)
+
+    parsed = parse_query(query)
+    assert index.query(parsed) == sorted(
+        id for id, meta in metas.items() if parsed.matches(meta)
+    )
+
+
+def test_update_from_library_removes_deleted_rows(tmp_path: Path):
+    metas = _metas()
+    library = LibraryIndex(str(tmp_path / "library.sqlite3"))
+    library.replace_all(
+        GalleryEntry(id, meta, meta.get("pages") or 0, [], 0, True)
+        for id, meta in metas.items()
+    )
+    library.close()
+
+    index = TagIndex(str(tmp_path / "tags.idx"))
+    assert index.update_from_library(str(tmp_path / "library.sqlite3")) == len(metas)
+    assert index.query('tag:"tag 7"')
+
+    kept: dict[int, dict[str, Any]] = {id: meta for id, meta in metas.items() if id % 3}
+    library = LibraryIndex(str(tmp_path / "library.sqlite3"))
+    library.replace_all(
+        GalleryEntry(id, meta, meta.get("pages") or 0, [], 0, True)
+        for id, meta in kept.items()
+    )
+    library.close()
+    index.update_from_library(str(tmp_path / "library.sqlite3"))
+
+    reloaded = TagIndex(str(tmp_path / "tags.idx"))
+    for tag_index in (index, reloaded):
+        assert len(tag_index) == len(kept)
+        assert all(id in tag_index for id in kept)
+        assert not any(id in tag_index for id in metas if id not in kept)
+        assert tag_index.query('tag:"tag 7"') == sorted(
+            id
+            for id, meta in kept.items()
+            if any(tag["name"] == "tag 7" for tag in meta.get("tags", []))
+        )
+
+
+def test_queries_follow_adds_and_removes():
+    metas = _metas()
+    index = TagIndex()
+    for id, meta in metas.items():
+        index.add(id, meta)
+    query = parse_query('NOT tag:"tag 7"')
+    # Builds the bitmap of every ID, then kept up to date.
+    index.query(query)
+
+    metas[1000] = metas.pop(1)
+    index.add(1000, metas[1000])
+    index.remove(1)
+    del metas[2]
+    index.remove_all([2, 5000])
+
+    assert index.query(query) == sorted(
+        id for id, meta in metas.items() if query.matches(meta)
+    )
+
+
+def test_update_from_library_rereads_a_rebuild(tmp_path: Path):
+    metas = _metas()
+    library_filepath: str = str(tmp_path / "library.sqlite3")
+    library = LibraryIndex(library_filepath)
+    index = TagIndex(str(tmp_path / "tags.idx"))
+
+    def scanned() -> Iterator[GalleryEntry]:
+        for id, meta in metas.items():
+            yield GalleryEntry(id, meta, meta.get("pages") or 0, [], 0, True)
+            if id == 1:
+                # The scraper finishes a doujinshi during the rebuild, and the tag index syncs.
+                scraper_library = LibraryIndex(library_filepath)
+                scraper_library.put(GalleryEntry(1000, metas[1], 1, [], 0, True))
+                scraper_library.close()
+                assert index.update_from_library(library_filepath) == 1
+
+    library.replace_all(scanned())
+    library.close()
+
+    # The rebuilt rows are stamped before the row synced already.
+    index.update_from_library(library_filepath)
+    assert sorted(TagIndex(str(tmp_path / "tags.idx"))._indexed_ids()) == sorted(
+        [*metas, 1000]
+    )
@@ -0,0 +1,75 @@
+"""Dead IDs persist across runs, one bitmap per week, and are checked again once the TTL is over."""
+
+import time
+from pathlib import Path
+
+import pytest
+
+from tombstones import TombstoneStore
+
+WEEK_S: int = 7 * 24 * 3600
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> list[float]:
+    """The time seen by the store, at the start of a week: set `clock[0]` to move it."""
+    now: list[float] = [(time.time() // WEEK_S) * WEEK_S]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    return now
+
+
+def test_dead_ids_persist_across_reopen(tmp_path: Path, clock: list[float]):
+    filepath: str = str(tmp_path / "tombstones.bin")
+    store = TombstoneStore(filepath, save_every=2)
+    for id in (1, 7, 8, 100_000):
+        store.add(id)
+    # Saved every 2 changes, without an explicit save().
+    assert len(TombstoneStore(filepath)) == 4
+    store.discard(7)
+    store.save()
+
+    store = TombstoneStore(filepath)
+    assert len(store) == 3
+    assert [id for id in range(100_001) if store.is_dead(id)] == [1, 8, 100_000]
+
+
+def test_weeks_roll_over(tmp_path: Path, clock: list[float]):
+    filepath: str = str(tmp_path / "tombstones.bin")
+    store = TombstoneStore(filepath)
+    store.add(1)
+    clock[0] += WEEK_S
+    store.add(2)
+    # Found dead again in the new week: known in both.
+    store.add(1)
+    assert len(store) == 3
+    store.save()
+
+    store = TombstoneStore(filepath)
+    assert len(store) == 3
+    assert store.is_dead(1) and store.is_dead(2)
+    store.discard(1)
+    assert len(store) == 1
+
+
+def test_dead_ids_expire_after_the_ttl(tmp_path: Path, clock: list[float]):
+    filepath: str = str(tmp_path / "tombstones.bin")
+    store = TombstoneStore(filepath, ttl_days=14.5)
+    store.add(1)
+    clock[0] += WEEK_S
+    store.add(2)
+    store.save()
+
+    # Mid-week, the first week ended over 14.5 days ago: its IDs are checked again, even without
+    # reopening the store. The second week's are not.
+    clock[0] += 2 * WEEK_S + 12 * 3600 + 1
+    assert not store.is_dead(1)
+    assert store.is_dead(2)
+    assert len(store) == 1
+    reopened = TombstoneStore(filepath, ttl_days=14.5)
+    assert not reopened.is_dead(1)
+    assert reopened.is_dead(2)
+
+    # A week later, so are the second week's.
+    clock[0] += WEEK_S
+    assert not store.is_dead(2)
+    assert len(TombstoneStore(filepath, ttl_days=14.5)) == 0
@@ -0,0 +1,150 @@
+"""
+tombstones.py
+
+Persistent negative cache of dead doujinshi IDs (removed, or never existed), shared
+across runs so that crawls of the whole ID space stop requesting them again.
+
+IDs are kept in one bitmap per week they were found dead in, zlib-compressed on disk:
+a million IDs take at most 125 KiB per week, usually a few KiB.
+Once a week is older than the TTL its IDs are forgotten, and get checked again.
+"""
+
+import logging
+import struct
+import time
+import zlib
+from pathlib import Path
+
+log: logging.Logger = logging.getLogger("scraper")
+
+
+class TombstoneStore:
+    _MAGIC: bytes = b"NHTS1"
+    # Generation number, compressed size
+    _HEADER: struct.Struct = struct.Struct("<iI")
+    _GENERATION_S: int = 7 * 24 * 3600
+
+    def __init__(
+        self, filepath: str, ttl_days: float = 30.0, save_every: int = 1000
+    ) -> None:
+        """
+        :param filepath: The file the dead IDs persist in, created if needed.
+        :param ttl_days: How long an ID is considered dead before being checked again.
+        :param save_every: Save to disk every this many changes, on top of `save()`.
+        """
+        self._filepath: Path = Path(filepath)
+        self._ttl_s: float = ttl_days * 24 * 3600
+        self._save_every: int = max(1, save_every)
+        self._unsaved: int = 0
+        self._generations: dict[int, bytearray] = dict()
+        # When the oldest week expires.
+        self._next_expiry_s: float = float("inf")
+        self._load()
+        self._update_next_expiry()
+
+    def _current_generation(self) -> int:
+        return int(time.time() // self._GENERATION_S)
+
+    def _is_expired(self, generation: int) -> bool:
+        # A generation is as old as its end.
+        generation_end: float = (generation + 1) * self._GENERATION_S
+        return time.time() - generation_end > self._ttl_s
+
+    def _update_next_expiry(self) -> None:
+        self._next_expiry_s = min(
+            ((g + 1) * self._GENERATION_S + self._ttl_s for g in self._generations),
+            default=float("inf"),
+        )
+
+    def _expire(self) -> None:
+        """Forgets the weeks that expired since loaded, e.g. during a long crawl."""
+        if time.time() <= self._next_expiry_s:
+            return
+        for generation in [g for g in self._generations if self._is_expired(g)]:
+            del self._generations[generation]
+        self._update_next_expiry()
+
+    def _load(self) -> None:
+        if not self._filepath.exists():
+            return
+
+        try:
+            data: bytes = self._filepath.read_bytes()
+            if not data.startswith(self._MAGIC):
+                raise ValueError("not a tombstone file")
+
+            offset: int = len(self._MAGIC)
+            while offset < len(data):
+                generation, size = self._HEADER.unpack_from(data, offset)
+                offset += self._HEADER.size
+                if not self._is_expired(generation):
+                    self._generations[generation] = bytearray(
+                        zlib.decompress(data[offset : offset + size])
+                    )
+                offset += size
+        except Exception as e:
+            log.warning(f"Failed to load tombstones from {self._filepath}: {e}")
+            self._generations.clear()
+            return
+
+        log.info(f"Tombstones {self._filepath}: {len(self)} dead IDs known")
+
+    def save(self) -> None:
+        chunks: list[bytes] = [self._MAGIC]
+        for generation, bitmap in sorted(self._generations.items()):
+            compressed: bytes = zlib.compress(bytes(bitmap), 9)
+            chunks.append(self._HEADER.pack(generation, len(compressed)))
+            chunks.append(compressed)
+
+        # Written aside then renamed: a crash never leaves a truncated file.
+        tmp_path: Path = self._filepath.with_name(f".{self._filepath.name}.tmp")
+        try:
+            tmp_path.write_bytes(b"".join(chunks))
+            tmp_path.replace(self._filepath)
+            self._unsaved = 0
+        except Exception as e:
+            log.warning(f"Failed to save tombstones to {self._filepath}: {e}")
+
+    def _changed(self) -> None:
+        self._unsaved += 1
+        if self._unsaved >= self._save_every:
+            self.save()
+
+    def is_dead(self, id: int) -> bool:
+        """Returns True if the ID was found dead less than `ttl_days` ago."""
+        self._expire()
+        byte, bit = id >> 3, 1 << (id & 7)
+        return any(
+            byte < len(bitmap) and bitmap[byte] & bit
+            for bitmap in self._generations.values()
+        )
+
+    def add(self, id: int) -> None:
+        """Records that the ID is dead, as of now."""
+        byte, bit = id >> 3, 1 << (id & 7)
+        self._expire()
+        generation: int = self._current_generation()
+        if generation not in self._generations:
+            self._generations[generation] = bytearray()
+            self._update_next_expiry()
+        bitmap: bytearray = self._generations[generation]
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte - len(bitmap) + 1024))
+        if not bitmap[byte] & bit:
+            bitmap[byte] |= bit
+            self._changed()
+
+    def discard(self, id: int) -> None:
+        """Forgets the ID, e.g. when it came back to life."""
+        byte, bit = id >> 3, 1 << (id & 7)
+        for bitmap in self._generations.values():
+            if byte < len(bitmap) and bitmap[byte] & bit:
+                bitmap[byte] &= ~bit
+                self._changed()
+
+    def __len__(self) -> int:
+        """The number of dead IDs known (counted once per week they were found dead in)."""
+        return sum(
+            int.from_bytes(bitmap, "little").bit_count()
+            for bitmap in self._generations.values()
+        )